@@ -0,0 +1,245 @@
+# anomaly.py
+"""
+Detektor anomali pajak bulanan yang bisa dipilih per upload.
+
+Semua detektor menghitung skor untuk seluruh usaha sekaligus: baris VALID
+diurutkan sekali per (usaha, bulan), lalu baseline per usaha dihitung dengan
+operasi NumPy per grup (geser dalam grup, sort per baris / per grup), tanpa
+loop Python per baris. Skor bertanda (positif = pajak di atas baseline,
+negatif = di bawah); kondisi ANOMALI jika |skor| >= threshold detektor.
+Baris yang tidak VALID atau belum punya cukup bulan pembanding skornya kosong.
+"""
+
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# label: nama di form upload, threshold: batas |skor| untuk ANOMALI,
+# score: fungsi(_Sequence) -> skor per baris urut, lookback: jumlah bulan VALID
+# sebelumnya yang memengaruhi skor satu bulan (None = seluruh seri usaha, skor
+# bulan lama ikut berubah saat ada bulan baru). Dipakai db.py untuk membatasi
+# baris yang dibaca ulang saat append / update seri
+Detector = namedtuple('Detector', ['label', 'threshold', 'score', 'lookback'])
+
+# Jumlah bulan VALID sebelumnya yang dipakai sebagai baseline rolling
+ROLLING_WINDOW = int(os.environ.get('ANOMALY_WINDOW', '6'))
+# Minimal bulan pembanding agar skor dihitung
+MIN_PERIODS = 3
+# Batas |skor| ANOMALI untuk z-score biasa dan robust z-score (MAD)
+ZSCORE_THRESHOLD = 3.0
+ROBUST_THRESHOLD = 3.5
+# Selisih terhadap baseline di bawah bagian level ini tidak pernah ANOMALI
+# (sama dengan aturan growth lama), agar usaha yang pajaknya hampir tetap atau
+# bergeser musiman tidak jadi ANOMALI karena simpangan baku kecil
+MIN_RELATIVE_CHANGE = 0.5
+# MAD -> simpangan baku untuk data berdistribusi normal
+MAD_SCALE = 1.4826
+# Jarak bulan untuk pembanding musiman (bulan yang sama tahun sebelumnya)
+SEASON_LENGTH = 12
+# Bulan di sekitar bulan yang sama tahun lalu yang ikut jadi baseline musiman (± bulan)
+SEASON_SPREAD = 2
+
+# Baris VALID urut (usaha, bulan): posisi di DataFrame asal, kode usaha (naik),
+# pajak, growth, dan nomor bulan absolut (tahun * 12 + bulan, NaN jika bulan tidak dikenali)
+_Sequence = namedtuple('_Sequence', ['order', 'groups', 'n_groups', 'pajak', 'growth', 'month_number'])
+
+
+def _month_numbers(months):
+    """
+    Nomor bulan absolut untuk nilai unik bulan_iso ('2025-03' -> 2025 * 12 + 2).
+    Elemen terakhir NaN untuk kode bulan kosong / tidak dikenali
+    """
+    parsed = pd.to_datetime(pd.Series(months, dtype=object).astype(str), format='%Y-%m', errors='coerce')
+    return np.append((parsed.dt.year * 12 + parsed.dt.month - 1).to_numpy(dtype='float64'), np.nan)
+
+
+def _valid_sequence(df, id_col):
+    """
+    Baris VALID dengan id usaha, diurutkan seperti calculate_growth_vectorized
+    (bulan_iso jika ada, bulan kosong di akhir). None jika tidak ada baris.
+    Kolom category difaktorkan lewat kodenya, tanpa materialisasi string per baris
+    """
+    valid_pos = np.flatnonzero((df['status'] == 'VALID').to_numpy() & df[id_col].notna().to_numpy())
+    if len(valid_pos) == 0:
+        return None
+
+    sort_col = 'bulan_iso' if 'bulan_iso' in df.columns else 'bulan'
+    id_codes, id_uniques = pd.factorize(df[id_col].iloc[valid_pos], sort=True)
+    month_codes, month_uniques = pd.factorize(df[sort_col].iloc[valid_pos], sort=True)
+    month_codes[month_codes < 0] = len(month_uniques)
+
+    sorter = np.lexsort((month_codes, id_codes))
+    order = valid_pos[sorter]
+    pajak = pd.to_numeric(df['jumlah_pajak_dibayar'], errors='coerce').to_numpy(dtype='float64')[order]
+    if 'growth' in df.columns:
+        growth = pd.to_numeric(df['growth'], errors='coerce').to_numpy(dtype='float64')[order]
+    else:
+        growth = np.full(len(order), np.nan)
+    if sort_col == 'bulan_iso':
+        month_number = _month_numbers(month_uniques)[month_codes[sorter]]
+    else:
+        month_number = np.full(len(order), np.nan)
+
+    return _Sequence(order, id_codes[sorter], len(id_uniques), pajak, growth, month_number)
+
+
+def _previous_values(values, groups, window):
+    """Matriks (n, window): nilai ke-1..window sebelumnya dalam usaha yang sama (NaN jika tidak ada)"""
+    n = len(values)
+    previous = np.full((n, window), np.nan)
+    for k in range(1, min(window, n - 1) + 1):
+        same = groups[k:] == groups[:-k]
+        previous[k:, k - 1] = np.where(same, values[:-k], np.nan)
+    return previous
+
+
+def _row_median(matrix):
+    """Median per baris, NaN diabaikan (NaN jika baris kosong)"""
+    if matrix.shape[1] == 0:
+        return np.full(len(matrix), np.nan)
+    ordered = np.sort(matrix, axis=1)  # NaN di akhir
+    count = (~np.isnan(matrix)).sum(axis=1)
+    rows = np.arange(len(matrix))
+    low = ordered[rows, np.maximum(count - 1, 0) // 2]
+    high = ordered[rows, np.minimum(count // 2, matrix.shape[1] - 1)]
+    return np.where(count > 0, (low + high) / 2, np.nan)
+
+
+def _group_median(values, groups, n_groups):
+    """Median per grup (kode 0..n_groups-1), NaN diabaikan"""
+    present = ~np.isnan(values)
+    values, groups = values[present], groups[present]
+    sorter = np.lexsort((values, groups))
+    values = values[sorter]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    median = np.full(n_groups, np.nan)
+    has = counts > 0
+    median[has] = (values[starts[has] + (counts[has] - 1) // 2] + values[starts[has] + counts[has] // 2]) / 2
+    return median
+
+
+def _scaled(deviation, scale, level, threshold):
+    """deviation / scale, dengan scale minimal |level| * MIN_RELATIVE_CHANGE / threshold"""
+    scale = np.fmax(scale, MIN_RELATIVE_CHANGE / threshold * np.abs(level))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(scale > 0, deviation / scale, np.nan)
+
+
+def growth_score(seq):
+    """Growth terhadap bulan VALID sebelumnya (aturan lama: |growth| >= 50%)"""
+    return seq.growth
+
+
+def rolling_mean_score(seq):
+    """z-score terhadap rata-rata dan simpangan baku ROLLING_WINDOW bulan VALID sebelumnya"""
+    previous = _previous_values(seq.pajak, seq.groups, ROLLING_WINDOW)
+    count = (~np.isnan(previous)).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.nansum(previous, axis=1) / count
+        std = np.sqrt(np.nansum((previous - mean[:, None]) ** 2, axis=1) / (count - 1))
+    score = _scaled(seq.pajak - mean, std, mean, ZSCORE_THRESHOLD)
+    score[count < MIN_PERIODS] = np.nan
+    return score
+
+
+def rolling_median_score(seq):
+    """Robust z-score (median + MAD) terhadap ROLLING_WINDOW bulan VALID sebelumnya"""
+    previous = _previous_values(seq.pajak, seq.groups, ROLLING_WINDOW)
+    count = (~np.isnan(previous)).sum(axis=1)
+    median = _row_median(previous)
+    mad = _row_median(np.abs(previous - median[:, None]))
+    score = _scaled(seq.pajak - median, MAD_SCALE * mad, median, ROBUST_THRESHOLD)
+    score[count < MIN_PERIODS] = np.nan
+    return score
+
+
+def _lagged_values(seq, lags):
+    """
+    Matriks (n, len(lags)): pajak usaha yang sama lags[j] bulan sebelumnya
+    (kalender, bukan baris); NaN jika tidak ada. Kunci (usaha, bulan) diurutkan sekali
+    """
+    known = ~np.isnan(seq.month_number)
+    keys = np.where(known, seq.groups.astype('int64') * (1 << 32) + np.nan_to_num(seq.month_number).astype('int64'), -1)
+    key_order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[key_order]
+
+    lagged = np.full((len(keys), len(lags)), np.nan)
+    for j, months in enumerate(lags):
+        wanted = keys - months
+        found = np.minimum(np.searchsorted(sorted_keys, wanted), len(keys) - 1)
+        has_lag = known & (sorted_keys[found] == wanted)
+        lagged[has_lag, j] = seq.pajak[key_order[found[has_lag]]]
+    return lagged
+
+
+def seasonal_score(seq):
+    """
+    Residual seasonal-naive: pajak dikurangi baseline musiman (median bulan
+    yang sama tahun sebelumnya ± SEASON_SPREAD bulan, agar anomali tahun lalu
+    tidak terulang sebagai anomali tahun ini), lalu robust z-score terhadap
+    median/MAD residual usaha tsb. Bulan tanpa pembanding musiman (mis. tahun
+    pertama) memakai rolling_median_score
+    """
+    score = rolling_median_score(seq)
+
+    lagged = _lagged_values(seq, SEASON_LENGTH + np.arange(-SEASON_SPREAD, SEASON_SPREAD + 1))
+    baseline = _row_median(lagged)
+    baseline[np.isnan(lagged[:, SEASON_SPREAD])] = np.nan  # wajib ada bulan yang sama tahun lalu
+    residual = seq.pajak - baseline
+
+    center = _group_median(residual, seq.groups, seq.n_groups)
+    mad = _group_median(np.abs(residual - center[seq.groups]), seq.groups, seq.n_groups)
+    counts = np.bincount(seq.groups[~np.isnan(residual)], minlength=seq.n_groups)
+
+    usable = ~np.isnan(residual) & (counts[seq.groups] >= MIN_PERIODS)
+    seasonal = _scaled(residual - center[seq.groups], MAD_SCALE * mad[seq.groups], baseline, ROBUST_THRESHOLD)
+    score[usable] = seasonal[usable]
+    return score
+
+
+DETECTORS = {
+    'growth': Detector('Growth bulanan ±50% (lama)', 0.5, growth_score, 1),
+    'rolling_mean': Detector(f'Rata-rata {ROLLING_WINDOW} bulan (z-score)', ZSCORE_THRESHOLD,
+                             rolling_mean_score, ROLLING_WINDOW),
+    'mad': Detector(f'Median {ROLLING_WINDOW} bulan (robust z-score MAD)', ROBUST_THRESHOLD,
+                    rolling_median_score, ROLLING_WINDOW),
+    'seasonal': Detector('Musiman: bulan yang sama tahun lalu (MAD)', ROBUST_THRESHOLD, seasonal_score, None),
+}
+
+DEFAULT_DETECTOR = os.environ.get('ANOMALY_DETECTOR', 'growth')
+# Detektor tetap untuk seri_usaha lintas batch: satu seri dihitung dengan satu
+# detektor, apapun detektor upload yang menyentuhnya
+SERIES_DETECTOR = os.environ.get('ANOMALY_SERIES_DETECTOR', 'growth')
+
+for _env, _name in (('ANOMALY_DETECTOR', DEFAULT_DETECTOR), ('ANOMALY_SERIES_DETECTOR', SERIES_DETECTOR)):
+    if _name not in DETECTORS:
+        raise ValueError(f"{_env}={_name!r} tidak dikenal (pilihan: {', '.join(DETECTORS)})")
+del _env, _name
+
+
+def get_detector(name=None):
+    """Detector berdasarkan nama; ValueError jika tidak dikenal"""
+    name = name or DEFAULT_DETECTOR
+    if name not in DETECTORS:
+        raise ValueError(f"Detektor anomali tidak dikenal: {name} (pilihan: {', '.join(DETECTORS)})")
+    return DETECTORS[name]
+
+
+def anomaly_scores(df, detector=None, id_col='nopd'):
+    """
+    Skor anomali per baris untuk semua usaha di df (kolom status,
+    jumlah_pajak_dibayar, bulan_iso/bulan, dan growth untuk detektor 'growth').
+    Output: Series float64 sejajar df (NaN untuk baris tanpa skor)
+    """
+    score_func = get_detector(detector).score
+    scores = np.full(len(df), np.nan)
+
+    if len(df) and id_col in df.columns:
+        seq = _valid_sequence(df, id_col)
+        if seq is not None:
+            scores[seq.order] = score_func(seq)
+
+    return pd.Series(scores, index=df.index, dtype='float64')
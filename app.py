@@ -1,16 +1,52 @@
 #app.py
 
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, render_template, request, redirect, url_for, jsonify, g, Response, stream_with_context
 import pandas as pd
+import numpy as np
+import logging
 import os
+import pickle
 import re
 import calendar
-from db import insert_history_flexible, fetch_file_list, fetch_by_batch_flexible, get_connection
-from db import delete_all_history, delete_batch
+import shutil
+import tempfile
+import time
+from functools import partial
+from openpyxl import load_workbook
+from db import insert_history_flexible, insert_history_chunks, fetch_file_list, fetch_by_batch_flexible, get_connection
+from db import delete_all_history, delete_batch, count_batch_rows, fetch_batch_page, PAGE_SORT_COLUMNS, get_pool_stats
+from db import iter_batch_chunks, iter_by_batch_flexible, append_history_flexible, fetch_business_series
+from db import fetch_batch_detector, refresh_released_series
 from config import DataAttributeConfig, validate_required_columns, map_optional_columns
+from config import DEFAULT_TAHUN, MONTH_NAMES, MONTH_NUMBER_LOOKUP
+from anomaly import DEFAULT_DETECTOR, DETECTORS
+from trend import calculate_growth_vectorized, classify_kondisi, detect_anomalies
+from trend import recompute_series, recompute_trend
+from cache import history_cache
+from jobs import get_job_manager, QueueFull
+from ingest import list_sheet_sources, run_sheets
+from export import EXPORT_FORMATS, export_available, iter_export
+from metrics import registry, span, frame_bytes, observe_request
+
+logger = logging.getLogger(__name__)
+
+# LOG_LEVEL=DEBUG menampilkan detail setiap tahap pipeline (bentuk data, kolom, jumlah baris)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 
 app = Flask(__name__)
 
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _observe_request(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        observe_request(request.endpoint, request.method, response.status_code, time.perf_counter() - start)
+    return response
+
 def color_kondisi(val):
     if val == 'NORMAL':
         return '''
@@ -38,18 +74,100 @@ def color_kondisi(val):
         '''
     return ''
 
+# Semua langkah clean_text_data dalam satu regex: grup 1 = whitespace (jadi satu
+# spasi), sisanya = karakter yang dibuang (simbol selain - : / dan non-ASCII)
+TEXT_CLEAN_PATTERN = re.compile(r'(\s+)|(?:[^\w\s\-:/]|[^\x00-\x7F\s])+')
+
+def _clean_text_match(match):
+    return ' ' if match.group(1) else ''
+
+def clean_text_value(text):
+    """Bersihkan satu string (hasil sama dengan clean_text_data per sel)"""
+    return TEXT_CLEAN_PATTERN.sub(_clean_text_match, text).strip()
+
 def clean_text_data(series):
+    """
+    Normalisasi teks: rapikan whitespace, buang simbol dan karakter non-ASCII.
+    Kolom seperti nama_usaha berulang 12x per tahun, jadi setiap nilai unik
+    cukup dibersihkan sekali lalu dipetakan kembali ke semua baris.
+    Pemetaan memakai dict Python, bukan pd.factorize: hashtable string pandas
+    memotong teks di karakter NUL sehingga '\x00a' dan '\x00b' dianggap sama.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Category: bersihkan setiap kategori; NaN (kode -1) jadi 'nan' seperti astype(str)
+        codes = series.cat.codes.to_numpy()
+        cleaned = [clean_text_value(str(value)) for value in series.cat.categories]
+        if (codes < 0).any():
+            cleaned.append(clean_text_value('nan'))
+        labels, uniques = pd.factorize(np.array(cleaned, dtype=object))
+        return pd.Series(
+            pd.Categorical.from_codes(labels[codes], uniques), index=series.index, name=series.name
+        )
+    
+    values = series.astype(str).tolist()
+    cleaned = {text: clean_text_value(text) for text in set(values)}
+    return pd.Series([cleaned[text] for text in values], index=series.index, name=series.name, dtype=object)
 
-    return (
-        series
-        .astype(str)
-        .str.strip()  
-        .str.replace(r'\s+', ' ', regex=True)  
-        .str.replace(r'[^\w\s\-\:\/]', '', regex=True) 
-        .str.replace(r'[^\x00-\x7F]+', '', regex=True)  
-        .str.replace(r'[\n\r\t\f\v\u00A0]', ' ', regex=True) 
-        .str.strip() 
-    )
+# Selama pipeline analisis kolom teks yang berulang (setiap usaha 12x, bulan
+# hanya 12 nilai) dibawa sebagai category dan angka sebagai float32/int32 jika
+# tidak ada nilai yang berubah. Kembali ke object/float64 hanya di batas
+# tampilan (prepare_display_data) dan database (db.py)
+CATEGORY_COLUMNS = ['nopd', 'npwpd', 'nama_usaha', 'jenis_pajak_usaha', 'bulan', 'bulan_iso', 'id_usaha']
+COMPACT_NUMERIC_COLUMNS = ['jumlah_pajak_dibayar', 'omset_perbulan', 'growth']
+STATUS_CATEGORIES = ['VALID', 'TIDAK VALID']
+
+def to_category(series):
+    """
+    Kolom object -> category, hanya jika semua nilai string (NaN boleh).
+    Hashtable pandas menganggap 1, 1.0, dan True sama, dan memotong string di
+    karakter NUL, jadi kolom campuran atau yang kategorinya menyusut dibiarkan object.
+    """
+    if series.dtype != object or pd.api.types.infer_dtype(series, skipna=True) != 'string':
+        return series
+    codes, uniques = pd.factorize(series)
+    if len(uniques) != len(set(series.dropna())):
+        return series
+    return pd.Series(pd.Categorical.from_codes(codes, uniques), index=series.index, name=series.name)
+
+def compact_numeric(series):
+    """float64 -> float32 / int64 -> int32 jika semua nilai tetap sama persis"""
+    values = series.to_numpy()
+    if series.dtype == np.float64:
+        with np.errstate(over='ignore'):
+            compact = values.astype(np.float32)
+        if not np.array_equal(compact, values, equal_nan=True):
+            return series
+    elif series.dtype == np.int64:
+        info = np.iinfo(np.int32)
+        if len(values) and (values.min() < info.min or values.max() > info.max):
+            return series
+        compact = values.astype(np.int32)
+    else:
+        return series
+    return pd.Series(compact, index=series.index, name=series.name)
+
+def compact_dtypes(df):
+    """Terapkan to_category / compact_numeric ke kolom pipeline (mengubah df)"""
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = to_category(df[col])
+    for col in COMPACT_NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = compact_numeric(df[col])
+    return df
+
+def restore_dtypes(df):
+    """Salinan df dengan category -> object dan float32/int32 -> float64/int64"""
+    restored = df.copy()
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            restored[col] = df[col].astype(object)
+        elif dtype == np.float32:
+            restored[col] = df[col].astype(np.float64)
+        elif dtype == np.int32:
+            restored[col] = df[col].astype(np.int64)
+    return restored
 
 def format_currency(value):
     """
@@ -73,6 +191,81 @@ def format_currency(value):
     except (ValueError, TypeError):
         return str(value)
 
+def format_currency_column(series):
+    """
+    format_currency untuk satu kolom angka tanpa apply per sel: NaN/0 -> '-'
+    lewat mask, bilangan bulat dengan pemisah ribuan, selain itu 2 desimal.
+    Kolom bukan angka memakai map_unique.
+    """
+    if series.dtype.kind not in 'fiu':
+        return map_unique(series, format_currency)
+    
+    values = series.to_numpy(dtype='float64')
+    result = np.full(len(values), '-', dtype=object)
+    shown = ~np.isnan(values) & (values != 0)
+    # inf ikut format 2 desimal ('inf'), sama seperti float.is_integer() False
+    integral = shown & np.isfinite(values)
+    integral[integral] = values[integral] == np.trunc(values[integral])
+    decimal = shown & ~integral
+    result[integral] = list(map('{:,.0f}'.format, values[integral].tolist()))
+    result[decimal] = list(map('{:,.2f}'.format, values[decimal].tolist()))
+    return pd.Series(result, index=series.index, name=series.name)
+
+def format_growth(value):
+    """Growth (rasio) -> persen dengan 2 desimal, '-' jika kosong"""
+    return f"{value*100:.2f}%" if pd.notna(value) else '-'
+
+def format_growth_column(series):
+    """format_growth untuk satu kolom float tanpa apply per sel"""
+    if series.dtype.kind != 'f':
+        return map_unique(series, format_growth)
+    
+    values = series.to_numpy(dtype='float64')
+    result = np.full(len(values), '-', dtype=object)
+    shown = ~np.isnan(values)
+    result[shown] = list(map('{:.2f}%'.format, (values[shown] * 100).tolist()))
+    return pd.Series(result, index=series.index, name=series.name)
+
+def format_date(value):
+    return value.strftime('%Y-%m-%d') if pd.notna(value) else '-'
+
+def format_text(value):
+    """Teks tampilan: di-strip, NaN ('nan') jadi '-'"""
+    text = str(value).strip()
+    return '-' if text == 'nan' else text
+
+def map_unique(series, func):
+    """
+    Sama dengan series.apply(func), tetapi func dipanggil sekali per nilai unik
+    lalu hasilnya dipetakan kembali lewat kode. Angka dikelompokkan per pola bit
+    (0.0 dan -0.0 tetap beda), tanggal lewat factorize, teks lewat dict Python
+    (hashtable pandas menganggap 1, 1.0, dan True sama dan memotong string di
+    NUL). Kolom object campuran tetap memakai apply biasa.
+    """
+    values = series.to_numpy()
+    
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        uniques = list(series.cat.categories) + [np.nan]  # kode -1 (NaN) -> elemen terakhir
+    elif series.dtype.kind == 'f':
+        codes, unique_bits = pd.factorize(values.view(f'i{values.itemsize}'))
+        uniques = unique_bits.view(values.dtype).tolist()
+    elif series.dtype.kind in 'iub':
+        codes, uniques = pd.factorize(values)
+        uniques = uniques.tolist()
+    elif series.dtype.kind == 'M':
+        codes, uniques = pd.factorize(series, use_na_sentinel=False)
+        uniques = list(uniques)
+    elif series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+        results = {value: func(value) for value in set(values)}
+        return pd.Series([results[value] for value in values], index=series.index, name=series.name, dtype=object)
+    else:
+        return series.apply(func)
+    
+    lookup = np.empty(len(uniques), dtype=object)
+    lookup[:] = [func(value) for value in uniques]
+    return pd.Series(lookup[codes], index=series.index, name=series.name, dtype=object)
+
 def parse_bulan_col(series):
     """
     Robust parsing of the 'bulan' column: try multiple formats
@@ -82,36 +275,106 @@ def parse_bulan_col(series):
     s3 = pd.to_datetime(series, errors='coerce')                 
     return s1.fillna(s2).fillna(s3)
 
-def preprocess_excel(file):
+# Mode baca Excel: 'pandas' (pd.read_excel), 'stream' (openpyxl read-only baris per baris),
+# atau 'auto' (stream untuk file di atas EXCEL_STREAM_THRESHOLD_MB)
+EXCEL_READ_MODE = os.environ.get('EXCEL_READ_MODE', 'auto')
+EXCEL_STREAM_THRESHOLD_MB = float(os.environ.get('EXCEL_STREAM_THRESHOLD_MB', '20'))
+# Jumlah baris sheet per potongan nilai pajak pada mode stream
+EXCEL_STREAM_CHUNK_ROWS = 5000
+
+MONTH_HEADER_KEYWORDS = ['JANUARI', 'FEBRUARI', 'MARET', 'APRIL', 'MEI', 'JUNI', 
+                         'JULI', 'AGUSTUS', 'SEPTEMBER', 'OKTOBER', 'NOVEMBER', 'DESEMBER',
+                         'JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+
+# Tahun pembayaran dari judul kolom bulan, mis. "PEMBAYARAN TAHUN 2024"
+PAYMENT_YEAR_REGEX = re.compile(r'TAHUN\s+(\d{4})', re.IGNORECASE)
+
+def detect_payment_year(columns):
+    """Tahun dari judul kolom 'PEMBAYARAN TAHUN YYYY'; DEFAULT_TAHUN jika tidak ada"""
+    for col in columns:
+        match = PAYMENT_YEAR_REGEX.search(str(col))
+        if match:
+            return int(match.group(1))
+    logger.debug("Payment year not found in header, using %s", DEFAULT_TAHUN)
+    return DEFAULT_TAHUN
+
+# Mapping kolom identitas Excel ke nama kolom internal
+IDENTITY_COLUMN_MAPPING = {
+    'JENIS PAJAK USAHA': 'jenis_pajak_usaha',
+    'NPWPD': 'npwpd',
+    'NOPD': 'nopd', 
+    'NAMA USAHA': 'nama_usaha'
+}
+
+def _file_size(file):
+    """Ukuran file (path atau file upload) dalam bytes, None jika tidak diketahui"""
+    if isinstance(file, (str, os.PathLike)):
+        return os.path.getsize(file)
+    
+    stream = getattr(file, 'stream', file)
+    try:
+        position = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(position)
+        return size
+    except (AttributeError, OSError):
+        return None
+
+def excel_read_mode(file, mode=None):
+    """Mode baca efektif: 'auto' jadi 'stream' untuk file di atas EXCEL_STREAM_THRESHOLD_MB"""
+    mode = mode or EXCEL_READ_MODE
+    if mode == 'auto':
+        size = _file_size(file)
+        threshold = EXCEL_STREAM_THRESHOLD_MB * 1024 * 1024
+        mode = 'stream' if size is not None and size > threshold else 'pandas'
+    return mode
+
+def preprocess_excel(file, mode=None, sheet_name=0):
     """
     Preprocess file Excel dengan header bulan di row 0
     REVISI: Generate complete data matrix - semua usaha dari bulan pertama sampai terakhir yang ada data
     FIXED: Handle optional columns yang mungkin tidak ada
+    mode: 'pandas', 'stream', atau 'auto' (default EXCEL_READ_MODE)
+    sheet_name: nama atau index sheet (default sheet pertama)
     """
+    mode = excel_read_mode(file, mode)
+    logger.debug("Excel read mode: %s", mode)
+    
+    if mode == 'stream':
+        return concat_excel_chunks(iter_excel_chunks(file, sheet_name=sheet_name))
+    
     # Baca excel
-    df = pd.read_excel(file)
+    df = pd.read_excel(file, sheet_name=sheet_name)
+    
+    return preprocess_sheet(df)
+
+def resolve_sheet_layout(columns, header_row=None):
+    """
+    Tentukan nama kolom akhir, kolom identitas, dan posisi kolom bulan
+    columns: nama kolom hasil baca sheet
+    header_row: isi row 0 (nama bulan), None jika sheet tidak punya baris data
+    Return: (columns, identity_cols, month_positions)
+    """
+    columns = list(columns)
     
     # SPECIAL HANDLING: Header bulan ada di row 0
-    if len(df) > 0:
-        header_row = df.iloc[0]  # Row pertama berisi nama bulan
-        print(f"DEBUG: Header row content: {header_row.tolist()}")
+    if header_row is not None:
+        header_row = list(header_row)
+        logger.debug("Header row content: %s", header_row)
         
         # Buat mapping nama kolom baru
         new_column_names = []
-        for i, col in enumerate(df.columns):
+        for col, header_cell in zip(columns, header_row):
             # Cek apakah header row ada nama bulan yang valid
-            if not pd.isna(header_row.iloc[i]) and str(header_row.iloc[i]).strip():
-                header_value = str(header_row.iloc[i]).strip()
+            if not pd.isna(header_cell) and str(header_cell).strip():
+                header_value = str(header_cell).strip()
                 
                 # Jika header berisi nama bulan, gunakan sebagai nama kolom
-                month_keywords = ['JANUARI', 'FEBRUARI', 'MARET', 'APRIL', 'MEI', 'JUNI', 
-                                'JULI', 'AGUSTUS', 'SEPTEMBER', 'OKTOBER', 'NOVEMBER', 'DESEMBER',
-                                'JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
-                
-                if any(header_value.upper().startswith(month.upper()) for month in month_keywords):
+                if any(header_value.upper().startswith(month.upper()) for month in MONTH_HEADER_KEYWORDS):
                     month_name = header_value.strip().lower()
                     new_column_names.append(month_name)
-                    print(f"DEBUG: Mapped column '{col}' → '{month_name}'")
+                    logger.debug("Mapped column '%s' → '%s'", col, month_name)
                 else:
                     # Pertahankan nama asli untuk non-month
                     new_column_names.append(col)
@@ -119,31 +382,19 @@ def preprocess_excel(file):
                 # Pertahankan nama asli untuk kolom identitas
                 new_column_names.append(col)
         
-        # Rename kolom
-        df.columns = new_column_names
-        print(f"DEBUG: After renaming with header row: {list(df.columns)}")
-        
-        # Hapus row 0 karena sudah dipakai sebagai header
-        df = df.drop(0).reset_index(drop=True)
-        print(f"DEBUG: After dropping header row: {df.shape}")
+        columns = new_column_names
+        logger.debug("After renaming with header row: %s", columns)
     
     # Mapping kolom identitas - FIXED: Handle optional columns
-    column_mapping = {
-        'JENIS PAJAK USAHA': 'jenis_pajak_usaha',
-        'NPWPD': 'npwpd',
-        'NOPD': 'nopd', 
-        'NAMA USAHA': 'nama_usaha'
-    }
-    
-    df = df.rename(columns=column_mapping)
-    print(f"DEBUG: After identity column mapping: {list(df.columns)}")
+    columns = [IDENTITY_COLUMN_MAPPING.get(col, col) for col in columns]
+    logger.debug("After identity column mapping: %s", columns)
     
     # FIXED: Identifikasi kolom identitas yang benar-benar ada
     # Hanya gunakan kolom required + optional yang tersedia
     potential_identity_cols = ['jenis_pajak_usaha', 'npwpd', 'nopd', 'nama_usaha']
-    identity_cols = [col for col in potential_identity_cols if col in df.columns]
+    identity_cols = [col for col in potential_identity_cols if col in columns]
     
-    print(f"DEBUG: Available identity columns: {identity_cols}")
+    logger.debug("Available identity columns: %s", identity_cols)
     
     # Validasi minimal: harus ada nama_usaha dan salah satu ID (nopd/npwpd)
     if 'nama_usaha' not in identity_cols:
@@ -153,59 +404,312 @@ def preprocess_excel(file):
         raise ValueError("Tidak ditemukan kolom ID usaha (NOPD atau NPWPD) dalam file Excel")
     
     # Kolom bulan = semua kolom selain identitas dan yang mengandung "PEMBAYARAN" atau "Unnamed"
-    month_cols = []
-    for col in df.columns:
+    month_positions = []
+    for i, col in enumerate(columns):
         if (col not in identity_cols and 
             not col.startswith('PEMBAYARAN') and 
             not col.startswith('Unnamed') and
             col.strip() != ''):
-            month_cols.append(col)
+            month_positions.append(i)
     
-    print(f"DEBUG: Identified month columns: {month_cols}")
+    logger.debug("Identified month columns: %s", [columns[i] for i in month_positions])
     
-    if not month_cols:
+    if not month_positions:
         raise ValueError("Tidak dapat mengidentifikasi kolom bulan dalam file Excel")
     
-    # Drop rows yang tidak memiliki data identitas minimal (nama_usaha)
-    df = df.dropna(subset=['nama_usaha'])
+    return columns, identity_cols, month_positions
+
+def _identity_row_mask(identity_df):
+    """
+    Baris yang punya data identitas minimal: nama_usaha dan ID usaha
+    (npwpd jika ada, selain itu nopd)
+    """
+    mask = identity_df['nama_usaha'].notna()
     
-    # Jika tidak ada npwpd tapi ada nopd, gunakan nopd untuk identifikasi unique
-    if 'npwpd' not in df.columns and 'nopd' in df.columns:
-        df = df.dropna(subset=['nopd'])
-        unique_id_col = 'nopd'
-    elif 'npwpd' in df.columns:
-        df = df.dropna(subset=['npwpd'])  
+    if 'npwpd' in identity_df.columns:
         unique_id_col = 'npwpd'
     else:
-        # Fallback: buat ID dari nama_usaha
-        df['temp_id'] = df['nama_usaha'].astype(str).str.strip()
-        unique_id_col = 'temp_id'
-    
-    print(f"DEBUG: Using {unique_id_col} as unique identifier")
-    print(f"DEBUG: After dropping empty identity rows: {df.shape}")
-    
-    # Melt: ubah wide format ke long format - FIXED: gunakan identity_cols yang dinamis
-    df_long = df.melt(
-        id_vars=identity_cols,
-        value_vars=month_cols,
-        var_name="bulan",
-        value_name="jumlah_pajak_dibayar"
-    )
+        unique_id_col = 'nopd'
+    mask &= identity_df[unique_id_col].notna()
     
-    print(f"DEBUG: After initial melt shape: {df_long.shape}")
+    logger.debug("Using %s as unique identifier", unique_id_col)
+    return mask.to_numpy()
+
+def preprocess_sheet(df):
+    """
+    Preprocess satu sheet (DataFrame hasil read_excel) ke format long
+    dengan complete matrix usaha × bulan
+    """
+    header_row = df.iloc[0].tolist() if len(df) > 0 else None
+    tahun = detect_payment_year(df.columns)
+    columns, identity_cols, month_positions = resolve_sheet_layout(df.columns, header_row)
+    df.columns = columns
     
-    # ===== REVISI UTAMA: GENERATE COMPLETE DATA MATRIX DENGAN RANGE DETECTION =====
+    if header_row is not None:
+        # Hapus row 0 karena sudah dipakai sebagai header
+        df = df.drop(0).reset_index(drop=True)
+        logger.debug("After dropping header row: %s", df.shape)
     
-    # Convert jumlah_pajak_dibayar ke numeric untuk deteksi data
-    df_long['jumlah_pajak_dibayar'] = pd.to_numeric(df_long['jumlah_pajak_dibayar'], errors='coerce')
+    # Drop rows yang tidak memiliki data identitas minimal
+    df = df[_identity_row_mask(df)]
+    logger.debug("After dropping empty identity rows: %s", df.shape)
     
-    # Identifikasi bulan-bulan yang benar-benar ada pembayaran
-    months_with_payment = df_long[
-        (df_long['jumlah_pajak_dibayar'].notna()) & 
-        (df_long['jumlah_pajak_dibayar'] > 0)
-    ]['bulan'].unique()
+    # Nilai pajak dalam urutan format long (per kolom bulan, lalu per baris)
+    pajak_long = pd.to_numeric(
+        pd.Series(df.iloc[:, month_positions].to_numpy(dtype=object).ravel(order='F')),
+        errors='coerce'
+    )
     
-    print(f"DEBUG: Months with actual payments: {sorted(months_with_payment)}")
+    return build_complete_matrix(
+        df[identity_cols].reset_index(drop=True),
+        [columns[i] for i in month_positions],
+        pajak_long.to_numpy(),
+        tahun
+    )
+
+# Nilai teks yang dibaca pd.read_excel sebagai NaN (na_values default) + kode error Excel
+EXCEL_NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+    '#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!',
+])
+
+def _cell_value(value):
+    """Nilai sel openpyxl (values_only) seperti hasil pd.read_excel: NA -> NaN, float bulat -> int"""
+    if value is None or (isinstance(value, str) and value in EXCEL_NA_VALUES):
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+_cell_values = np.frompyfunc(_cell_value, 1, 1)
+
+def _iter_sheet_rows(sheet):
+    """Baris sheet sebagai tuple nilai, baris kosong dilewati seperti read_excel"""
+    sheet.reset_dimensions()
+    for row in sheet.iter_rows(values_only=True):
+        width = len(row)
+        while width and row[width - 1] is None:
+            width -= 1
+        if width:
+            yield row[:width]
+
+def _pad_row(row, width):
+    row = list(row)
+    return row + [None] * (width - len(row)) if len(row) < width else row[:width]
+
+def _header_names(row):
+    """
+    Nama kolom dari baris judul seperti read_excel: sel kosong -> 'Unnamed: i',
+    nama yang sama diberi akhiran '.1', '.2', ...
+    """
+    names = []
+    counts = {}
+    for i, value in enumerate(row):
+        if value is None or value == '':
+            name = f"Unnamed: {i}"
+        elif isinstance(value, float) and value.is_integer():
+            name = int(value)
+        else:
+            name = value
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts.get(name, 0)
+        counts[name] = count + 1
+        names.append(name)
+    return names
+
+def _integer_cells(raw):
+    """Mask sel yang menjadi integer setelah pd.to_numeric (int Excel atau teks angka bulat)"""
+    kinds = np.frompyfunc(type, 1, 1)(raw)
+    is_integer = (kinds == int)
+    is_float = (kinds == float)
+    if is_float.any():
+        is_integer[is_float] = [value.is_integer() for value in raw[is_float]]
+    is_text = (kinds == str)
+    if is_text.any():
+        is_integer[is_text] = [
+            isinstance(pd.to_numeric(value, errors='coerce'), (int, np.integer))
+            for value in raw[is_text]
+        ]
+    return is_integer.astype(bool)
+
+class _IdentityTypes:
+    """
+    Inferensi tipe kolom identitas lintas potongan, sama seperti read_excel:
+    kolom yang semua nilainya angka jadi int64 (float64 jika ada kosong /
+    pecahan), selain itu object
+    """
+    
+    def __init__(self, columns):
+        self.numeric = {col: True for col in columns}
+        self.fractional = {col: False for col in columns}
+    
+    def update(self, identity_df):
+        for col in identity_df.columns:
+            if not self.numeric[col]:
+                continue
+            values = identity_df[col]
+            numeric = pd.to_numeric(values, errors='coerce')
+            if numeric.notna().sum() != values.notna().sum():
+                self.numeric[col] = False
+            elif numeric.isna().any() or (numeric % 1 != 0).any():
+                self.fractional[col] = True
+    
+    def apply(self, identity_df):
+        for col in identity_df.columns:
+            if self.numeric[col]:
+                numeric = pd.to_numeric(identity_df[col])
+                identity_df[col] = numeric.astype('float64' if self.fractional[col] else 'int64')
+        return identity_df
+
+def iter_excel_chunks(file, chunk_rows=None, sheet_name=0):
+    """
+    Preprocess Excel per potongan dengan worksheet read-only openpyxl.
+    Generator: setiap potongan chunk_rows baris sheet dikeluarkan sebagai
+    DataFrame long (format build_complete_matrix), jadi memory hanya
+    sebesar satu potongan berapapun panjang sheet. pd.concat semua potongan
+    sama dengan preprocess_sheet(pd.read_excel(file)).
+    
+    Dua tahap: (1) baca sheet sekali, simpan potongan mentah ke file sementara
+    sambil mengumpulkan yang butuh seluruh sheet (range bulan, tipe kolom
+    identitas, nilai pajak bulat); (2) bangun format long per potongan.
+    Usaha yang muncul lagi di potongan berikutnya dibuang (kemunculan pertama
+    menang, sama seperti build_complete_matrix), dicek lewat hash identitas.
+    """
+    chunk_rows = chunk_rows or EXCEL_STREAM_CHUNK_ROWS
+    workbook = load_workbook(getattr(file, 'stream', file), read_only=True, data_only=True, keep_links=False)
+    
+    with tempfile.TemporaryFile(prefix='excel_chunks_') as spool:
+        try:
+            if isinstance(sheet_name, str):
+                sheet = workbook[sheet_name]
+            else:
+                sheet = workbook.worksheets[sheet_name]
+            rows = _iter_sheet_rows(sheet)
+            
+            # Baris judul (nama kolom) + row 0 (nama bulan)
+            head_rows = [row for _, row in zip(range(2), rows)]
+            if not head_rows:
+                # Sheet kosong: error yang sama dengan jalur read_excel (kolom tidak ditemukan)
+                resolve_sheet_layout([])
+            width = max(len(row) for row in head_rows)
+            head_columns = _header_names(_pad_row(head_rows[0], width))
+            
+            header_row = None
+            if len(head_rows) > 1:
+                header_row = list(_cell_values(np.array(_pad_row(head_rows[1], width), dtype=object)))
+            tahun = detect_payment_year(head_columns)
+            columns, identity_cols, month_positions = resolve_sheet_layout(head_columns, header_row)
+            identity_positions = [columns.index(col) for col in identity_cols]
+            row_width = max([width] + identity_positions + month_positions) + 1
+            month_cols = [columns[i] for i in month_positions]
+            
+            identity_types = _IdentityTypes(identity_cols)
+            months_paid = np.zeros(len(month_positions), dtype=bool)
+            all_integer = True
+            n_rows = 0
+            n_chunks = 0
+            
+            # Row 0 ikut dalam inferensi tipe kolom identitas, sama seperti read_excel
+            if header_row is not None:
+                identity_types.update(pd.DataFrame([[header_row[i] for i in identity_positions]],
+                                                   columns=identity_cols, dtype=object))
+            
+            def spool_chunk(chunk):
+                nonlocal all_integer, n_rows, n_chunks
+                block = np.array([_pad_row(row, row_width) for row in chunk], dtype=object)
+                identity_df = pd.DataFrame(_cell_values(block[:, identity_positions]),
+                                           columns=identity_cols, dtype=object)
+                identity_types.update(identity_df)
+                mask = _identity_row_mask(identity_df)
+                
+                raw = block[:, month_positions][mask]
+                numeric = pd.to_numeric(pd.Series(raw.ravel()), errors='coerce')
+                values = numeric.to_numpy(dtype='float64').reshape(raw.shape)
+                months_paid[:] |= (values > 0).any(axis=0)
+                all_integer = all_integer and bool(_integer_cells(raw).all())
+                n_rows += len(chunk)
+                n_chunks += 1
+                pickle.dump((identity_df.to_numpy()[mask], values), spool, pickle.HIGHEST_PROTOCOL)
+            
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_rows:
+                    spool_chunk(chunk)
+                    chunk = []
+            if chunk:
+                spool_chunk(chunk)
+            del chunk
+        finally:
+            workbook.close()
+        
+        logger.debug("STREAM: Read %s data rows in %s chunks", n_rows, n_chunks)
+        
+        months_with_payment = pd.unique(np.array(month_cols, dtype=object)[months_paid])
+        all_months = resolve_month_range(month_cols, months_with_payment)
+        
+        spool.seek(0)
+        seen = np.empty(0, dtype='uint64')
+        for _ in range(n_chunks):
+            identity, values = pickle.load(spool)
+            if not len(identity):
+                continue
+            identity_df = identity_types.apply(pd.DataFrame(identity, columns=identity_cols))
+            
+            # Buang usaha yang sudah keluar di potongan sebelumnya
+            hashes = pd.util.hash_pandas_object(identity_df, index=False).to_numpy()
+            positions = np.minimum(np.searchsorted(seen, hashes), max(len(seen) - 1, 0))
+            fresh = ~(seen[positions] == hashes) if len(seen) else np.ones(len(hashes), dtype=bool)
+            if not fresh.any():
+                continue
+            seen = np.union1d(seen, hashes[fresh])
+            
+            # Urutan format long (per kolom bulan, lalu per baris); tipe int64 jika semua
+            # nilai bulat tanpa kosong, sama seperti pd.to_numeric pada jalur read_excel
+            pajak_long = values[fresh].ravel(order='F')
+            if all_integer:
+                pajak_long = pajak_long.astype('int64')
+            
+            yield build_complete_matrix(
+                identity_df[fresh].reset_index(drop=True), month_cols, pajak_long, tahun, all_months
+            )
+
+def concat_excel_chunks(chunks):
+    """
+    Gabungkan potongan iter_excel_chunks jadi satu DataFrame long. Kategori
+    tiap potongan berbeda sehingga concat menghasilkan object; dijadikan category lagi
+    """
+    df_long = pd.concat(chunks, ignore_index=True)
+    for col in CATEGORY_COLUMNS:
+        if col in df_long.columns:
+            df_long[col] = to_category(df_long[col])
+    return df_long
+
+def _repeat_values(series, repeats):
+    """np.repeat per elemen; untuk category cukup kodenya yang diulang"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return pd.Categorical.from_codes(np.repeat(series.cat.codes.to_numpy(), repeats), dtype=series.dtype)
+    return np.repeat(series.to_numpy(), repeats)
+
+def _tile_values(values, reps):
+    """np.tile daftar nilai per bulan; category jika semuanya string"""
+    column = to_category(pd.Series(values, dtype=object))
+    positions = np.tile(np.arange(len(values)), reps)
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return pd.Categorical.from_codes(column.cat.codes.to_numpy()[positions], dtype=column.dtype)
+    return column.to_numpy()[positions]
+
+def resolve_month_range(month_cols, months_with_payment):
+    """
+    Daftar bulan complete matrix: dari bulan pertama sampai terakhir yang ada pembayaran
+    month_cols: nama kolom bulan sesuai urutan sheet
+    months_with_payment: nama kolom bulan yang punya pajak > 0
+    """
+    logger.debug("Months with actual payments: %s", sorted(months_with_payment))
     
     if len(months_with_payment) == 0:
         raise ValueError("Tidak ada data pembayaran yang valid ditemukan dalam file")
@@ -221,12 +725,15 @@ def preprocess_excel(file):
         if month_clean in month_order:
             month_indices.append(month_order.index(month_clean))
         else:
-            print(f"WARNING: Unknown month name '{month}', skipping...")
+            logger.warning("Unknown month name '%s', skipping...", month)
+    
+    # Bulan unik di data (urutan kolom), dipakai ulang untuk range detection
+    unique_months = pd.unique(np.array(month_cols, dtype=object))
     
     if not month_indices:
         # Fallback: gunakan semua bulan yang ada di data
-        all_months = sorted(df_long['bulan'].unique())
-        print(f"DEBUG: Fallback - using all months found: {all_months}")
+        all_months = sorted(unique_months)
+        logger.debug("Fallback - using all months found: %s", all_months)
     else:
         # Buat range dari bulan pertama sampai terakhir
         first_month_idx = min(month_indices)
@@ -238,60 +745,85 @@ def preprocess_excel(file):
         # Filter hanya bulan yang ada di data asli (untuk handle case nama bulan beda)
         all_months = []
         for month in month_range:
-            matching_months = [m for m in df_long['bulan'].unique() if m.strip().lower() == month]
+            matching_months = [m for m in unique_months if m.strip().lower() == month]
             if matching_months:
                 all_months.append(matching_months[0])  # Ambil yang pertama dengan formatting asli
         
-        print(f"DEBUG: Detected month range: {month_order[first_month_idx]} to {month_order[last_month_idx]}")
-        print(f"DEBUG: Final month list for complete matrix: {all_months}")
-    
-    # Identifikasi semua usaha unik - FIXED: gunakan unique_id_col yang dinamis
-    all_businesses = df_long[identity_cols].drop_duplicates()
-    print(f"DEBUG: Found {len(all_businesses)} unique businesses")
-    print(f"DEBUG: Will create complete matrix: {len(all_businesses)} businesses × {len(all_months)} months = {len(all_businesses) * len(all_months)} records")
-    
-    # Buat kombinasi lengkap semua usaha × range bulan - FIXED: handle optional columns
-    complete_combinations = []
-    for _, business in all_businesses.iterrows():
-        for month in all_months:
-            combination = {'bulan': month, 'jumlah_pajak_dibayar': None}
-            
-            # Tambahkan kolom identitas yang tersedia
-            for col in identity_cols:
-                combination[col] = business[col]
-            
-            complete_combinations.append(combination)
-    
-    df_complete = pd.DataFrame(complete_combinations)
-    print(f"DEBUG: Complete combinations shape: {df_complete.shape}")
-    
-    # Merge dengan data asli, prioritaskan data asli jika ada
-    # FIXED: gunakan unique_id_col untuk merge
-    df_merged = df_complete.merge(
-        df_long[[unique_id_col, 'bulan', 'jumlah_pajak_dibayar']], 
-        on=[unique_id_col, 'bulan'], 
-        how='left',
-        suffixes=('', '_actual')
+        logger.debug("Detected month range: %s to %s", month_order[first_month_idx], month_order[last_month_idx])
+        logger.debug("Final month list for complete matrix: %s", all_months)
+    
+    return all_months
+
+def build_complete_matrix(identity_df, month_cols, pajak_long, tahun=DEFAULT_TAHUN, all_months=None):
+    """
+    Bangun format long complete matrix usaha × bulan
+    identity_df: kolom identitas per baris sheet (sudah dibersihkan)
+    month_cols: nama kolom bulan sesuai urutan sheet
+    pajak_long: nilai pajak numerik, urut per kolom bulan lalu per baris
+    tahun: tahun pembayaran sheet (detect_payment_year), dipakai untuk bulan_iso
+    all_months: range bulan (resolve_month_range) jika sudah dihitung untuk
+                seluruh sheet, mis. saat dibangun per potongan (iter_excel_chunks)
+    """
+    identity_cols = list(identity_df.columns)
+    n_rows = len(identity_df)
+    
+    # Kode usaha dihitung di format wide (satu baris per usaha), urutan kemunculan pertama
+    business_codes = identity_df.groupby(identity_cols, sort=False, dropna=False).ngroup().to_numpy()
+    
+    pajak_series = pd.Series(pajak_long)
+    
+    logger.debug("After initial melt shape: %s", (len(pajak_series), len(identity_cols) + 2))
+    
+    # ===== REVISI UTAMA: GENERATE COMPLETE DATA MATRIX DENGAN RANGE DETECTION =====
+    
+    if all_months is None:
+        # Identifikasi bulan-bulan yang benar-benar ada pembayaran
+        long_months = np.repeat(np.array(month_cols, dtype=object), n_rows)
+        months_with_payment = pd.unique(long_months[(pajak_series.notna() & (pajak_series > 0)).to_numpy()])
+        all_months = resolve_month_range(month_cols, months_with_payment)
+    
+    # Identifikasi semua usaha unik - baris pertama untuk setiap kode usaha
+    n_businesses = int(business_codes.max()) + 1 if len(business_codes) else 0
+    first_rows = np.unique(business_codes, return_index=True)[1]
+    all_businesses = identity_df.iloc[first_rows]
+    n_months = len(all_months)
+    
+    logger.debug("Found %s unique businesses", n_businesses)
+    logger.debug("Will create complete matrix: %s businesses × %s months = %s records", n_businesses, n_months, n_businesses * n_months)
+    
+    # Complete matrix lewat reindex: setiap sel (usaha, bulan) punya posisi tetap
+    # usaha * n_months + bulan, sel yang tidak ada di data otomatis jadi NaN
+    month_position = {month: i for i, month in enumerate(all_months)}
+    month_codes = np.repeat(
+        np.array([month_position.get(col, -1) for col in month_cols]),
+        n_rows
     )
+    long_business_codes = np.tile(business_codes, len(month_cols))
+    in_range = month_codes >= 0
     
-    # Update dengan data aktual jika ada, sisanya tetap None
-    df_merged['jumlah_pajak_dibayar'] = df_merged['jumlah_pajak_dibayar_actual'].fillna(df_merged['jumlah_pajak_dibayar'])
+    cell_positions = long_business_codes[in_range] * n_months + month_codes[in_range]
+    cell_values = pd.Series(
+        pajak_series.to_numpy()[in_range],
+        index=cell_positions
+    )
+    # Jika usaha yang sama muncul dua kali, ambil nilai pertama
+    cell_values = cell_values[~cell_values.index.duplicated(keep='first')]
     
-    # Drop kolom helper
-    df_merged = df_merged.drop(columns=['jumlah_pajak_dibayar_actual'], errors='ignore')
+    complete_values = cell_values.reindex(np.arange(n_businesses * n_months)).to_numpy()
     
-    df_long = df_merged
+    # Kolom identitas dijadikan category per usaha, lalu cukup kodenya yang diulang
+    df_long = pd.DataFrame({
+        col: _repeat_values(to_category(all_businesses[col]), n_months) for col in identity_cols
+    })
+    df_long['bulan'] = _tile_values(all_months, n_businesses)
+    df_long['jumlah_pajak_dibayar'] = complete_values
     
-    print(f"DEBUG: After merging complete combinations: {df_long.shape}")
+    logger.debug("After building complete matrix: %s", df_long.shape)
     
     # Hitung omset berdasarkan pajak (hanya untuk yang ada pajak)
-    df_long['omset_perbulan'] = df_long['jumlah_pajak_dibayar'].apply(
-        lambda x: x * 10 if pd.notna(x) and x > 0 else None
-    )
+    df_long['omset_perbulan'] = df_long['jumlah_pajak_dibayar'].where(df_long['jumlah_pajak_dibayar'] > 0) * 10
     
     # Convert nama bulan ke format ISO (YYYY-MM)
-    tahun = 2025  # Sesuai dengan "PEMBAYARAN TAHUN 2025"
-    
     bulan_mapping = {
         'januari': '01', 'jan': '01',
         'februari': '02', 'feb': '02', 
@@ -317,28 +849,32 @@ def preprocess_excel(file):
         if month_num:
             return f"{tahun}-{month_num}"
         else:
-            print(f"DEBUG: Unknown month name: '{month_name}'")
+            logger.debug("Unknown month name: '%s'", month_name)
             return f"{tahun}-01"  # Default ke Januari
     
-    df_long['bulan_iso'] = df_long['bulan'].apply(convert_month_to_iso)
+    # Konversi cukup sekali per bulan, lalu diulang untuk setiap usaha
+    iso_months = [convert_month_to_iso(month) for month in all_months]
+    df_long['bulan_iso'] = _tile_values(iso_months, n_businesses)
     
     # Buat tanggal pembayaran HANYA untuk yang benar-benar bayar pajak
-    def create_payment_date(row):
-        if pd.notna(row['jumlah_pajak_dibayar']) and row['jumlah_pajak_dibayar'] > 0 and row['bulan_iso']:
-            return pd.to_datetime(row['bulan_iso'] + '-15', errors='coerce')
-        else:
-            return pd.NaT  # No payment date for non-payments
-    
-    df_long['tanggal_pembayaran'] = df_long.apply(create_payment_date, axis=1)
+    payment_dates = pd.to_datetime(
+        pd.Series([f"{iso}-15" if iso else None for iso in iso_months], dtype=object),
+        errors='coerce'
+    )
+    df_long['tanggal_pembayaran'] = pd.Series(
+        np.tile(payment_dates.to_numpy(), n_businesses), index=df_long.index
+    ).where(df_long['jumlah_pajak_dibayar'] > 0)
     
     # Buat id_usaha - FIXED: gunakan unique_id_col atau fallback
+    # (dikonversi per usaha, lalu diulang seperti kolom identitas)
     if 'nopd' in df_long.columns:
-        df_long['id_usaha'] = df_long['nopd'].astype(str)
+        id_source = all_businesses['nopd']
     elif 'npwpd' in df_long.columns:
-        df_long['id_usaha'] = df_long['npwpd'].astype(str)
+        id_source = all_businesses['npwpd']
     else:
         # Fallback: gunakan nama_usaha sebagai ID
-        df_long['id_usaha'] = df_long['nama_usaha'].astype(str)
+        id_source = all_businesses['nama_usaha']
+    df_long['id_usaha'] = _repeat_values(to_category(id_source.astype(str)), n_months)
     
     # Reorder kolom - FIXED: hanya ambil kolom yang ada
     base_columns = [
@@ -363,13 +899,60 @@ def preprocess_excel(file):
     
     return df_long
 
+def _filled_text_mask(df, col):
+    """
+    Mask kolom required yang terisi: bukan None/NaN, bukan 0/False,
+    dan tidak kosong / 'nan' / 'None' setelah di-strip
+    """
+    if col not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    
+    series = df[col]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Cukup cek setiap kategori sekali; kode -1 (NaN) selalu kosong
+        filled = _filled_text_mask(pd.DataFrame({col: series.cat.categories}), col)
+        return np.append(filled, False)[series.cat.codes.to_numpy()]
+    
+    mask = series.notna().to_numpy() & ~series.astype(str).str.strip().isin(['', 'nan', 'None']).to_numpy()
+    
+    # Nilai non-string yang falsy (0, 0.0, False) juga dianggap kosong
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        mask &= series.ne(0).to_numpy()
+    elif series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) != 'string':
+        non_string = series.map(type).ne(str)
+        mask &= ~(non_string & pd.to_numeric(series.where(non_string), errors='coerce').eq(0)).to_numpy()
+    
+    return mask
+
+def classify_status(df):
+    """
+    REVISI: Status berdasarkan kelengkapan data required dan pembayaran
+    VALID jika nama_usaha, nopd, bulan lengkap DAN ada pembayaran (> 0)
+    """
+    required_filled = (
+        _filled_text_mask(df, 'nama_usaha') &
+        _filled_text_mask(df, 'nopd') &
+        _filled_text_mask(df, 'bulan')
+    )
+    
+    if 'jumlah_pajak_dibayar' in df.columns:
+        pajak_valid = (pd.to_numeric(df['jumlah_pajak_dibayar'], errors='coerce') > 0).to_numpy()
+    else:
+        pajak_valid = np.zeros(len(df), dtype=bool)
+    
+    codes = np.where(required_filled & pajak_valid, 0, 1).astype(np.int8)
+    return pd.Series(pd.Categorical.from_codes(codes, STATUS_CATEGORIES), index=df.index)
+
 # Revisi fungsi process_data dengan sistem atribut fleksibel
 
-def process_data_flexible(data):
+def prepare_records(data):
     """
-    Fungsi processing data yang fleksibel dengan kategorisasi atribut
+    Tahap awal process_data_flexible: validasi + mapping kolom, cleaning,
+    omset, dan status per baris. Growth/kondisi belum dihitung karena
+    bergantung pada bulan-bulan lain usaha yang sama (dipakai juga oleh
+    mode append, yang menghitung ulang growth bersama data tersimpan)
     Input: DataFrame atau file
-    Output: DataFrame dengan kolom yang sudah divalidasi dan diperkaya
+    Output: (DataFrame, found_optional)
     """
     # Load data
     if isinstance(data, str) or hasattr(data, "filename"):
@@ -385,8 +968,8 @@ def process_data_flexible(data):
     
     config = DataAttributeConfig()
     
-    print(f"DEBUG: Input data shape: {df.shape}")
-    print(f"DEBUG: Input columns: {list(df.columns)}")
+    logger.debug("Input data shape: %s", df.shape)
+    logger.debug("Input columns: %s", list(df.columns))
     
     # ===== STEP 1: VALIDASI KOLOM REQUIRED =====
     df_validated, missing_required, mapped_columns = validate_required_columns(df, config)
@@ -399,23 +982,23 @@ def process_data_flexible(data):
                 if 'npwpd' in df_validated.columns:
                     df_validated['nopd'] = df_validated['npwpd'].astype(str)
                     missing_required.remove(missing_col)
-                    print(f"DEBUG: Created {missing_col} from npwpd")
+                    logger.debug("Created %s from npwpd", missing_col)
                 elif 'id_usaha' in df_validated.columns:
                     df_validated['nopd'] = df_validated['id_usaha'].astype(str)
                     missing_required.remove(missing_col)
-                    print(f"DEBUG: Created {missing_col} from id_usaha")
+                    logger.debug("Created %s from id_usaha", missing_col)
         
         # Jika masih ada yang hilang, raise error
         if missing_required:
             raise ValueError(f"Kolom required tidak ditemukan: {missing_required}. "
                            f"Pastikan file memiliki kolom: {list(config.REQUIRED_COLUMNS.keys())}")
     
-    print(f"DEBUG: Column mapping applied: {mapped_columns}")
+    logger.debug("Column mapping applied: %s", mapped_columns)
     
     # ===== STEP 2: MAPPING KOLOM OPSIONAL =====
     df_processed, found_optional = map_optional_columns(df_validated, config)
     
-    print(f"DEBUG: Found optional columns - Hidden: {found_optional['hidden']}, Display: {found_optional['display']}")
+    logger.debug("Found optional columns - Hidden: %s, Display: %s", found_optional['hidden'], found_optional['display'])
     
     # ===== STEP 3: VALIDASI DAN CLEANING DATA =====
     
@@ -445,81 +1028,28 @@ def process_data_flexible(data):
     df_processed['omset_perbulan'] = df_processed['jumlah_pajak_dibayar'].apply(calculate_omset)
     
     # 2. Generate Status
-    def validate_payment_status(row):
-        """
-        REVISI: Status berdasarkan kelengkapan data required dan pembayaran
-        """
-        # Cek kelengkapan data required
-        nama_valid = row.get('nama_usaha') and str(row.get('nama_usaha')).strip() not in ['', 'nan', 'None']
-        nopd_valid = row.get('nopd') and str(row.get('nopd')).strip() not in ['', 'nan', 'None'] 
-        bulan_valid = row.get('bulan') and str(row.get('bulan')).strip() not in ['', 'nan', 'None']
-        
-        # Cek pembayaran
-        pajak = row.get('jumlah_pajak_dibayar')
-        pajak_valid = pajak is not None and pd.notna(pajak) and float(pajak) > 0
-        
-        # VALID jika semua required lengkap DAN ada pembayaran
-        if nama_valid and nopd_valid and bulan_valid and pajak_valid:
-            return 'VALID'
-        else:
-            return 'TIDAK VALID'
+    df_processed['status'] = classify_status(df_processed)
     
-    df_processed['status'] = df_processed.apply(validate_payment_status, axis=1)
+    return df_processed, found_optional
+
+def process_data_flexible(data, detector=None):
+    """
+    Fungsi processing data yang fleksibel dengan kategorisasi atribut
+    Input: DataFrame atau file
+    detector: nama detektor anomali (anomaly.DETECTORS), default DEFAULT_DETECTOR
+    Output: DataFrame dengan kolom yang sudah divalidasi dan diperkaya
+    """
+    config = DataAttributeConfig()
+    df_processed, found_optional = prepare_records(data)
     
     # 3. Generate Growth (hanya untuk data VALID)
-    df_processed['growth'] = pd.NA
+    df_processed['growth'] = calculate_growth_vectorized(df_processed)
     
-    # Group by nopd untuk hitung growth per usaha
-    for nopd in df_processed['nopd'].unique():
-        usaha_data = df_processed[df_processed['nopd'] == nopd].copy()
-        
-        # Sort by bulan 
-        if 'bulan_iso' in usaha_data.columns:
-            usaha_data = usaha_data.sort_values('bulan_iso')
-        else:
-            usaha_data = usaha_data.sort_values('bulan')
-        
-        # Hitung growth hanya untuk data VALID berturut-turut
-        valid_data = usaha_data[usaha_data['status'] == 'VALID'].copy()
-        
-        if len(valid_data) >= 2:
-            prev_pajak = None
-            
-            for idx, row in valid_data.iterrows():
-                if prev_pajak is None:
-                    df_processed.loc[idx, 'growth'] = pd.NA  # First record
-                else:
-                    cur_pajak = row['jumlah_pajak_dibayar']
-                    
-                    if prev_pajak == 0:
-                        growth = 1.0 if cur_pajak > 0 else 0.0
-                    else:
-                        growth = (cur_pajak - prev_pajak) / prev_pajak
-                    
-                    # Clamp to reasonable bounds
-                    growth = min(max(growth, -1.0), 10.0)
-                    df_processed.loc[idx, 'growth'] = growth
-                
-                prev_pajak = row['jumlah_pajak_dibayar']
-    
-    # 4. Generate Kondisi
-    def detect_condition(row):
-        """
-        REVISI: Kondisi berdasarkan status dan growth
-        """
-        if row['status'] != 'VALID':
-            return 'TIDAK TAAT PAJAK'
-        
-        if pd.isna(row['growth']):
-            return 'NORMAL'  # First valid record
-            
-        # Deteksi anomali berdasarkan growth ekstrem
-        if abs(row['growth']) >= 0.5:  # Growth >= 50%
-            return 'ANOMALI'
-            
-        return 'NORMAL'
+    # 4. Generate Skor Anomali + Kondisi
+    detect_anomalies(df_processed, detector)
     
-    df_processed['kondisi'] = df_processed.apply(detect_condition, axis=1)
+    # Kolom teks -> category, angka -> float32/int32 jika tanpa perubahan nilai
+    compact_dtypes(df_processed)
     
     # ===== STEP 5: ARRANGE FINAL COLUMNS =====
     
@@ -547,14 +1077,14 @@ def process_data_flexible(data):
     df_final = df_processed[final_columns]
     
     # ===== STEP 6: LOGGING =====
-    print(f"DEBUG: Final data shape: {df_final.shape}")
-    print(f"DEBUG: Final columns: {list(df_final.columns)}")
+    logger.debug("Final data shape: %s", df_final.shape)
+    logger.debug("Final columns: %s", list(df_final.columns))
     
     status_counts = df_final['status'].value_counts()
     kondisi_counts = df_final['kondisi'].value_counts()
     
-    print(f"DEBUG: Status distribution: {status_counts.to_dict()}")
-    print(f"DEBUG: Kondisi distribution: {kondisi_counts.to_dict()}")
+    logger.debug("Status distribution: %s", status_counts.to_dict())
+    logger.debug("Kondisi distribution: %s", kondisi_counts.to_dict())
     
     return df_final
 
@@ -586,73 +1116,156 @@ def get_column_display_mapping(config=None):
     return config.DISPLAY_NAMES.copy()
 
 
-def calculate_dashboard_metrics(df):
+ISO_MONTH_PATTERN = re.compile(r'^\d{4}-\d{2}$')   # 2025-04
+SHORT_MONTH_PATTERN = re.compile(r'^\d{2}-\d{2}$')  # 25-04
+
+def normalize_month(bulan_val):
     """
-    Calculate metrics for dashboard - FIXED untuk konsistensi upload & riwayat
+    Normalisasi nilai bulan ke (nama_bulan, nomor_bulan)
+    Nilai yang tidak dikenali dikembalikan apa adanya dengan nomor 99
     """
-    try:
-        print(f"DEBUG Dashboard: Input shape {df.shape}, columns: {list(df.columns)}")
-        
+    bulan_str = str(bulan_val).strip()
+    
+    # Format YYYY-MM atau YY-MM
+    if ISO_MONTH_PATTERN.match(bulan_str) or SHORT_MONTH_PATTERN.match(bulan_str):
+        month_num = int(bulan_str.split('-')[1])
+        if month_num <= 12:
+            return (['', *MONTH_NAMES][month_num], month_num)
+        return bulan_str, 99
+    
+    # Nama bulan / singkatan
+    month_num = MONTH_NUMBER_LOOKUP.get(bulan_str.lower())
+    if month_num:
+        return MONTH_NAMES[month_num - 1], month_num
+    
+    # Default fallback
+    return bulan_str, 99
+
+def safe_numeric_column(series):
+    """
+    Konversi kolom ke float: kosong / '-' / tidak valid -> 0
+    String angka boleh mengandung koma, 'Rp', atau spasi
+    """
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype('float64').fillna(0)
+    
+    values = series.astype(object)
+    is_string = values.map(type).eq(str)
+    if not is_string.any():
+        # Contoh: Decimal dari kolom NUMERIC database - cast langsung jauh lebih cepat
+        try:
+            return pd.Series(
+                values.where(values.notna(), np.nan).to_numpy().astype('float64'),
+                index=series.index
+            ).fillna(0)
+        except (TypeError, ValueError):
+            pass
+    else:
+        cleaned = (
+            values[is_string]
+            .str.replace(',', '', regex=False)
+            .str.replace('Rp', '', regex=False)
+            .str.replace(' ', '', regex=False)
+        )
+        values = values.copy()
+        values[is_string] = cleaned
+    
+    return pd.to_numeric(values, errors='coerce').fillna(0)
+
+# Kolom ID untuk total_usaha, urut prioritas
+DASHBOARD_ID_COLUMNS = ['id_usaha', 'nopd', 'npwpd', 'nama_usaha']
+
+def empty_dashboard():
+    return {
+        'total_usaha': 0,
+        'persentase_patuh': 0,
+        'total_omset': 0,
+        'jumlah_anomali': 0,
+        'status_counts': {},
+        'monthly_trend': []
+    }
+
+class DashboardAccumulator:
+    """
+    Metrik dashboard yang dihitung per potongan data. Riwayat besar dibaca
+    dari database per chunk, jadi yang disimpan hanya agregat (ID unik,
+    jumlah per kondisi, total per bulan), bukan baris-barisnya.
+        acc = DashboardAccumulator()
+        for chunk in chunks:
+            acc.add(chunk)
+        dashboard = acc.result()
+    """
+    
+    def __init__(self):
+        self.rows = 0
+        self.failed = False
+        # Kolom ID yang masih dipertimbangkan (berhenti di kolom pertama yang punya nilai valid)
+        self.id_limit = len(DASHBOARD_ID_COLUMNS)
+        self.id_values = {}
+        # label kondisi -> jumlah, urut kemunculan pertama
+        self.kondisi_counts = {}
+        self.total_omset = 0
+        # urutan bulan (1-12) -> [nama bulan, omset, pajak]
+        self.monthly = {}
+        self.monthly_failed = False
+    
+    def add(self, df):
+        """Tambahkan satu potongan data; error membuat hasil akhir jadi dashboard kosong"""
+        if self.failed:
+            return self
+        try:
+            logger.debug("Dashboard: Input shape %s, columns: %s", df.shape, list(df.columns))
+            self.rows += len(df)
+            self._add_ids(df)
+            self._add_kondisi(df)
+            omset_numeric = self._add_omset(df)
+            if not self.monthly_failed:
+                self._add_monthly(df, omset_numeric)
+        except Exception as e:
+            logger.error("Error in calculate_dashboard_metrics: %s", e)
+            import traceback
+            traceback.print_exc()
+            self.failed = True
+        return self
+    
+    def _add_ids(self, df):
         # FIXED: Total unique businesses - handle both numeric and string data
-        total_usaha = 0
-        
-        # Try different ID columns in order of preference
-        id_columns = ['id_usaha', 'nopd', 'npwpd', 'nama_usaha']
-        for col in id_columns:
+        for position, col in enumerate(DASHBOARD_ID_COLUMNS[:self.id_limit]):
             if col in df.columns:
-                # Clean the data first - remove NaN, empty strings, 'nan' strings
-                valid_ids = df[col].dropna()
-                valid_ids = valid_ids[valid_ids.astype(str).str.strip() != '']
-                valid_ids = valid_ids[valid_ids.astype(str).str.strip().str.lower() != 'nan']
+                # Nilai unik (tanpa NaN), lalu buang string kosong / 'nan'
+                unique_ids = pd.Series(pd.unique(df[col].dropna()), dtype=object)
+                unique_str = unique_ids.astype(str).str.strip()
+                valid_ids = unique_ids[(unique_str != '') & (unique_str.str.lower() != 'nan')]
                 
-                if len(valid_ids) > 0:
-                    total_usaha = valid_ids.nunique()
-                    print(f"DEBUG: Used column '{col}' for total_usaha: {total_usaha}")
+                values = self.id_values.setdefault(col, set())
+                values.update(valid_ids.tolist())
+                if values:
+                    # Kolom prioritas lebih rendah tidak akan dipakai lagi
+                    self.id_limit = position + 1
+                    for other in DASHBOARD_ID_COLUMNS[position + 1:]:
+                        self.id_values.pop(other, None)
                     break
-        
-        # FIXED: Percentage of compliant records - handle string kondisi values
-        persentase_patuh = 0
+    
+    def _add_kondisi(self, df):
+        # Normalisasi kondisi sekali (strip + upper per nilai unik)
         if 'kondisi' in df.columns:
-            # Clean kondisi column
-            kondisi_clean = df['kondisi'].dropna().astype(str).str.strip().str.upper()
-            normal_count = len(kondisi_clean[kondisi_clean == 'NORMAL'])
-            total_records = len(kondisi_clean)
-            persentase_patuh = round((normal_count / total_records) * 100) if total_records > 0 else 0
-            print(f"DEBUG: Normal: {normal_count}, Total: {total_records}, Percentage: {persentase_patuh}%")
-        
+            kondisi_codes, kondisi_uniques = pd.factorize(df['kondisi'])
+            kondisi_labels = pd.Index(kondisi_uniques).astype(str).str.strip().str.upper()
+            counts = np.bincount(kondisi_codes[kondisi_codes >= 0], minlength=len(kondisi_uniques))
+            
+            for label, count in zip(kondisi_labels, counts.tolist()):
+                self.kondisi_counts[label] = self.kondisi_counts.get(label, 0) + count
+    
+    def _add_omset(self, df):
         # FIXED: Total omset - handle string values from database  
-        total_omset = 0
         if 'omset_perbulan' in df.columns:
-            def safe_convert_to_numeric(val):
-                if pd.isna(val) or val in ['', '-', 'nan', None]:
-                    return 0
-                try:
-                    # Handle string numbers with commas
-                    if isinstance(val, str):
-                        val = val.replace(',', '').replace('Rp', '').replace(' ', '')
-                    return float(val)
-                except (ValueError, TypeError):
-                    return 0
-            
-            omset_numeric = df['omset_perbulan'].apply(safe_convert_to_numeric)
-            total_omset = omset_numeric.sum()
-            print(f"DEBUG: Total omset calculated: {total_omset}")
-        
-        # FIXED: Jumlah anomali - handle string kondisi values
-        anomali_count = 0
-        if 'kondisi' in df.columns:
-            kondisi_clean = df['kondisi'].dropna().astype(str).str.strip().str.upper()
-            anomali_count = len(kondisi_clean[kondisi_clean == 'ANOMALI'])
-        
-        # FIXED: Status distribution - handle string values
-        status_counts = {}
-        if 'kondisi' in df.columns:
-            kondisi_clean = df['kondisi'].dropna().astype(str).str.strip().str.upper()
-            status_counts = kondisi_clean.value_counts().to_dict()
-        
+            omset_numeric = safe_numeric_column(df['omset_perbulan'])
+            self.total_omset += omset_numeric.sum()
+            return omset_numeric
+        return None
+    
+    def _add_monthly(self, df, omset_numeric):
         # FIXED: Monthly trend data dengan normalisasi bulan yang konsisten
-        monthly_data = []
-        
         # Prioritas kolom bulan
         bulan_col = None
         if 'bulan_iso' in df.columns and df['bulan_iso'].notna().sum() > 0:
@@ -660,241 +1273,479 @@ def calculate_dashboard_metrics(df):
         elif 'bulan' in df.columns and df['bulan'].notna().sum() > 0:
             bulan_col = 'bulan'
         
-        if bulan_col and bulan_col in df.columns:
-            try:
-                # Prepare data for trend
-                df_for_trend = df.copy()
-                
-                # FIXED: Convert string values to numeric safely
-                def safe_numeric_convert(val):
-                    if pd.isna(val) or val in ['', '-', 'nan', None]:
-                        return 0
-                    try:
-                        if isinstance(val, str):
-                            val = val.replace(',', '').replace('Rp', '').replace(' ', '')
-                        return float(val)
-                    except (ValueError, TypeError):
-                        return 0
-                
-                df_for_trend['omset_numeric'] = df_for_trend['omset_perbulan'].apply(safe_numeric_convert)
-                df_for_trend['pajak_numeric'] = df_for_trend['jumlah_pajak_dibayar'].apply(safe_numeric_convert)
-                
-                # Filter data yang valid (ada omset atau pajak)
-                df_valid = df_for_trend[
-                    (df_for_trend['omset_numeric'] > 0) | (df_for_trend['pajak_numeric'] > 0)
-                ].copy()
-                
-                if len(df_valid) > 0:
-                    # Clean bulan data
-                    df_clean = df_valid.dropna(subset=[bulan_col])
-                    df_clean = df_clean[df_clean[bulan_col].astype(str).str.strip() != '']
-                    
-                    if len(df_clean) > 0:
-                        # FIXED: Normalisasi bulan ke format yang konsisten
-                        def normalize_month(bulan_val):
-                            bulan_str = str(bulan_val).strip()
-                            
-                            # Jika format YYYY-MM, convert ke MM atau nama bulan
-                            if re.match(r'^\d{4}-\d{2}$', bulan_str):  # 2025-04 format
-                                year, month_num = bulan_str.split('-')
-                                month_names = ['', 'januari', 'februari', 'maret', 'april', 'mei', 'juni',
-                                             'juli', 'agustus', 'september', 'oktober', 'november', 'desember']
-                                if int(month_num) <= 12:
-                                    return month_names[int(month_num)], int(month_num)
-                                    
-                            # Jika format YY-MM, convert juga
-                            elif re.match(r'^\d{2}-\d{2}$', bulan_str):  # 25-04 format
-                                year, month_num = bulan_str.split('-')
-                                month_names = ['', 'januari', 'februari', 'maret', 'april', 'mei', 'juni',
-                                             'juli', 'agustus', 'september', 'oktober', 'november', 'desember']
-                                if int(month_num) <= 12:
-                                    return month_names[int(month_num)], int(month_num)
-                            
-                            # Jika sudah nama bulan, mapping ke nomor
-                            elif bulan_str.lower() in ['januari', 'jan']:
-                                return 'januari', 1
-                            elif bulan_str.lower() in ['februari', 'feb']:
-                                return 'februari', 2
-                            elif bulan_str.lower() in ['maret', 'mar']:
-                                return 'maret', 3
-                            elif bulan_str.lower() in ['april', 'apr']:
-                                return 'april', 4
-                            elif bulan_str.lower() in ['mei', 'may']:
-                                return 'mei', 5
-                            elif bulan_str.lower() in ['juni', 'jun']:
-                                return 'juni', 6
-                            elif bulan_str.lower() in ['juli', 'jul']:
-                                return 'juli', 7
-                            elif bulan_str.lower() in ['agustus', 'agu', 'aug']:
-                                return 'agustus', 8
-                            elif bulan_str.lower() in ['september', 'sep']:
-                                return 'september', 9
-                            elif bulan_str.lower() in ['oktober', 'okt', 'oct']:
-                                return 'oktober', 10
-                            elif bulan_str.lower() in ['november', 'nov']:
-                                return 'november', 11
-                            elif bulan_str.lower() in ['desember', 'des', 'dec']:
-                                return 'desember', 12
-                            
-                            # Default fallback
-                            return bulan_str, 99
-                        
-                        # Apply normalization
-                        df_clean[['bulan_normalized', 'bulan_order']] = df_clean[bulan_col].apply(
-                            lambda x: pd.Series(normalize_month(x))
-                        )
-                        
-                        # Group by normalized month
-                        grouped = df_clean.groupby(['bulan_normalized', 'bulan_order']).agg({
-                            'omset_numeric': 'sum',
-                            'pajak_numeric': 'sum'
-                        }).reset_index()
-                        
-                        # FIXED: Sort berdasarkan urutan bulan yang benar (1-12)
-                        grouped = grouped.sort_values('bulan_order')
-                        
-                        # Convert to output format
-                        for _, row in grouped.iterrows():
-                            if row['bulan_order'] != 99:  # Skip fallback entries
-                                monthly_data.append({
-                                    'bulan_display': row['bulan_normalized'],
-                                    'bulan': row['bulan_normalized'],
-                                    'omset_perbulan': float(row['omset_numeric']),
-                                    'jumlah_pajak_dibayar': float(row['pajak_numeric'])
-                                })
-                        
-                        print(f"DEBUG Dashboard: Monthly data created: {len(monthly_data)} entries")
+        if bulan_col is None:
+            return
+        
+        try:
+            if omset_numeric is None:
+                omset_numeric = safe_numeric_column(df['omset_perbulan'])
+            pajak_numeric = safe_numeric_column(df['jumlah_pajak_dibayar'])
+            
+            # Normalisasi bulan hanya untuk nilai unik, lalu dipetakan lewat kode
+            bulan_codes, bulan_uniques = pd.factorize(df[bulan_col])
+            normalized = [normalize_month(value) for value in bulan_uniques]
+            unique_orders = np.array([order for _, order in normalized] + [99])
+            unique_filled = np.array([str(value).strip() != '' for value in bulan_uniques] + [False])
+            order_by_name = {order: name for name, order in normalized}
+            
+            # Data valid: ada omset atau pajak, dan bulan terisi
+            keep = (
+                ((omset_numeric > 0) | (pajak_numeric > 0)).to_numpy() &
+                unique_filled[bulan_codes]
+            )
+            row_orders = unique_orders[bulan_codes]
+            keep &= row_orders != 99  # Skip fallback entries
+            
+            if keep.any():
+                grouped = pd.DataFrame({
+                    'bulan_order': row_orders[keep],
+                    'omset_numeric': omset_numeric.to_numpy()[keep],
+                    'pajak_numeric': pajak_numeric.to_numpy()[keep]
+                }).groupby('bulan_order').sum()
                 
-            except Exception as e:
-                print(f"ERROR in monthly trend calculation: {e}")
-                import traceback
-                traceback.print_exc()
-                monthly_data = []
+                for order, omset, pajak in zip(grouped.index.tolist(), grouped['omset_numeric'].tolist(),
+                                               grouped['pajak_numeric'].tolist()):
+                    entry = self.monthly.setdefault(order, [order_by_name[order], 0.0, 0.0])
+                    entry[1] += omset
+                    entry[2] += pajak
+            
+        except Exception as e:
+            logger.error("Error in monthly trend calculation: %s", e)
+            import traceback
+            traceback.print_exc()
+            self.monthly_failed = True
+            self.monthly = {}
+    
+    def result(self):
+        """Dictionary dashboard (format sama dengan calculate_dashboard_metrics)"""
+        if self.failed:
+            return empty_dashboard()
+        
+        total_usaha = 0
+        for col in DASHBOARD_ID_COLUMNS[:self.id_limit]:
+            if self.id_values.get(col):
+                total_usaha = len(self.id_values[col])
+                logger.debug("Used column '%s' for total_usaha: %s", col, total_usaha)
+                break
+        
+        # Urut jumlah terbanyak; label dengan jumlah sama tetap urut kemunculan
+        status_counts = dict(sorted(self.kondisi_counts.items(), key=lambda item: -item[1]))
+        normal_count = status_counts.get('NORMAL', 0)
+        total_records = sum(status_counts.values())
+        persentase_patuh = round((normal_count / total_records) * 100) if total_records > 0 else 0
+        anomali_count = status_counts.get('ANOMALI', 0)
+        
+        # FIXED: Sort berdasarkan urutan bulan yang benar (1-12)
+        monthly_data = [
+            {
+                'bulan_display': name,
+                'bulan': name,
+                'omset_perbulan': float(omset),
+                'jumlah_pajak_dibayar': float(pajak)
+            }
+            for _, (name, omset, pajak) in sorted(self.monthly.items())
+        ]
         
         result = {
             'total_usaha': total_usaha,
             'persentase_patuh': persentase_patuh,
-            'total_omset': total_omset,
+            'total_omset': self.total_omset,
             'jumlah_anomali': anomali_count,
             'status_counts': status_counts,
             'monthly_trend': monthly_data
         }
         
-        print(f"DEBUG Dashboard: Final result: {result}")
+        logger.debug("Dashboard: Final result: %s", result)
         return result
+
+def calculate_dashboard_metrics(df):
+    """
+    Calculate metrics for dashboard - FIXED untuk konsistensi upload & riwayat
+    Semua metrik dihitung per kolom; kolom teks dinormalisasi per nilai unik
+    Untuk data per potongan, pakai DashboardAccumulator langsung
+    """
+    return DashboardAccumulator().add(df).result()
+
+
+# Revisi route upload di app.py
+
+SHEET_MODES = ('merge', 'split')
+
+def prepare_sheet(path, sheet_name):
+    """Preprocess + prepare_records satu sheet (process pool, mode append)"""
+    df_preprocessed = preprocess_excel(path, sheet_name=sheet_name)
+    return prepare_records(df_preprocessed)[0], None
+
+def analyse_sheet(path, sheet_name, with_dashboard=False, detector=None):
+    """
+    Preprocess + proses satu sheet. Dijalankan di process pool (ingest.py),
+    jadi harus fungsi level modul dan hasilnya bisa di-pickle.
+    Return: (df_raw, dashboard_data) - dashboard_data None jika with_dashboard=False
+    """
+    df_preprocessed = preprocess_excel(path, sheet_name=sheet_name)
+    df_raw = process_data_flexible(df_preprocessed, detector)
+    del df_preprocessed
+    
+    dashboard_data = calculate_dashboard_metrics(df_raw) if with_dashboard else None
+    return df_raw, dashboard_data
+
+def _analyse_sources(job, sources, with_dashboard, func=None, detector=None):
+    """
+    Analisis semua sheet secara paralel. Sheet yang tidak valid (ValueError,
+    mis. sheet keterangan tanpa kolom NOPD) dilewati dan dicatat sebagai warning.
+    func: fungsi per sheet (default analyse_sheet dengan detector), return (df, dashboard_data)
+    Return: list (source, df_raw, dashboard_data) untuk sheet yang berhasil
+    """
+    job.update(stage='Memproses sheet', sheets_done=0, sheets_total=len(sources))
+    done = [0]
+    
+    def on_done(source, result, error):
+        done[0] += 1
+        job.update(sheets_done=done[0])
+        logger.debug("INGEST: %s selesai (%s/%s)", source.label, done[0], len(sources))
+    
+    func = func or partial(analyse_sheet, with_dashboard=with_dashboard, detector=detector)
+    results = run_sheets(func, sources, on_done=on_done)
+    
+    analysed = []
+    skipped = []
+    for source, result, error in results:
+        if error is None:
+            analysed.append((source, *result))
+        elif isinstance(error, ValueError):
+            skipped.append(f"{source.label}: {error}")
+            job.warn(f"Sheet {source.label} dilewati: {error}")
+        else:
+            raise error
+    
+    if not analysed:
+        raise ValueError(f"Tidak ada sheet yang valid ({'; '.join(skipped)})")
+    
+    return analysed
+
+def _stream_upload(job, source, detector):
+    """
+    Upload satu sheet mode baca 'stream' tanpa pernah memegang frame utuh:
+    setiap potongan iter_excel_chunks diproses (process_data_flexible),
+    ditambahkan ke DashboardAccumulator, lalu langsung di-COPY oleh
+    insert_history_chunks. Satu usaha (satu baris sheet) selalu berada dalam
+    satu potongan, jadi growth/kondisi per usaha sama dengan jalur biasa;
+    hanya NOPD yang sama dengan identitas berbeda di potongan lain dihitung terpisah.
+    Return batch_id
+    """
+    dashboard = DashboardAccumulator()
+    
+    def processed_chunks():
+        for chunk in iter_excel_chunks(source.path, sheet_name=source.sheet_name):
+            df_raw = process_data_flexible(chunk, detector)
+            del chunk
+            dashboard.add(df_raw)
+            yield df_raw
+    
+    job.update(stage='Menyimpan ke riwayat', rows_processed=0)
+    with span('upload.stream_insert') as stage:
+        batch_id = insert_history_chunks(
+            processed_chunks(), source.workbook_name, metrics=dashboard.result,
+            progress=lambda rows: job.update(rows_processed=rows),
+            recompute=recompute_series, detector=detector
+        )
+        stage.rows = dashboard.rows
+    return batch_id
+
+def run_upload_job(job, path, filename, sheet_mode='merge', detector=None):
+    """
+    Proses satu file upload di worker background (jobs.py)
+    File bisa workbook multi-sheet atau ZIP berisi workbook (ingest.py);
+    sheet_mode 'merge' menggabungkan semua sheet ke satu batch, 'split' membuat
+    satu batch per sheet. detector: detektor anomali (anomaly.DETECTORS),
+    disimpan di katalog batch dan dipakai lagi saat append.
+    Return batch_id (atau list batch_id untuk mode split); tahap dan jumlah
+    baris dilaporkan lewat job.update
+    """
+    work_dir = tempfile.mkdtemp(prefix='ingest_')
+    detector = detector or DEFAULT_DETECTOR
+    try:
+        logger.info("=== Processing file: %s (job %s, detector %s) ===", filename, job.id, detector)
+        
+        # Step 1: Preprocess Excel (tetap menggunakan fungsi yang ada)
+        job.update(stage='Membaca file Excel')
+        with span('upload.read_excel', bytes=os.path.getsize(path)) as stage:
+            sources = list_sheet_sources(path, filename, work_dir)
+            streaming = len(sources) == 1 and excel_read_mode(sources[0].path) == 'stream'
+            
+            if len(sources) == 1 and not streaming:
+                # Satu sheet: proses langsung di thread ini, tanpa process pool
+                source = sources[0]
+                df_preprocessed = preprocess_excel(source.path, sheet_name=source.sheet_name)
+                stage.rows = len(df_preprocessed)
+        
+        if streaming:
+            # Satu sheet besar: baca, proses, dan simpan per potongan
+            batch_id = _stream_upload(job, sources[0], detector)
+            logger.info("=== File processed successfully (stream, batch %s) ===", batch_id)
+            return batch_id
+        
+        if len(sources) == 1:
+            # Step 2: Processing dengan sistem atribut fleksibel - BARU!
+            job.update(stage='Memproses data', rows_processed=len(df_preprocessed))
+            with span('upload.process_data') as stage:
+                df_raw = process_data_flexible(df_preprocessed, detector)
+                stage.rows = len(df_raw)
+            del df_preprocessed
+            batches = [(source.workbook_name, df_raw, None)]
         
+        elif sheet_mode == 'split':
+            with span('upload.analyse_sheets') as stage:
+                analysed = _analyse_sources(job, sources, with_dashboard=True, detector=detector)
+                stage.rows = sum(len(df) for _, df, _ in analysed)
+            batches = [(source.label, df_raw, dashboard_data) for source, df_raw, dashboard_data in analysed]
+        
+        else:
+            with span('upload.analyse_sheets') as stage:
+                analysed = _analyse_sources(job, sources, with_dashboard=False, detector=detector)
+                stage.rows = sum(len(df) for _, df, _ in analysed)
+            # Kategori tiap sheet berbeda sehingga concat menghasilkan object; ringkas ulang
+            df_raw = compact_dtypes(pd.concat([df for _, df, _ in analysed], ignore_index=True))
+            del analysed
+            batches = [(filename, df_raw, None)]
+        
+        # Step 3: Hitung dashboard metrics (menggunakan data raw)
+        total_rows = sum(len(df) for _, df, _ in batches)
+        job.update(stage='Menghitung dashboard', total_rows=total_rows)
+        with span('upload.dashboard', rows=total_rows):
+            batches = [
+                (name, df, dashboard_data if dashboard_data is not None else calculate_dashboard_metrics(df))
+                for name, df, dashboard_data in batches
+            ]
+        
+        # Step 4: Simpan ke riwayat (gunakan data raw)
+        job.update(stage='Menyimpan ke riwayat', rows_processed=0)
+        batch_ids = []
+        inserted = 0
+        for name, df, dashboard_data in batches:
+            logger.debug("Dashboard calculated - %s total_omset: %s", name, dashboard_data.get('total_omset', 0))
+            with span('upload.insert_history', rows=len(df), bytes=frame_bytes(df)):
+                batch_ids.append(insert_history_flexible(
+                    df, name, metrics=dashboard_data,
+                    progress=lambda rows, offset=inserted: job.update(rows_processed=offset + rows),
+                    recompute=recompute_series, detector=detector
+                ))
+            inserted += len(df)
+        
+        logger.info("=== File processed successfully (%s batch) ===", len(batch_ids))
+        return batch_ids[0] if len(batch_ids) == 1 else batch_ids
+    
+    except ValueError as ve:
+        # Error khusus untuk missing required columns
+        error_msg = str(ve)
+        if "Kolom required tidak ditemukan" in error_msg:
+            raise ValueError(f"File tidak valid: {error_msg}") from ve
+        raise ValueError(f"Error memproses data: {error_msg}") from ve
+    
     except Exception as e:
-        print(f"ERROR in calculate_dashboard_metrics: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("Error processing file: %s", e)
+        raise RuntimeError(f"Terjadi error saat memproses file: {e}") from e
+    
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def run_append_job(job, path, filename, batch_id):
+    """
+    Mode append: tambahkan upload (mis. workbook dengan kolom bulan baru) ke
+    batch yang sudah ada, bukan membuat batch baru. Hanya sel (usaha, bulan)
+    yang baru / berubah yang disimpan, dan growth/kondisi dihitung ulang untuk
+    usaha yang terdampak saja (db.append_history_flexible).
+    Beberapa sheet selalu digabung seperti sheet_mode 'merge'. Detektor
+    anomali sama dengan upload awal batch (katalog batches).
+    Return batch_id tujuan
+    """
+    work_dir = tempfile.mkdtemp(prefix='ingest_')
+    try:
+        logger.info("=== Appending file: %s to batch %s (job %s) ===", filename, batch_id, job.id)
         
-        return {
-            'total_usaha': 0,
-            'persentase_patuh': 0,
-            'total_omset': 0,
-            'jumlah_anomali': 0,
-            'status_counts': {},
-            'monthly_trend': []
-        }
+        job.update(stage='Membaca file Excel')
+        with span('append.read_excel', bytes=os.path.getsize(path)) as stage:
+            sources = list_sheet_sources(path, filename, work_dir)
+            
+            if len(sources) == 1:
+                source = sources[0]
+                df_preprocessed = preprocess_excel(source.path, sheet_name=source.sheet_name)
+                stage.rows = len(df_preprocessed)
+        
+        # Growth/kondisi belum dihitung di sini: butuh bulan-bulan yang sudah tersimpan
+        if len(sources) == 1:
+            job.update(stage='Memproses data', rows_processed=len(df_preprocessed))
+            with span('append.prepare') as stage:
+                df_prepared = prepare_records(df_preprocessed)[0]
+                stage.rows = len(df_prepared)
+            del df_preprocessed
+        else:
+            with span('append.prepare') as stage:
+                analysed = _analyse_sources(job, sources, with_dashboard=False, func=prepare_sheet)
+                df_prepared = pd.concat([df for _, df, _ in analysed], ignore_index=True)
+                stage.rows = len(df_prepared)
+            del analysed
+        
+        job.update(stage='Menambahkan ke riwayat', total_rows=len(df_prepared), rows_processed=0)
+        detector = fetch_batch_detector(batch_id) or DEFAULT_DETECTOR
+        with span('append.insert_history') as stage:
+            summary = append_history_flexible(
+                batch_id, df_prepared, filename, partial(recompute_trend, detector=detector),
+                progress=lambda rows: job.update(rows_processed=rows), series_recompute=recompute_series
+            )
+            stage.rows = summary['inserted'] + summary['updated']
+        
+        # Dashboard dan halaman tabel batch ini sudah berubah
+        history_cache.invalidate(batch_id)
+        if not summary['inserted'] and not summary['updated']:
+            job.warn("Tidak ada data baru atau perubahan dibanding riwayat yang tersimpan")
+        
+        logger.info("=== File appended successfully: %s ===", summary)
+        return batch_id
+    
+    except ValueError as ve:
+        error_msg = str(ve)
+        if "Kolom required tidak ditemukan" in error_msg:
+            raise ValueError(f"File tidak valid: {error_msg}") from ve
+        raise ValueError(f"Error memproses data: {error_msg}") from ve
+    
+    except Exception as e:
+        logger.error("Error appending file: %s", e)
+        raise RuntimeError(f"Terjadi error saat memproses file: {e}") from e
+    
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        shutil.rmtree(work_dir, ignore_errors=True)
 
+def run_series_refresh_job(job):
+    """
+    Isi ulang sel seri_usaha yang dilepas batch terhapus (db.refresh_released_series)
+    di worker background, jadi hapus batch tidak menunggu pengisian ulang
+    """
+    job.update(stage='Memperbarui seri usaha')
+    refilled = refresh_released_series(recompute_series)
+    job.update(rows_processed=refilled)
+    logger.debug("Series refresh done, %s cells refilled", refilled)
+    return None
 
-# Revisi route upload di app.py
+@app.context_processor
+def inject_detectors():
+    """Pilihan detektor anomali untuk form upload"""
+    return {'anomaly_detectors': DETECTORS, 'default_detector': DEFAULT_DETECTOR}
 
 @app.route('/', methods=['GET', 'POST'])
 def upload():
+    """
+    Upload file: simpan ke file sementara lalu proses di worker background.
+    Browser diarahkan ke halaman progress yang memantau status job.
+    """
     if request.method == 'POST':
         file = request.files.get('file')
         if not file or file.filename == '':
             return render_template('upload.html', error="Pilih file terlebih dahulu.")
         
-        try:
-            print(f"\n=== Processing file: {file.filename} ===")
-            
-            # Step 1: Preprocess Excel (tetap menggunakan fungsi yang ada)
-            df_preprocessed = preprocess_excel(file)
-            
-            # Step 2: Processing dengan sistem atribut fleksibel - BARU!
-            df_raw = process_data_flexible(df_preprocessed)
-            
-            # Step 3: Hitung dashboard metrics (menggunakan data raw)
-            dashboard_data = calculate_dashboard_metrics(df_raw)
-            print(f"DEBUG: Dashboard calculated - total_omset: {dashboard_data.get('total_omset', 0)}")
-            
-            # Step 4: Simpan ke riwayat (gunakan data raw)
-            filename = file.filename
-            insert_history_flexible(df_raw, filename)
-            
-            # Step 5: Siapkan data untuk display (format string)
-            df_display = prepare_display_data(df_raw)
-            
-            print(f"=== File processed successfully ===\n")
-            
-        except ValueError as ve:
-            # Error khusus untuk missing required columns
-            error_msg = str(ve)
-            if "Kolom required tidak ditemukan" in error_msg:
-                return render_template('upload.html', 
-                                     error=f"File tidak valid: {error_msg}")
-            else:
-                return render_template('upload.html', 
-                                     error=f"Error memproses data: {error_msg}")
+        sheet_mode = request.form.get('sheet_mode', 'merge')
+        if sheet_mode not in SHEET_MODES:
+            sheet_mode = 'merge'
         
-        except Exception as e:
-            print(f"Error processing file: {e}")
-            import traceback
-            traceback.print_exc()
-            return render_template('upload.html', 
-                                 error=f"Terjadi error saat memproses file: {e}")
-
-        # Prepare data untuk tampilan tabel - REVISED!
-        config = DataAttributeConfig()
+        detector = request.form.get('detector', DEFAULT_DETECTOR)
+        if detector not in DETECTORS:
+            detector = DEFAULT_DETECTOR
         
-        # Gunakan helper function untuk mendapatkan kolom display
-        show_cols = get_display_columns(df_display, config)
+        suffix = os.path.splitext(file.filename)[1]
+        fd, path = tempfile.mkstemp(prefix='upload_', suffix=suffix)
+        os.close(fd)
+        file.save(path)
         
-        # Gunakan helper function untuk mapping display names
-        column_display_mapping = get_column_display_mapping(config)
+        try:
+            job = get_job_manager().submit(
+                run_upload_job, file.filename, path, file.filename, sheet_mode, detector,
+                file_size=os.path.getsize(path)
+            )
+        except QueueFull as e:
+            os.remove(path)
+            return render_template('upload.html', error=str(e))
         
-        print(f"DEBUG: Display columns: {show_cols}")
-        print(f"DEBUG: Column mapping: {column_display_mapping}")
-
-        # Prepare data untuk tabel dengan styling
-        data = []
-        for _, row in df_display[show_cols].iterrows():
-            row_dict = row.to_dict()
-            if 'kondisi' in row_dict:
-                row_dict['kondisi_style'] = color_kondisi(row_dict['kondisi'])
-            data.append(row_dict)
-            
-        return render_template('result.html', 
-                             data=data, 
-                             columns=show_cols, 
-                             column_display_mapping=column_display_mapping,
-                             dashboard_data=dashboard_data, 
-                             from_history=False)
+        logger.debug("Upload %s queued as job %s", file.filename, job.id)
+        return redirect(url_for('upload_progress', job_id=job.id))
     
     return render_template('upload.html')
 
+@app.route('/riwayat/<batch_id>/append', methods=['POST'])
+def riwayat_append(batch_id):
+    """
+    Upload file untuk ditambahkan ke batch yang sudah ada (mode append),
+    diproses di worker background seperti upload biasa
+    """
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return render_template('upload.html', error="Pilih file terlebih dahulu.")
+    
+    suffix = os.path.splitext(file.filename)[1]
+    fd, path = tempfile.mkstemp(prefix='append_', suffix=suffix)
+    os.close(fd)
+    file.save(path)
+    
+    try:
+        job = get_job_manager().submit(
+            run_append_job, file.filename, path, file.filename, batch_id,
+            file_size=os.path.getsize(path)
+        )
+    except QueueFull as e:
+        os.remove(path)
+        return render_template('upload.html', error=str(e))
+    
+    logger.debug("Append %s to batch %s queued as job %s", file.filename, batch_id, job.id)
+    return redirect(url_for('upload_progress', job_id=job.id))
+
+@app.route('/upload/<job_id>')
+def upload_progress(job_id):
+    """Halaman progress upload; polling ke /api/jobs/<job_id>"""
+    status = get_job_manager().status(job_id)
+    if status is None:
+        return render_template('upload.html', error="Proses upload tidak ditemukan atau sudah kedaluwarsa.")
+    
+    return render_template('progress.html', job=status)
+
+@app.route('/api/jobs/<job_id>')
+def job_status_api(job_id):
+    """Status job upload: tahap, jumlah baris, dan URL hasil jika selesai"""
+    status = get_job_manager().status(job_id)
+    if status is None:
+        return jsonify({'job_id': job_id, 'status': 'unknown', 'error': 'Job tidak ditemukan'}), 404
+    
+    if status['status'] == 'done':
+        # Satu batch langsung ke detail, beberapa batch (mode split) ke daftar riwayat
+        if len(status['batch_ids']) == 1:
+            status['redirect_url'] = url_for('riwayat_detail', batch_id=status['batch_id'])
+        else:
+            status['redirect_url'] = url_for('riwayat')
+    return jsonify(status)
+
 def prepare_display_data(df_raw):
     """
     Fungsi terpisah untuk memformat data untuk display
     Input: DataFrame dengan data numeric mentah  
     Output: DataFrame dengan data formatted untuk tampilan
     """
-    df_display = df_raw.copy()
+    # Batas tampilan: category/float32 dari pipeline kembali ke object/float64
+    df_display = restore_dtypes(df_raw)
     
     # FIXED: Ensure bulan_iso is properly formatted for filtering
     if 'bulan_iso' not in df_display.columns or df_display['bulan_iso'].isna().all():
         # Generate bulan_iso from bulan if missing
         if 'bulan' in df_display.columns:
-            print("DEBUG: Generating bulan_iso from bulan column")
+            logger.debug("Generating bulan_iso from bulan column")
             
             def generate_bulan_iso(bulan_val):
                 if pd.isna(bulan_val) or bulan_val == '' or bulan_val == '-':
                     return None
                 
                 bulan_str = str(bulan_val).strip().lower()
-                tahun = 2025  # Default tahun
+                tahun = DEFAULT_TAHUN  # Riwayat baru membawa bulan_iso dari periode_bulan
                 
                 bulan_mapping = {
                     'januari': '01', 'jan': '01',
@@ -927,44 +1778,41 @@ def prepare_display_data(df_raw):
                 
                 return None
             
-            df_display['bulan_iso'] = df_display['bulan'].apply(generate_bulan_iso)
-            print(f"DEBUG: Generated bulan_iso for {df_display['bulan_iso'].notna().sum()} records")
+            df_display['bulan_iso'] = map_unique(df_display['bulan'], generate_bulan_iso)
+            logger.debug("Generated bulan_iso for %s records", df_display['bulan_iso'].notna().sum())
     
     # Clean bulan_iso values - remove 'None', 'nan', empty strings
     if 'bulan_iso' in df_display.columns:
-        df_display['bulan_iso'] = df_display['bulan_iso'].apply(
+        df_display['bulan_iso'] = map_unique(
+            df_display['bulan_iso'],
             lambda x: None if pd.isna(x) or str(x).lower() in ['none', 'nan', '', '-'] else x
         )
-        print(f"DEBUG: After cleaning, bulan_iso has {df_display['bulan_iso'].notna().sum()} valid values")
+        logger.debug("After cleaning, bulan_iso has %s valid values", df_display['bulan_iso'].notna().sum())
     
     # Format tanggal pembayaran
     if 'tanggal_pembayaran' in df_display.columns:
-        df_display['tanggal_pembayaran'] = df_display['tanggal_pembayaran'].apply(
-            lambda x: x.strftime('%Y-%m-%d') if pd.notna(x) else '-'
-        )
-        print("DEBUG: Formatted tanggal_pembayaran for display")
+        df_display['tanggal_pembayaran'] = map_unique(df_display['tanggal_pembayaran'], format_date)
+        logger.debug("Formatted tanggal_pembayaran for display")
     
     # Format growth menjadi persen
     if 'growth' in df_display.columns:
-        df_display['growth'] = df_display['growth'].apply(
-            lambda x: f"{x*100:.2f}%" if pd.notna(x) else '-'
-        )
-        print("DEBUG: Formatted growth for display as percentage")
+        df_display['growth'] = format_growth_column(df_display['growth'])
+        logger.debug("Formatted growth for display as percentage")
     
-    # Format omset dan pajak dengan format_currency
+    # Format omset dan pajak dengan format_currency (per kolom, tanpa apply per sel)
     if 'omset_perbulan' in df_display.columns:
-        df_display['omset_perbulan'] = df_display['omset_perbulan'].apply(format_currency)
-        print("DEBUG: Formatted omset_perbulan for display")
+        df_display['omset_perbulan'] = format_currency_column(df_display['omset_perbulan'])
+        logger.debug("Formatted omset_perbulan for display")
     
     if 'jumlah_pajak_dibayar' in df_display.columns:
-        df_display['jumlah_pajak_dibayar'] = df_display['jumlah_pajak_dibayar'].apply(format_currency)
-        print("DEBUG: Formatted jumlah_pajak_dibayar for display")
+        df_display['jumlah_pajak_dibayar'] = format_currency_column(df_display['jumlah_pajak_dibayar'])
+        logger.debug("Formatted jumlah_pajak_dibayar for display")
     
     # Clean text columns
     text_columns = ['nama_usaha', 'jenis_pajak_usaha', 'npwpd', 'nopd', 'id_usaha', 'bulan']
     for col in text_columns:
         if col in df_display.columns:
-            df_display[col] = df_display[col].astype(str).str.strip().replace('nan', '-')
+            df_display[col] = map_unique(df_display[col], format_text)
     
     # Handle remaining NaN values EXCEPT bulan_iso (keep None for filtering logic)
     fill_cols = [col for col in df_display.columns if col != 'bulan_iso']
@@ -977,153 +1825,348 @@ def riwayat():
     file_list = fetch_file_list()
     return render_template('riwayat.html', file_list=file_list)
 
-# Tambahkan fungsi helper untuk format angka di bagian atas file
-def format_currency(value):
+def prepare_history_data(df, config=None):
     """
-    Format angka untuk tampilan yang lebih bersih
+    Validasi dan bersihkan data historis dari database
+    Dipakai untuk dashboard riwayat maupun halaman tabel API
     """
-    if pd.isna(value) or value == '' or value == '-' or value is None:
-        return '-'
+    if config is None:
+        config = DataAttributeConfig()
+    
+    # Fetch bertipe dari db.py: teks sudah dibersihkan sebelum disimpan, angka
+    # float64, tanggal datetime64 - tidak perlu validasi/cleaning ulang
+    if df.attrs.get('prevalidated'):
+        return df
     
+    # ===== STEP 1: VALIDASI DATA HISTORIS =====
+    # Cek apakah data historis memiliki kolom yang diperlukan
+    # Jika tidak lengkap, coba mapping dari kolom yang ada
     try:
-        num_value = float(value)
-        if num_value == 0:
-            return '-'
+        df_validated, missing_required, mapped_columns = validate_required_columns(df, config)
         
-        # Jika angka adalah bilangan bulat, tampilkan tanpa desimal
-        if num_value.is_integer():
-            return f"{int(num_value):,}"
-        else:
-            # Jika ada desimal, tampilkan dengan 2 digit desimal
-            return f"{num_value:,.2f}"
+        # Jika ada kolom yang hilang, coba buat dari kolom lain
+        for missing_col in missing_required.copy():
+            if missing_col == 'nopd' and 'id_usaha' in df.columns:
+                df['nopd'] = df['id_usaha']
+                missing_required.remove(missing_col)
+        
+        if missing_required:
+            logger.warning("Historical data missing required columns: %s", missing_required)
+            # Tetap lanjut tapi dengan limited functionality
             
-    except (ValueError, TypeError):
-        return str(value)
+    except Exception as e:
+        logger.warning("Column validation failed for historical data: %s", e)
+        df_validated = df.copy()
+    
+    # ===== STEP 2: CLEANING HISTORICAL DATA =====
+    # Clean text columns
+    text_columns = ['nama_usaha', 'bulan', 'nopd', 'npwpd', 'id_usaha']
+    for col in text_columns:
+        if col in df_validated.columns:
+            df_validated[col] = clean_text_data(df_validated[col])
+    
+    # Convert numeric columns
+    numeric_columns = ['omset_perbulan', 'jumlah_pajak_dibayar', 'growth']
+    for col in numeric_columns:
+        if col in df_validated.columns:
+            df_validated[col] = pd.to_numeric(df_validated[col], errors='coerce')
+    
+    # Convert date columns
+    if 'tanggal_pembayaran' in df_validated.columns:
+        df_validated['tanggal_pembayaran'] = pd.to_datetime(df_validated['tanggal_pembayaran'], errors='coerce')
+    
+    # ===== STEP 3: GENERATE MISSING COLUMNS IF NEEDED =====
+    # Jika ada kolom tambahan yang hilang, generate ulang
+    if 'omset_perbulan' not in df_validated.columns and 'jumlah_pajak_dibayar' in df_validated.columns:
+        df_validated['omset_perbulan'] = df_validated['jumlah_pajak_dibayar'].apply(
+            lambda x: x * 10 if pd.notna(x) and x > 0 else None
+        )
+    
+    return df_validated
 
 @app.route('/riwayat/<batch_id>')
 def riwayat_detail(batch_id):
     """
     Route untuk menampilkan detail data historis dengan sistem atribut fleksibel
+    Tabel diisi per halaman lewat /api/batch/<batch_id>/rows
+    Hasil olahan disimpan di history_cache (di-invalidate saat batch di-append)
     """
     try:
-        # Ambil data dari database
-        df = fetch_by_batch_flexible(batch_id)
-        
-        if df.empty:
-            print(f"WARNING: No data found for batch_id: {batch_id}")
-            return render_template('result.html', 
-                                 data=[], columns=[], 
-                                 column_display_mapping={},
-                                 dashboard_data={}, from_history=True, 
-                                 error="Data tidak ditemukan")
-        
-        print(f"\n=== PROCESSING HISTORICAL DATA FOR BATCH: {batch_id} ===")
-        print(f"DEBUG: Initial shape={df.shape}")
-        print(f"DEBUG: Columns={list(df.columns)}")
-        
-        # ===== STEP 1: VALIDASI DATA HISTORIS =====
         config = DataAttributeConfig()
+        column_display_mapping = get_column_display_mapping(config)
         
-        # Cek apakah data historis memiliki kolom yang diperlukan
-        # Jika tidak lengkap, coba mapping dari kolom yang ada
-        try:
-            df_validated, missing_required, mapped_columns = validate_required_columns(df, config)
+        view = history_cache.get((batch_id, 'view'))
+        if view is None:
+            logger.info("=== PROCESSING HISTORICAL DATA FOR BATCH: %s ===", batch_id)
             
-            # Jika ada kolom yang hilang, coba buat dari kolom lain
-            for missing_col in missing_required.copy():
-                if missing_col == 'nopd' and 'id_usaha' in df.columns:
-                    df['nopd'] = df['id_usaha']
-                    missing_required.remove(missing_col)
+            # Ambil data dari database per potongan (named cursor); dashboard dihitung
+            # bertahap, jadi memory mengikuti FETCH_CHUNK_ROWS, bukan ukuran batch
+            dashboard = DashboardAccumulator()
+            columns = None
+            with span('riwayat.load') as stage:
+                stage.bytes = 0
+                for chunk in iter_by_batch_flexible(batch_id):
+                    stage.bytes += frame_bytes(chunk)
+                    logger.debug("Chunk shape=%s", chunk.shape)
+                    
+                    df_validated = prepare_history_data(chunk, config)
+                    dashboard.add(df_validated)
+                    if columns is None:
+                        columns = get_display_columns(df_validated, config)
+                stage.rows = dashboard.rows
             
-            if missing_required:
-                print(f"WARNING: Historical data missing required columns: {missing_required}")
-                # Tetap lanjut tapi dengan limited functionality
-                
-        except Exception as e:
-            print(f"WARNING: Column validation failed for historical data: {e}")
-            df_validated = df.copy()
-        
-        # ===== STEP 2: CLEANING HISTORICAL DATA =====
-        # Clean text columns
-        text_columns = ['nama_usaha', 'bulan', 'nopd', 'npwpd', 'id_usaha']
-        for col in text_columns:
-            if col in df_validated.columns:
-                df_validated[col] = clean_text_data(df_validated[col])
-        
-        # Convert numeric columns
-        numeric_columns = ['omset_perbulan', 'jumlah_pajak_dibayar', 'growth']
-        for col in numeric_columns:
-            if col in df_validated.columns:
-                df_validated[col] = pd.to_numeric(df_validated[col], errors='coerce')
-        
-        # Convert date columns
-        if 'tanggal_pembayaran' in df_validated.columns:
-            df_validated['tanggal_pembayaran'] = pd.to_datetime(df_validated['tanggal_pembayaran'], errors='coerce')
-        
-        # ===== STEP 3: GENERATE MISSING COLUMNS IF NEEDED =====
-        # Jika ada kolom tambahan yang hilang, generate ulang
-        if 'omset_perbulan' not in df_validated.columns and 'jumlah_pajak_dibayar' in df_validated.columns:
-            df_validated['omset_perbulan'] = df_validated['jumlah_pajak_dibayar'].apply(
-                lambda x: x * 10 if pd.notna(x) and x > 0 else None
-            )
-        
-        # ===== STEP 4: CALCULATE DASHBOARD =====
-        dashboard_data = calculate_dashboard_metrics(df_validated)
-        
-        # ===== STEP 5: PREPARE DISPLAY =====
-        df_display = prepare_display_data(df_validated)
-        
-        # Use config for display columns
-        show_cols = get_display_columns(df_display, config)
-        column_display_mapping = get_column_display_mapping(config)
-        
-        # Prepare data dengan styling
-        data = []
-        for _, row in df_display[show_cols].iterrows():
-            row_dict = row.to_dict()
-            if 'kondisi' in row_dict:
-                row_dict['kondisi_style'] = color_kondisi(row_dict['kondisi'])
-            data.append(row_dict)
-        
-        print(f"DEBUG: Prepared {len(data)} records for display")
-        print(f"=== HISTORICAL DATA PROCESSING COMPLETED ===\n")
+            if dashboard.rows == 0:
+                logger.warning("No data found for batch_id: %s", batch_id)
+                return render_template('result.html', 
+                                     total_rows=0, columns=[], 
+                                     column_display_mapping={},
+                                     dashboard_data={}, from_history=True, 
+                                     error="Data tidak ditemukan")
+            
+            # ===== CALCULATE DASHBOARD =====
+            view = {
+                'dashboard_data': dashboard.result(),
+                'columns': columns,
+                'total_rows': dashboard.rows,
+            }
+            history_cache.put((batch_id, 'view'), view)
+            
+            logger.info("=== HISTORICAL DATA PROCESSING COMPLETED ===")
+        else:
+            logger.debug("Cache hit for batch %s", batch_id)
         
         return render_template('result.html', 
-                             data=data, 
-                             columns=show_cols, 
+                             batch_id=batch_id,
+                             total_rows=view['total_rows'],
+                             columns=view['columns'], 
                              column_display_mapping=column_display_mapping,
-                             dashboard_data=dashboard_data, 
+                             dashboard_data=view['dashboard_data'], 
                              from_history=True)
     
     except Exception as e:
-        print(f"ERROR in riwayat_detail for batch {batch_id}: {e}")
+        logger.error("Error in riwayat_detail for batch %s: %s", batch_id, e)
         import traceback
         traceback.print_exc()
         
         return render_template('result.html', 
-                             data=[], 
+                             total_rows=0, 
                              columns=[], 
                              column_display_mapping={},
                              dashboard_data={'total_usaha': 0,'persentase_patuh': 0,'total_omset': 0,'jumlah_anomali': 0,'status_counts': {},'monthly_trend': []}, 
                              from_history=True,
                              error=f"Terjadi error saat memproses data: {str(e)}")       
 
+# Batas baris untuk satu request API (length=-1 dipakai tombol copy/print)
+API_MAX_ROWS = 10000
+API_DEFAULT_PAGE_LENGTH = 15
+
+@app.route('/api/batch/<batch_id>/rows')
+def batch_rows_api(batch_id):
+    """
+    Halaman baris batch untuk DataTables server-side processing
+    Query: draw, start, length (-1 = semua, dibatasi API_MAX_ROWS),
+           order_by (nopd/id), order_dir, search, status, kondisi, min_month, max_month
+    """
+    args = request.args
+    draw = args.get('draw', 0, type=int)
+    start = max(args.get('start', 0, type=int), 0)
+    length = args.get('length', API_DEFAULT_PAGE_LENGTH, type=int)
+    requested_all = length < 0
+    if requested_all or length > API_MAX_ROWS:
+        length = API_MAX_ROWS
+    
+    order_by = args.get('order_by', 'id')
+    if order_by not in PAGE_SORT_COLUMNS:
+        order_by = 'id'
+    order_dir = 'desc' if args.get('order_dir') == 'desc' else 'asc'
+    
+    filters = {
+        'search': ' '.join(args.get('search', '').split()),
+        'status': args.get('status', '').strip(),
+        'kondisi': args.get('kondisi', '').strip(),
+        'min_month': args.get('min_month', '').strip(),
+        'max_month': args.get('max_month', '').strip(),
+    }
+    has_filter = any(filters.values())
+    
+    cache_key = (batch_id, 'rows', start, length, requested_all, order_by, order_dir,
+                 tuple(sorted(filters.items())))
+    page = history_cache.get(cache_key)
+    if page is None:
+        try:
+            records_total = count_batch_rows(batch_id)
+            records_filtered = count_batch_rows(batch_id, filters) if has_filter else records_total
+            df_page = fetch_batch_page(batch_id, start, length, order_by, order_dir, filters)
+        except Exception as e:
+            logger.error("Error in batch_rows_api for batch %s: %s", batch_id, e)
+            return jsonify({'draw': draw, 'error': f"Gagal mengambil data: {e}"}), 500
+        
+        data = []
+        if not df_page.empty:
+            config = DataAttributeConfig()
+            df_display = prepare_display_data(prepare_history_data(df_page, config))
+            row_cols = get_display_columns(df_display, config)
+            if 'bulan_iso' in df_display.columns:
+                row_cols.append('bulan_iso')
+            
+            for row in df_display[row_cols].to_dict('records'):
+                if 'kondisi' in row:
+                    row['kondisi_style'] = color_kondisi(row['kondisi'])
+                data.append(row)
+        
+        page = {
+            'recordsTotal': records_total,
+            'recordsFiltered': records_filtered,
+            'data': data,
+            'truncated': requested_all and records_filtered - start > length,
+        }
+        if records_total > 0:
+            history_cache.put(cache_key, page)
+    
+    return jsonify(dict(page, draw=draw))
+
+EXPORT_FILENAME_PATTERN = re.compile(r'[^\w\-]+')
+
+def _stream_export(batch_id, fmt, total_rows):
+    """Bytes file export per potongan, dicatat sebagai tahap export.<format>"""
+    with span(f'export.{fmt}', rows=total_rows) as stage:
+        stage.bytes = 0
+        for data in iter_export(iter_batch_chunks(batch_id), fmt):
+            if data:
+                stage.bytes += len(data)
+                yield data
+
+@app.route('/riwayat/<batch_id>/export')
+def riwayat_export(batch_id):
+    """
+    Unduh semua baris batch (nilai mentah) sebagai CSV, XLSX, atau Parquet
+    Query: format (csv/xlsx/parquet, default csv)
+    Response di-stream (chunked) per potongan query, jadi memory server tetap
+    dan unduhan langsung mulai walaupun batch berisi jutaan baris
+    """
+    fmt = request.args.get('format', 'csv').strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Format tidak didukung: {fmt} (pilih {', '.join(EXPORT_FORMATS)})"}), 400
+    if not export_available(fmt):
+        return jsonify({'error': f"Export {fmt} membutuhkan paket pyarrow yang belum terpasang"}), 501
+    
+    try:
+        total_rows = count_batch_rows(batch_id)
+    except Exception as e:
+        logger.error("Error in riwayat_export for batch %s: %s", batch_id, e)
+        return jsonify({'error': f"Gagal mengambil data: {e}"}), 500
+    if total_rows == 0:
+        return jsonify({'error': "Data tidak ditemukan"}), 404
+    
+    logger.debug("EXPORT: batch %s, format %s, %s baris", batch_id, fmt, total_rows)
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"riwayat_{EXPORT_FILENAME_PATTERN.sub('_', batch_id)}.{extension}"
+    return Response(
+        stream_with_context(_stream_export(batch_id, fmt, total_rows)),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            # Jangan ditampung reverse proxy (nginx) agar potongan langsung terkirim
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+@app.route('/api/cache/stats')
+def cache_stats_api():
+    """Counter hit/miss/eviction cache riwayat"""
+    return jsonify(history_cache.stats())
+
+SERIES_FIELDS = {
+    'bulan': 'bulan',
+    'omset_perbulan': 'omset',
+    'jumlah_pajak_dibayar': 'pajak',
+    'status': 'status',
+    'growth': 'growth',
+    'kondisi': 'kondisi',
+    'skor_anomali': 'skor',
+    'batch_id': 'batch_id',
+}
+
+@app.route('/api/usaha/<id_usaha>/series')
+def business_series_api(id_usaha):
+    """
+    Seri bulanan satu usaha lintas batch dan tahun dari tabel seri_usaha
+    Query: from, to (YYYY-MM, opsional, inklusif)
+    """
+    start = request.args.get('from', '').strip() or None
+    end = request.args.get('to', '').strip() or None
+    for value in (start, end):
+        if value is not None and not ISO_MONTH_PATTERN.match(value):
+            return jsonify({'error': f"Format bulan tidak valid: {value} (YYYY-MM)"}), 400
+
+    # Sel usaha ini yang dilepas batch terhapus tapi belum diisi ulang job
+    # background (job gagal / antrean penuh) diisi dulu sebelum dibaca
+    try:
+        with span('series.refresh') as stage:
+            stage.rows = refresh_released_series(recompute_series, id_usaha=id_usaha)
+    except Exception as e:
+        logger.warning("Pending series refresh failed for %s, cells stay pending: %s", id_usaha, e)
+
+    try:
+        with span('series.fetch') as stage:
+            df = fetch_business_series(id_usaha, start, end)
+            stage.rows = len(df)
+    except Exception as e:
+        logger.error("Error in business_series_api for %s: %s", id_usaha, e)
+        return jsonify({'error': f"Gagal mengambil seri: {e}"}), 500
+
+    if df.empty:
+        return jsonify({'error': f"Seri untuk usaha {id_usaha} tidak ditemukan"}), 404
+
+    # Konversi per kolom (bukan per sel): NaN/NaT -> None untuk JSON
+    series = pd.DataFrame({'periode': df['periode_bulan'].str[:7]})
+    for col, key in SERIES_FIELDS.items():
+        series[key] = df[col].astype(object).where(df[col].notna(), None)
+    paid = df['tanggal_pembayaran']
+    series['tanggal_pembayaran'] = paid.dt.strftime('%Y-%m-%d').astype(object).where(paid.notna(), None)
+
+    return jsonify({
+        'id_usaha': id_usaha,
+        'nama_usaha': df['nama_usaha'].iloc[-1],
+        'jumlah_bulan': len(series),
+        'series': series.to_dict('records'),
+    })
+
         
+# Gauge yang dibaca saat /metrics di-scrape
+registry.register_collector('tren_pajak_db_pool', 'Connection pool database', lambda: get_pool_stats(create=False))
+registry.register_collector('tren_pajak_history_cache', 'Cache hasil olahan riwayat', history_cache.stats)
+registry.register_collector('tren_pajak_upload_jobs', 'Antrean job upload', lambda: get_job_manager().stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Metric format teks Prometheus: durasi tahap, query DB, request HTTP, pool, cache, antrean"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/hapus/<batch_id>', methods=['POST'])
 def hapus_batch(batch_id):
     """
     Hapus batch tertentu - menggunakan fungsi dari db.py
     """
     try:
-        print(f"DEBUG: Attempting to delete batch: {batch_id}")
+        logger.debug("Attempting to delete batch: %s", batch_id)
         affected_rows = delete_batch(batch_id)
-        print(f"DEBUG: Successfully deleted {affected_rows} rows for batch {batch_id}")
+        history_cache.invalidate(batch_id)
+        logger.debug("Successfully deleted %s rows for batch %s", affected_rows, batch_id)
+        
+        # Sel seri_usaha yang dilepas diisi ulang di background, di luar transaksi hapus
+        try:
+            get_job_manager().submit(run_series_refresh_job, 'seri_usaha')
+        except QueueFull as e:
+            # Kunci tetap tersimpan di seri_pending: diisi ulang saat seri usaha
+            # tsb diminta (business_series_api) atau oleh job refresh berikutnya
+            logger.warning("Series refresh not scheduled, pending cells are refreshed on read: %s", e)
         
         if affected_rows == 0:
-            print(f"WARNING: No rows found for batch_id: {batch_id}")
+            logger.warning("No rows found for batch_id: %s", batch_id)
         
     except Exception as e:
-        print(f"ERROR deleting batch {batch_id}: {e}")
+        logger.error("Error deleting batch %s: %s", batch_id, e)
         # Bisa tambah flash message atau redirect dengan error
     
     return redirect(url_for('riwayat'))
@@ -1134,18 +2177,19 @@ def hapus_semua_riwayat():
     Hapus semua riwayat - menggunakan fungsi dari db.py dengan error handling
     """
     try:
-        print("DEBUG: hapus_semua_riwayat function called")
+        logger.debug("hapus_semua_riwayat function called")
         
         # Gunakan fungsi yang sudah ada di db.py
         affected_rows = delete_all_history()
+        history_cache.clear()
         
-        print(f"DEBUG: Successfully deleted {affected_rows} rows from riwayat table")
+        logger.debug("Successfully deleted %s rows from riwayat table", affected_rows)
         
         if affected_rows == 0:
-            print("WARNING: No rows were deleted - table might already be empty")
+            logger.warning("No rows were deleted - table might already be empty")
         
     except Exception as e:
-        print(f"ERROR in hapus_semua_riwayat: {e}")
+        logger.error("Error in hapus_semua_riwayat: %s", e)
         import traceback
         traceback.print_exc()
         
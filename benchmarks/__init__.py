@@ -0,0 +1,4 @@
+"""
+Script benchmark untuk tahap-tahap pipeline analisis pajak.
+Jalankan dari root repository, contoh: python -m benchmarks.bench_growth
+"""
@@ -0,0 +1,98 @@
+"""
+Benchmark + akurasi detektor anomali (anomaly.py).
+
+Data sintetis dua tahun per usaha: level pajak lognormal, pola musiman
+dengan fase acak per usaha, noise 5%, sekitar 2% bulan disuntik anomali
+(x0.2 / x3), dan 10% bulan tidak bayar. Untuk setiap detektor dicatat waktu,
+jumlah ANOMALI, precision dan recall terhadap bulan yang disuntik, serta
+jumlah false positive di tahun kedua (saat baseline musiman sudah tersedia).
+Detektor 'growth' harus menghasilkan kondisi yang sama dengan aturan lama.
+
+Jalankan: python -m benchmarks.bench_anomaly [jumlah_usaha ...] [--output hasil.json]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from anomaly import DETECTORS
+from app import calculate_growth_vectorized, classify_kondisi, detect_anomalies
+from benchmarks.report import add_output_argument, write_report
+
+DEFAULT_SIZES = [10_000, 41_667]
+N_MONTHS = 24
+SEASON_AMPLITUDE = 0.3
+ANOMALY_RATE = 0.02
+GAP_RATE = 0.1
+
+
+def make_series_frame(n_businesses, seed=0):
+    """
+    DataFrame panjang (usaha x bulan) berbentuk output process_data_flexible
+    (nopd/bulan_iso category), diacak. Return: (df, mask bulan yang disuntik anomali)
+    """
+    rng = np.random.default_rng(seed)
+    months = [f"{2024 + i // 12}-{i % 12 + 1:02d}" for i in range(N_MONTHS)]
+
+    level = rng.lognormal(13, 1, (n_businesses, 1))
+    phase = rng.uniform(0, 2 * np.pi, (n_businesses, 1))
+    season = 1 + SEASON_AMPLITUDE * np.sin(2 * np.pi * np.arange(N_MONTHS) / 12 + phase)
+    pajak = (level * season * rng.normal(1, 0.05, (n_businesses, N_MONTHS))).round()
+
+    injected = rng.random(pajak.shape) < ANOMALY_RATE
+    pajak[injected] *= rng.choice([0.2, 3.0], injected.sum())
+    gap = rng.random(pajak.shape) < GAP_RATE
+    pajak[gap] = np.nan
+
+    df = pd.DataFrame({
+        'nopd': pd.Categorical(np.repeat([f"NOPD{i:07d}" for i in range(n_businesses)], N_MONTHS)),
+        'bulan_iso': pd.Categorical(np.tile(months, n_businesses)),
+        'jumlah_pajak_dibayar': pajak.ravel(),
+        'status': np.where(np.isnan(pajak.ravel()), 'TIDAK VALID', 'VALID'),
+    })
+    df['growth'] = calculate_growth_vectorized(df)
+
+    order = np.random.default_rng(seed + 1).permutation(len(df))
+    return df.iloc[order].reset_index(drop=True), (injected & ~gap).ravel()[order]
+
+
+def run(sizes, output=None):
+    results = []
+    print(f"{'usaha':>10} {'baris':>10} {'detektor':>13} {'waktu (s)':>10} {'anomali':>9} "
+          f"{'precision':>10} {'recall':>7} {'FP thn 2':>9}")
+
+    for n_businesses in sizes:
+        df, injected = make_series_frame(n_businesses)
+        second_year = (df['bulan_iso'].astype(str) >= '2025-01').to_numpy()
+        legacy = classify_kondisi(df[['status', 'growth']])
+
+        for name in DETECTORS:
+            start = time.perf_counter()
+            result = detect_anomalies(df.copy(), detector=name)
+            elapsed = time.perf_counter() - start
+
+            flagged = (result['kondisi'] == 'ANOMALI').to_numpy()
+            true_positive = int((flagged & injected).sum())
+            false_positive_y2 = int((flagged & ~injected & second_year).sum())
+            if name == 'growth' and not result['kondisi'].equals(legacy):
+                raise AssertionError(f"Detektor growth berbeda dari aturan lama untuk {n_businesses} usaha")
+
+            precision = true_positive / max(int(flagged.sum()), 1)
+            recall = true_positive / injected.sum()
+            results.append({'size': n_businesses, 'stage': name, 'rows': len(df), 'seconds': elapsed,
+                            'anomali': int(flagged.sum()), 'precision': precision, 'recall': recall,
+                            'false_positive_tahun_2': false_positive_y2})
+            print(f"{n_businesses:>10} {len(df):>10} {name:>13} {elapsed:>10.3f} {int(flagged.sum()):>9} "
+                  f"{precision:>10.3f} {recall:>7.3f} {false_positive_y2:>9}")
+
+    return write_report(output, 'bench_anomaly', results, sizes=sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah usaha')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, output=args.output)
@@ -0,0 +1,140 @@
+"""
+Benchmark mode append: menambah satu bulan ke batch yang sudah berisi
+bulan-bulan sebelumnya vs upload ulang workbook setahun penuh sebagai batch baru.
+
+Batch awal dibuat dari workbook sintetis (n_bulan - 1 bulan), lalu bulan
+terakhir di-append dari workbook yang hanya berisi kolom bulan tsb. Isi batch
+hasil append (baris, growth, kondisi) dan ringkasan katalognya harus sama dengan
+upload ulang penuh (total omset katalog boleh beda di digit terakhir karena
+dijumlah inkremental). Waktu append diharapkan tetap walaupun jumlah bulan yang
+sudah tersimpan bertambah.
+
+Jalankan: python -m benchmarks.bench_append [jumlah_usaha ...] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import time
+
+import db
+from app import (calculate_dashboard_metrics, prepare_records, preprocess_sheet, process_data_flexible,
+                 recompute_series, recompute_trend)
+from benchmarks.pgcluster import local_postgres
+from benchmarks.report import add_output_argument, write_report
+from benchmarks.synthetic import make_wide_sheet
+
+DEFAULT_SIZES = [1_000, 10_000]
+DEFAULT_MONTHS = [3, 6, 12]
+COMPARE_COLUMNS = ['nopd', 'nama_usaha', 'bulan', 'omset_perbulan', 'jumlah_pajak_dibayar',
+                   'tanggal_pembayaran', 'status', 'growth', 'kondisi']
+CATALOG_COLUMNS = ['row_count', 'business_count', 'persentase_patuh', 'total_omset', 'jumlah_anomali',
+                   'jumlah_normal', 'jumlah_kondisi', 'detektor']
+
+
+def _quiet(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def select_months(sheet, positions):
+    """Sheet dengan kolom identitas + kolom bulan pada posisi tertentu saja"""
+    identity_cols = [col for col in sheet.columns if not str(col).startswith(('PEMBAYARAN', 'Unnamed'))]
+    month_cols = [col for col in sheet.columns if col not in identity_cols]
+    subset = sheet[identity_cols + [month_cols[i] for i in positions]].copy()
+    subset.columns = identity_cols + [month_cols[0]] + [
+        f"Unnamed: {len(identity_cols) + i}" for i in range(1, len(positions))
+    ]
+    return subset
+
+
+def full_upload(sheet, filename):
+    """Jalur upload biasa: proses seluruh workbook lalu simpan sebagai batch baru"""
+    df = process_data_flexible(preprocess_sheet(sheet.copy()))
+    return db.insert_history_flexible(df, filename, metrics=calculate_dashboard_metrics(df))
+
+
+def append_upload(batch_id, sheet, filename):
+    """Jalur append: prepare_records lalu tulis sel baru ke batch yang ada"""
+    df = prepare_records(preprocess_sheet(sheet.copy()))[0]
+    return db.append_history_flexible(batch_id, df, filename, recompute_trend, series_recompute=recompute_series)
+
+
+def _batch_rows(batch_id):
+    df = db.fetch_by_batch_flexible(batch_id)[COMPARE_COLUMNS]
+    return df.sort_values(['nopd', 'bulan']).reset_index(drop=True)
+
+
+def _catalog_row(batch_id):
+    """Baris katalog batches apa adanya (termasuk kolom yang tidak tampil di halaman Riwayat)"""
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(CATALOG_COLUMNS)} FROM batches WHERE batch_id = %s", (batch_id,))
+        row = cursor.fetchone()
+        cursor.close()
+    return dict(zip(CATALOG_COLUMNS, row))
+
+
+def check_parity(appended_id, reference_id):
+    expected = _quiet(_batch_rows, reference_id)
+    got = _quiet(_batch_rows, appended_id)
+    if len(expected) != len(got):
+        raise AssertionError(f"Jumlah baris berbeda: {len(got)} vs {len(expected)}")
+    for col in COMPARE_COLUMNS:
+        if not expected[col].astype(object).equals(got[col].astype(object)):
+            raise AssertionError(f"Kolom {col} berbeda antara append dan upload penuh")
+
+    appended, reference = _catalog_row(appended_id), _catalog_row(reference_id)
+    for col in CATALOG_COLUMNS:
+        if isinstance(reference[col], (str, type(None))):
+            same = appended[col] == reference[col]
+        else:
+            same = math.isclose(float(appended[col]), float(reference[col]), rel_tol=1e-12)
+        if not same:
+            raise AssertionError(f"Katalog {col} berbeda antara append dan upload penuh: "
+                                 f"{appended[col]} vs {reference[col]}")
+
+
+def run(sizes, month_counts, output=None):
+    results = []
+    print(f"{'usaha':>10} {'bulan':>6} {'baris':>10} {'upload penuh (s)':>17} {'append (s)':>11} {'speedup':>8}")
+
+    with local_postgres():
+        for n_businesses in sizes:
+            sheet = make_wide_sheet(n_businesses)
+            for n_months in month_counts:
+                batch_ids = []
+                try:
+                    batch_ids.append(_quiet(full_upload, select_months(sheet, range(n_months - 1)), 'awal.xlsx'))
+
+                    start = time.perf_counter()
+                    batch_ids.append(_quiet(full_upload, select_months(sheet, range(n_months)), 'penuh.xlsx'))
+                    full_time = time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    summary = _quiet(append_upload, batch_ids[0], select_months(sheet, [n_months - 1]), 'bulan.xlsx')
+                    append_time = time.perf_counter() - start
+
+                    check_parity(batch_ids[0], batch_ids[1])
+                    results += [
+                        {'size': n_businesses, 'stage': f"upload_penuh/{n_months}_bulan",
+                         'rows': summary['row_count'], 'seconds': full_time},
+                        {'size': n_businesses, 'stage': f"append/{n_months}_bulan",
+                         'rows': summary['row_count'], 'seconds': append_time},
+                    ]
+                    print(f"{n_businesses:>10} {n_months:>6} {summary['row_count']:>10} {full_time:>17.3f} "
+                          f"{append_time:>11.3f} {full_time / append_time:>7.1f}x")
+                finally:
+                    for batch_id in batch_ids:
+                        _quiet(db.delete_batch, batch_id)
+
+    return write_report(output, 'bench_append', results, sizes=sizes, months=month_counts)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah usaha')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, DEFAULT_MONTHS, output=args.output)
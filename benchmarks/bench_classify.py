@@ -0,0 +1,134 @@
+"""
+Benchmark + cek kesetaraan klasifikasi status/kondisi.
+
+Membandingkan classify_status / classify_kondisi (per kolom, hasil category)
+dengan fungsi row-wise lama yang dijalankan lewat df.apply(axis=1). Label
+harus identik pada korpus nilai sintetis (termasuk nilai kosong/aneh) dan data
+berbentuk asli hasil preprocess_sheet + process_data_flexible.
+
+Jalankan: python -m benchmarks.bench_classify [jumlah_usaha ...] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import classify_kondisi, classify_status, preprocess_sheet, process_data_flexible
+from benchmarks.report import add_output_argument, write_report
+from benchmarks.synthetic import make_wide_sheet
+
+DEFAULT_SIZES = [1_000, 10_000, 50_000]
+
+
+def validate_payment_status(row):
+    """
+    Fungsi status row-wise lama (referensi)
+    """
+    nama_valid = row.get('nama_usaha') and str(row.get('nama_usaha')).strip() not in ['', 'nan', 'None']
+    nopd_valid = row.get('nopd') and str(row.get('nopd')).strip() not in ['', 'nan', 'None']
+    bulan_valid = row.get('bulan') and str(row.get('bulan')).strip() not in ['', 'nan', 'None']
+
+    pajak = row.get('jumlah_pajak_dibayar')
+    pajak_valid = pajak is not None and pd.notna(pajak) and float(pajak) > 0
+
+    if nama_valid and nopd_valid and bulan_valid and pajak_valid:
+        return 'VALID'
+    else:
+        return 'TIDAK VALID'
+
+
+def detect_condition(row):
+    """
+    Fungsi kondisi row-wise lama (referensi)
+    """
+    if row['status'] != 'VALID':
+        return 'TIDAK TAAT PAJAK'
+
+    if pd.isna(row['growth']):
+        return 'NORMAL'
+
+    if abs(row['growth']) >= 0.5:
+        return 'ANOMALI'
+
+    return 'NORMAL'
+
+
+def edge_case_corpus():
+    """
+    Semua kombinasi nilai kosong/aneh untuk kolom required, pajak, dan growth
+    """
+    text_values = [None, np.nan, '', '   ', 'nan', 'None', ' None ', 0, 0.0, False, '0', 'A', ' a b ', 12, 1.5]
+    pajak_values = [None, np.nan, 0, 0.0, -10.0, 0.01, 5, '5', '0']
+    growth_values = [np.nan, pd.NA, None, -1.0, -0.5, -0.4999, 0.0, 0.4999, 0.5, 10.0]
+
+    rows = []
+    for text, pajak, growth in itertools.product(text_values, pajak_values, growth_values):
+        rows.append({'nopd': text, 'nama_usaha': 'USAHA', 'bulan': 'januari',
+                     'jumlah_pajak_dibayar': pajak, 'growth': growth})
+        rows.append({'nopd': 'N1', 'nama_usaha': text, 'bulan': 'maret',
+                     'jumlah_pajak_dibayar': pajak, 'growth': growth})
+        rows.append({'nopd': 'N2', 'nama_usaha': 'USAHA', 'bulan': text,
+                     'jumlah_pajak_dibayar': pajak, 'growth': growth})
+    return pd.DataFrame(rows)
+
+
+def check_parity(df, label):
+    expected_status = df.apply(validate_payment_status, axis=1)
+    got_status = classify_status(df)
+    if not expected_status.equals(got_status.astype(object)):
+        raise AssertionError(f"Status berbeda pada korpus {label}")
+
+    df = df.assign(status=got_status)
+    expected_kondisi = df.apply(detect_condition, axis=1)
+    got_kondisi = classify_kondisi(df)
+    if not expected_kondisi.equals(got_kondisi.astype(object)):
+        raise AssertionError(f"Kondisi berbeda pada korpus {label}")
+
+    print(f"OK: label identik pada korpus {label} ({len(df)} baris)")
+
+
+def run(sizes, output=None):
+    results = []
+    check_parity(edge_case_corpus(), 'nilai sintetis')
+
+    print(f"{'usaha':>10} {'baris':>10} {'row-wise (s)':>13} {'kolom (s)':>10} {'speedup':>9}")
+
+    for n_businesses in sizes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = process_data_flexible(preprocess_sheet(make_wide_sheet(n_businesses)))
+        df = df.drop(columns=['status', 'kondisi'])
+
+        start = time.perf_counter()
+        status = df.apply(validate_payment_status, axis=1)
+        kondisi = df.assign(status=status).apply(detect_condition, axis=1)
+        rowwise_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        got_status = classify_status(df)
+        got_kondisi = classify_kondisi(df.assign(status=got_status))
+        column_time = time.perf_counter() - start
+
+        if not (status.equals(got_status.astype(object)) and kondisi.equals(got_kondisi.astype(object))):
+            raise AssertionError(f"Label berbeda pada data berbentuk asli ({n_businesses} usaha)")
+
+        results += [
+            {'size': n_businesses, 'stage': 'rowwise', 'rows': len(df), 'seconds': rowwise_time},
+            {'size': n_businesses, 'stage': 'columnwise', 'rows': len(df), 'seconds': column_time},
+        ]
+        print(f"{n_businesses:>10} {len(df):>10} {rowwise_time:>13.3f} {column_time:>10.3f} "
+              f"{rowwise_time / column_time:>8.0f}x")
+
+    return write_report(output, 'bench_classify', results, sizes=sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah usaha')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, output=args.output)
@@ -0,0 +1,114 @@
+"""
+Benchmark + cek kesetaraan clean_text_data.
+
+Membandingkan clean_text_data (faktorisasi + satu regex per nilai unik) dengan
+versi lama yang menjalankan enam str.replace/strip di setiap sel. Hasil harus
+identik byte per byte pada korpus nilai aneh (whitespace Unicode, simbol,
+huruf non-ASCII, angka, kosong) dan pada kolom teks berbentuk asli dengan
+kardinalitas realistis (setiap usaha berulang 12x, bulan hanya 12 nilai).
+Kolom dari preprocess_sheet berupa category, jadi hasilnya juga category.
+
+Jalankan: python -m benchmarks.bench_clean_text [jumlah_usaha ...] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import clean_text_data, preprocess_sheet
+from benchmarks.report import add_output_argument, write_report
+from benchmarks.synthetic import make_wide_sheet
+
+DEFAULT_SIZES = [1_000, 10_000, 50_000]
+TEXT_COLUMNS = ['nopd', 'nama_usaha', 'bulan']
+
+
+def clean_text_data_reference(series):
+    """
+    Fungsi lama (referensi)
+    """
+    return (
+        series
+        .astype(str)
+        .str.strip()
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.replace(r'[^\w\s\-\:\/]', '', regex=True)
+        .str.replace(r'[^\x00-\x7F]+', '', regex=True)
+        .str.replace(r'[\n\r\t\f\v\u00A0]', ' ', regex=True)
+        .str.strip()
+    )
+
+
+def edge_case_corpus():
+    """
+    Potongan teks aneh digabung berpasangan agar interaksi antar langkah
+    (mis. spasi ganda setelah huruf non-ASCII dibuang) ikut teruji
+    """
+    pieces = ['', ' ', '  ', '\t', '\n', '\r\n', '\x0b', '\x0c', '\x1c', '\x85', '\u00a0', '\u2003', '\u3000',
+              'a', 'CV. MAJU', 'é', 'Ü', 'éè', '日本', '–', '—', '™', '©', '😀',
+              '-', ':', '/', '\\', '_', '.', ',', '&', "'", '"', '(', ')', '#', '@', '\x00', '\x7f',
+              '12', '٣', '3201.001.002', ' a é b ']
+    values = [a + b + c for a, b, c in itertools.product(pieces, pieces[:12] + ['é', '.', 'x'], pieces)]
+    values += [None, np.nan, 0, 1, 1.0, 1.5, True, False, pd.NaT, pd.Timestamp('2025-01-15'), 'nan', 'None']
+    return pd.Series(values, dtype=object, name='nama_usaha')
+
+
+def check_parity(series, label):
+    expected = clean_text_data_reference(series)
+    got = clean_text_data(series)
+    if not expected.equals(got) or expected.dtype != got.dtype or expected.name != got.name:
+        raise AssertionError(f"Hasil berbeda pada korpus {label}")
+    print(f"OK: hasil identik pada korpus {label} ({len(series)} nilai)")
+
+
+def run(sizes, output=None):
+    results = []
+    corpus = edge_case_corpus()
+    check_parity(corpus, 'nilai aneh')
+    check_parity(corpus.iloc[::-1].reset_index(drop=True).set_axis(range(100, 100 + len(corpus))), 'index acak')
+    check_parity(pd.Series([], dtype=object), 'kosong')
+    check_parity(pd.Series([1.0, np.nan, 2.5]), 'float')
+    check_parity(pd.Series(['a  b', None, ' é '], dtype='string'), 'string dtype')
+
+    print(f"{'usaha':>10} {'kolom':<11} {'baris':>9} {'unik':>8} {'lama (s)':>9} {'baru (s)':>9} {'speedup':>8}")
+
+    for n_businesses in sizes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = preprocess_sheet(make_wide_sheet(n_businesses))
+        df = df.rename(columns=str.lower).rename(columns={'nama usaha': 'nama_usaha'})
+
+        for col in [col for col in TEXT_COLUMNS if col in df.columns]:
+            series = df[col]
+
+            start = time.perf_counter()
+            expected = clean_text_data_reference(series)
+            old_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            got = clean_text_data(series)
+            new_time = time.perf_counter() - start
+
+            if not expected.equals(got.astype(object)):
+                raise AssertionError(f"Hasil berbeda pada kolom {col} ({n_businesses} usaha)")
+
+            results += [
+                {'size': n_businesses, 'stage': f"{col}/lama", 'rows': len(series), 'seconds': old_time},
+                {'size': n_businesses, 'stage': f"{col}/baru", 'rows': len(series), 'seconds': new_time},
+            ]
+            print(f"{n_businesses:>10} {col:<11} {len(series):>9} {series.nunique():>8} "
+                  f"{old_time:>9.3f} {new_time:>9.3f} {old_time / new_time:>7.1f}x")
+
+    return write_report(output, 'bench_clean_text', results, sizes=sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah usaha')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, output=args.output)
@@ -0,0 +1,61 @@
+"""
+Benchmark calculate_dashboard_metrics pada data hasil process_data_flexible
+dan pada data berbentuk hasil fetch database (Decimal / string).
+
+Jalankan: python -m benchmarks.bench_dashboard [jumlah_usaha ...] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import decimal
+import io
+import time
+
+from app import calculate_dashboard_metrics, preprocess_sheet, process_data_flexible
+from benchmarks.report import add_output_argument, write_report
+from benchmarks.synthetic import make_wide_sheet
+
+DEFAULT_SIZES = [10_000, 50_000, 100_000]
+
+
+def as_fetched_from_db(df):
+    """
+    Tiru bentuk data riwayat: NUMERIC sebagai Decimal, bulan sebagai teks
+    """
+    df = df.drop(columns=['bulan_iso'], errors='ignore').copy()
+    for col in ['omset_perbulan', 'jumlah_pajak_dibayar', 'growth']:
+        df[col] = [None if value != value else decimal.Decimal(str(value)) for value in df[col]]
+    return df
+
+
+def run(sizes, output=None):
+    results = []
+    print(f"{'usaha':>10} {'baris':>10} {'processed (s)':>14} {'db-shaped (s)':>14}")
+
+    for n_businesses in sizes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = process_data_flexible(preprocess_sheet(make_wide_sheet(n_businesses)))
+        df_db = as_fetched_from_db(df)
+
+        timings = []
+        for frame in [df, df_db]:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                calculate_dashboard_metrics(frame)
+            timings.append(time.perf_counter() - start)
+
+        results += [
+            {'size': n_businesses, 'stage': 'processed', 'rows': len(df), 'seconds': timings[0]},
+            {'size': n_businesses, 'stage': 'db_shaped', 'rows': len(df), 'seconds': timings[1]},
+        ]
+        print(f"{n_businesses:>10} {len(df):>10} {timings[0]:>14.3f} {timings[1]:>14.3f}")
+
+    return write_report(output, 'bench_dashboard', results, sizes=sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah usaha')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, output=args.output)
@@ -0,0 +1,211 @@
+"""
+Benchmark hapus batch: delete_batch (detach + drop partisi) vs DELETE biasa
+pada tabel tanpa partisi berisi data yang sama, untuk ukuran riwayat yang
+terus membesar. Waktu delete_batch seharusnya tetap, sedangkan DELETE ikut
+naik sesuai jumlah baris batch dan ukuran index. Pengisian ulang seri_usaha
+(refresh_released_series) berjalan terpisah setelah hapus dan diukur di kolom sendiri.
+
+Kasus pembaca bersamaan: satu transaksi baca riwayat dibiarkan terbuka selama
+hapus berjalan, sementara query baca baru terus dikirim. Kolom "baca maks"
+adalah latensi terlama query baru tsb: dengan DETACH biasa (lock ACCESS
+EXCLUSIVE) query baru ikut mengantre sampai transaksi terbuka selesai,
+dengan delete_batch (DETACH ... CONCURRENTLY) query baru tetap langsung jalan.
+
+Memakai PostgreSQL lokal (lihat benchmarks/pgcluster.py). Semua batch dan
+tabel pembanding dihapus kembali setelah diukur.
+
+Jalankan: python -m benchmarks.bench_delete [total_baris_riwayat ...] [--batch-rows 10000] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import threading
+import time
+
+import db
+from benchmarks.bench_insert import make_history_frame
+from benchmarks.pgcluster import local_postgres
+from benchmarks.report import add_output_argument, write_report
+
+DEFAULT_SIZES = [0, 200_000, 1_000_000]
+# Data latar diisi per batch sebesar ini (satu partisi per batch)
+BACKGROUND_BATCH_ROWS = 100_000
+PLAIN_TABLE = 'bench_riwayat_plain'
+# Lama transaksi baca yang dibiarkan terbuka selama hapus (detik)
+READER_HOLD_SECONDS = 1.0
+PROBE_INTERVAL = 0.01
+
+
+def _quiet(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def _insert_batch(df, filename):
+    batch_id = _quiet(db.insert_history_flexible, df, filename)
+    if not batch_id:
+        raise RuntimeError(f"insert {filename} gagal")
+    return batch_id
+
+
+def _fill_background(batch_ids, target_rows):
+    """Tambah batch latar sampai total baris riwayat mencapai target_rows"""
+    frame = make_history_frame(BACKGROUND_BATCH_ROWS, seed=23)
+    current = len(batch_ids) * BACKGROUND_BATCH_ROWS
+    while current < target_rows:
+        batch_ids.append(_insert_batch(frame, f"latar_{len(batch_ids)}.xlsx"))
+        current += BACKGROUND_BATCH_ROWS
+    return current
+
+
+def _time_plain_delete(batch_id):
+    """
+    Salin riwayat ke tabel biasa (index sama + index batch_id seperti skema lama),
+    lalu ukur DELETE batch yang sama
+    """
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {PLAIN_TABLE}")
+            cursor.execute(f"CREATE TABLE {PLAIN_TABLE} AS SELECT * FROM riwayat")
+            cursor.execute(f"ALTER TABLE {PLAIN_TABLE} ADD PRIMARY KEY (id)")
+            cursor.execute(f"CREATE INDEX ON {PLAIN_TABLE} (batch_id)")
+            cursor.execute(f"CREATE INDEX ON {PLAIN_TABLE} (timestamp)")
+            cursor.execute(f"CREATE INDEX ON {PLAIN_TABLE} (id_usaha, periode_bulan)")
+            cursor.execute(f"ANALYZE {PLAIN_TABLE}")
+            conn.commit()
+
+            start = time.perf_counter()
+            cursor.execute(f"DELETE FROM {PLAIN_TABLE} WHERE batch_id = %s", (batch_id,))
+            conn.commit()
+            elapsed = time.perf_counter() - start
+
+            cursor.execute(f"DROP TABLE {PLAIN_TABLE}")
+            conn.commit()
+            return elapsed
+        finally:
+            cursor.close()
+
+
+def _legacy_detach(batch_id):
+    """DETACH tanpa CONCURRENTLY (cara lama), tabelnya dibuang delete_batch sesudahnya"""
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"ALTER TABLE riwayat DETACH PARTITION {db._partition_name(batch_id)}")
+            conn.commit()
+        finally:
+            cursor.close()
+
+
+def _with_open_reader(delete, batch_id):
+    """
+    Jalankan delete(batch_id) selagi satu transaksi baca riwayat terbuka
+    READER_HOLD_SECONDS, dan kirim query baca baru terus-menerus sampai hapus
+    selesai. Return: (waktu hapus, latensi baca baru terlama)
+    """
+    reading = threading.Event()
+
+    def hold_reader():
+        with contextlib.closing(db.get_connection()) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM riwayat")
+            reading.set()
+            time.sleep(READER_HOLD_SECONDS)
+            conn.rollback()
+
+    holder = threading.Thread(target=hold_reader)
+    holder.start()
+    reading.wait()
+
+    elapsed = {}
+
+    def timed_delete():
+        start = time.perf_counter()
+        _quiet(delete, batch_id)
+        elapsed['delete'] = time.perf_counter() - start
+
+    deleter = threading.Thread(target=timed_delete)
+    slowest = 0.0
+    with contextlib.closing(db.get_connection()) as conn:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        deleter.start()
+        while deleter.is_alive():
+            start = time.perf_counter()
+            cursor.execute("SELECT id FROM riwayat ORDER BY id LIMIT 1")
+            cursor.fetchall()
+            slowest = max(slowest, time.perf_counter() - start)
+            time.sleep(PROBE_INTERVAL)
+    deleter.join()
+    holder.join()
+    return elapsed['delete'], slowest
+
+
+def run(sizes, batch_rows, output=None):
+    results = []
+    print(f"{'baris riwayat':>14} {'baris batch':>12} {'detach+drop (s)':>16} {'DELETE (s)':>11} "
+          f"{'isi ulang seri (s)':>19}")
+    target_frame = make_history_frame(batch_rows)
+    background = []
+
+    with local_postgres():
+        try:
+            for size in sorted(sizes):
+                total = _fill_background(background, size)
+                target = _insert_batch(target_frame, 'target.xlsx')
+
+                plain_seconds = _time_plain_delete(target)
+
+                start = time.perf_counter()
+                deleted = _quiet(db.delete_batch, target)
+                partition_seconds = time.perf_counter() - start
+                if deleted != batch_rows:
+                    raise RuntimeError(f"delete_batch menghapus {deleted} baris, harusnya {batch_rows}")
+
+                start = time.perf_counter()
+                _quiet(db.refresh_released_series)
+                refresh_seconds = time.perf_counter() - start
+
+                results += [
+                    {'size': total + batch_rows, 'stage': 'detach_drop', 'rows': batch_rows, 'seconds': partition_seconds},
+                    {'size': total + batch_rows, 'stage': 'delete', 'rows': batch_rows, 'seconds': plain_seconds},
+                    {'size': total + batch_rows, 'stage': 'refresh_seri', 'rows': batch_rows, 'seconds': refresh_seconds},
+                ]
+                print(f"{total + batch_rows:>14} {batch_rows:>12} {partition_seconds:>16.4f} {plain_seconds:>11.4f} "
+                      f"{refresh_seconds:>19.4f}")
+
+                # Hapus dengan pembaca bersamaan: cara lama vs delete_batch
+                legacy_target = _insert_batch(target_frame, 'target_lama.xlsx')
+                _, legacy_read = _with_open_reader(_legacy_detach, legacy_target)
+                _quiet(db.delete_batch, legacy_target)
+                target = _insert_batch(target_frame, 'target.xlsx')
+                concurrent_seconds, concurrent_read = _with_open_reader(db.delete_batch, target)
+                _quiet(db.refresh_released_series)
+                results += [
+                    {'size': total + batch_rows, 'stage': 'baca_saat_detach_lama', 'rows': batch_rows,
+                     'seconds': legacy_read},
+                    {'size': total + batch_rows, 'stage': 'baca_saat_delete_batch', 'rows': batch_rows,
+                     'seconds': concurrent_read},
+                    {'size': total + batch_rows, 'stage': 'delete_batch_dengan_pembaca', 'rows': batch_rows,
+                     'seconds': concurrent_seconds},
+                ]
+                print(f"{'':>14} pembaca terbuka {READER_HOLD_SECONDS:.1f} s: baca maks {legacy_read:.4f} s "
+                      f"(DETACH lama), {concurrent_read:.4f} s (delete_batch, hapus {concurrent_seconds:.4f} s)")
+        finally:
+            for batch_id in background:
+                _quiet(db.delete_batch, batch_id)
+            _quiet(db.refresh_released_series)
+
+    return write_report(output, 'bench_delete', results, sizes=sizes, batch_rows=batch_rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES,
+                        help='jumlah baris riwayat lain (latar) sebelum batch dihapus')
+    parser.add_argument('--batch-rows', type=int, default=10_000, help='jumlah baris batch yang dihapus')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, args.batch_rows, output=args.output)
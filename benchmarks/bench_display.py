@@ -0,0 +1,115 @@
+"""
+Benchmark + cek kesetaraan format tampilan prepare_display_data.
+
+Membandingkan format per kolom (format_currency_column, format_growth_column,
+map_unique untuk tanggal dan teks) dengan apply per sel yang lama. String
+hasil harus identik pada korpus angka aneh (NaN, 0, -0.0, inf, desimal,
+angka sangat besar) dan pada data berbentuk asli hasil process_data_flexible.
+
+Jalankan: python -m benchmarks.bench_display [jumlah_usaha ...] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import (format_currency, format_currency_column, format_date, format_growth_column,
+                 format_text, map_unique, preprocess_sheet, process_data_flexible, restore_dtypes)
+from benchmarks.report import add_output_argument, write_report
+from benchmarks.synthetic import make_wide_sheet
+
+DEFAULT_SIZES = [1_000, 10_000, 41_667]
+TEXT_COLUMNS = ['nama_usaha', 'jenis_pajak_usaha', 'npwpd', 'nopd', 'id_usaha', 'bulan']
+
+
+def reference_formats(df):
+    """
+    Format lama (referensi): apply per sel
+    """
+    return {
+        'omset_perbulan': df['omset_perbulan'].apply(format_currency),
+        'jumlah_pajak_dibayar': df['jumlah_pajak_dibayar'].apply(format_currency),
+        'growth': df['growth'].apply(lambda x: f"{x*100:.2f}%" if pd.notna(x) else '-'),
+        'tanggal_pembayaran': df['tanggal_pembayaran'].apply(
+            lambda x: x.strftime('%Y-%m-%d') if pd.notna(x) else '-'
+        ),
+        **{col: df[col].astype(str).str.strip().replace('nan', '-') for col in TEXT_COLUMNS if col in df.columns},
+    }
+
+
+def column_formats(df):
+    return {
+        'omset_perbulan': format_currency_column(df['omset_perbulan']),
+        'jumlah_pajak_dibayar': format_currency_column(df['jumlah_pajak_dibayar']),
+        'growth': format_growth_column(df['growth']),
+        'tanggal_pembayaran': map_unique(df['tanggal_pembayaran'], format_date),
+        **{col: map_unique(df[col], format_text) for col in TEXT_COLUMNS if col in df.columns},
+    }
+
+
+def edge_case_frame():
+    numbers = [np.nan, 0.0, -0.0, 1.0, -1.0, 0.5, 0.005, 0.004999, 1234.5, 999999.995, 1e15,
+               2.0 ** 53 + 2, 1e22, -1e22, np.inf, -np.inf, 1 / 3, -15.25, 10.0, -0.000001]
+    n = len(numbers)
+    return pd.DataFrame({
+        'omset_perbulan': numbers,
+        'jumlah_pajak_dibayar': numbers[::-1],
+        'growth': numbers,
+        'tanggal_pembayaran': pd.to_datetime(['2025-01-15', None, '1999-12-31', '2030-05-05'] * (n // 4)),
+        'nama_usaha': [' a ', 'nan', None, np.nan, '', '\x00a', '\x00b', 'é', 'b', 'B'] * (n // 10),
+        'npwpd': [1.0, np.nan, -0.0, 1e20, 2.5] * (n // 5),
+        'nopd': pd.Series([1, 2, 3, 4, 5] * (n // 5), dtype='int64'),
+    })
+
+
+def check_parity(df, label):
+    expected = reference_formats(df)
+    got = column_formats(df)
+    for col, values in expected.items():
+        if not values.astype(object).equals(got[col]):
+            raise AssertionError(f"Format kolom {col} berbeda pada korpus {label}")
+    print(f"OK: format identik pada korpus {label} ({len(df)} baris)")
+
+
+def run(sizes, output=None):
+    results = []
+    check_parity(edge_case_frame(), 'nilai aneh')
+    check_parity(edge_case_frame().astype({'omset_perbulan': 'float32', 'growth': 'float32'}), 'float32')
+
+    print(f"{'usaha':>10} {'baris':>10} {'apply (s)':>10} {'kolom (s)':>10} {'speedup':>8}")
+    for n_businesses in sizes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = restore_dtypes(process_data_flexible(preprocess_sheet(make_wide_sheet(n_businesses))))
+
+        start = time.perf_counter()
+        expected = reference_formats(df)
+        apply_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        got = column_formats(df)
+        column_time = time.perf_counter() - start
+
+        for col, values in expected.items():
+            if not values.equals(got[col]):
+                raise AssertionError(f"Format kolom {col} berbeda ({n_businesses} usaha)")
+
+        results += [
+            {'size': n_businesses, 'stage': 'apply', 'rows': len(df), 'seconds': apply_time},
+            {'size': n_businesses, 'stage': 'columnwise', 'rows': len(df), 'seconds': column_time},
+        ]
+        print(f"{n_businesses:>10} {len(df):>10} {apply_time:>10.3f} {column_time:>10.3f} "
+              f"{apply_time / column_time:>7.1f}x")
+
+    return write_report(output, 'bench_display', results, sizes=sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah usaha')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, output=args.output)
@@ -0,0 +1,72 @@
+"""
+Laporan memory DataFrame hasil process_data_flexible: dtype ringkas pipeline
+(category, float32/int32 jika tanpa perubahan nilai) vs dtype lama
+(object/float64, hasil restore_dtypes) untuk satu batch ~500 ribu baris.
+
+Ukuran dihitung dengan memory_usage(deep=True) per kolom, ditambah ukuran
+pickle (data yang dikirim worker process pool ke proses utama). Dashboard dari
+kedua bentuk harus identik.
+
+Jalankan: python -m benchmarks.bench_dtypes [jumlah_baris] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import pickle
+import time
+
+from app import calculate_dashboard_metrics, preprocess_sheet, process_data_flexible, restore_dtypes
+from benchmarks.report import add_output_argument, write_report
+from benchmarks.synthetic import make_wide_sheet
+
+DEFAULT_ROWS = 500_000
+MB = 1e6
+
+
+def _quiet(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+def run(n_rows, output=None):
+    n_businesses = math.ceil(n_rows / 12)
+    start = time.perf_counter()
+    compact = _quiet(process_data_flexible, _quiet(preprocess_sheet, make_wide_sheet(n_businesses)))
+    pipeline_seconds = time.perf_counter() - start
+    print(f"{n_businesses} usaha, {len(compact)} baris (pipeline {pipeline_seconds:.1f} s)")
+
+    before = restore_dtypes(compact)
+    if _quiet(calculate_dashboard_metrics, compact) != _quiet(calculate_dashboard_metrics, before):
+        raise AssertionError("Dashboard berbeda antara dtype ringkas dan dtype lama")
+
+    before_usage = before.memory_usage(index=False, deep=True)
+    after_usage = compact.memory_usage(index=False, deep=True)
+
+    print(f"{'kolom':<20} {'dtype lama':<15} {'dtype baru':<15} {'lama (MB)':>10} {'baru (MB)':>10}")
+    for col in compact.columns:
+        print(f"{col:<20} {str(before[col].dtype):<15} {str(compact[col].dtype):<15} "
+              f"{before_usage[col] / MB:>10.1f} {after_usage[col] / MB:>10.1f}")
+    print(f"{'total':<52} {before_usage.sum() / MB:>10.1f} {after_usage.sum() / MB:>10.1f}")
+
+    before_pickle = len(pickle.dumps(before, protocol=pickle.HIGHEST_PROTOCOL))
+    after_pickle = len(pickle.dumps(compact, protocol=pickle.HIGHEST_PROTOCOL))
+    print(f"{'pickle':<52} {before_pickle / MB:>10.1f} {after_pickle / MB:>10.1f}")
+
+    results = [
+        {'size': len(compact), 'stage': 'pipeline', 'seconds': pipeline_seconds},
+        {'size': len(compact), 'stage': 'dtype_lama', 'memory_mb': before_usage.sum() / MB,
+         'pickle_mb': before_pickle / MB},
+        {'size': len(compact), 'stage': 'dtype_ringkas', 'memory_mb': after_usage.sum() / MB,
+         'pickle_mb': after_pickle / MB},
+    ]
+    return write_report(output, 'bench_dtypes', results, rows=n_rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('rows', nargs='?', type=int, default=DEFAULT_ROWS, help='jumlah baris riwayat')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.rows, output=args.output)
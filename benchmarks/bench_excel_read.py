@@ -0,0 +1,88 @@
+"""
+Benchmark preprocess_excel: mode 'pandas' (pd.read_excel) vs 'stream'
+(openpyxl read-only, potongan iter_excel_chunks digabung), plus 'chunks':
+potongan iter_excel_chunks dikonsumsi satu per satu tanpa disimpan, seperti
+jalur upload mode stream (process + COPY per potongan).
+
+Workbook sintetis ditulis ke file sementara, lalu setiap mode diukur waktu dan
+peak memory (tracemalloc, run terpisah). Kolom "overhead" = peak dikurangi memory
+yang masih dipakai frame output, yaitu memory sementara selama membaca sheet.
+Peak mode 'chunks' harus tetap kecil berapapun jumlah usaha.
+Output mode 'pandas' dan 'stream' dicek harus identik.
+
+Jalankan: python -m benchmarks.bench_excel_read [jumlah_usaha ...] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from app import iter_excel_chunks, preprocess_excel
+from benchmarks.report import add_output_argument, write_report
+from benchmarks.synthetic import write_workbook
+
+DEFAULT_SIZES = [1_000, 5_000, 20_000]
+MODES = ['pandas', 'stream', 'chunks']
+
+
+def _read(path, mode):
+    if mode != 'chunks':
+        return preprocess_excel(path, mode=mode)
+    rows = 0
+    for chunk in iter_excel_chunks(path):
+        rows += len(chunk)
+    return rows
+
+
+def _measure(path, mode):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_long = _read(path, mode)
+    elapsed = time.perf_counter() - start
+
+    # tracemalloc memperlambat eksekusi, jadi memory diukur di run terpisah
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        retained = _read(path, mode)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del retained
+
+    return df_long, elapsed, peak, peak - current
+
+
+def run(sizes, output=None):
+    report = []
+    print(f"{'usaha':>10} {'file (MB)':>10} {'mode':>8} {'waktu (s)':>10} {'peak (MB)':>10} {'overhead (MB)':>14}")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n_businesses in sizes:
+            path = write_workbook(os.path.join(tmpdir, f"pajak_{n_businesses}.xlsx"), n_businesses)
+            file_mb = os.path.getsize(path) / 1e6
+
+            results = {}
+            for mode in MODES:
+                df_long, elapsed, peak, overhead = _measure(path, mode)
+                results[mode] = df_long
+                report.append({'size': n_businesses, 'stage': mode, 'file_mb': file_mb, 'seconds': elapsed,
+                               'peak_mb': peak / 1e6, 'overhead_mb': overhead / 1e6})
+                print(f"{n_businesses:>10} {file_mb:>10.1f} {mode:>8} {elapsed:>10.3f} {peak / 1e6:>10.1f} {overhead / 1e6:>14.1f}")
+
+            pd.testing.assert_frame_equal(results['pandas'], results['stream'])
+            assert results['chunks'] == len(results['pandas'])
+
+    return write_report(output, 'bench_excel_read', report, sizes=sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah usaha')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, output=args.output)
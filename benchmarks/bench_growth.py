@@ -0,0 +1,122 @@
+"""
+Benchmark perhitungan growth per usaha.
+
+Membandingkan loop lama (filter DataFrame per nopd + tulis per sel) dengan
+calculate_growth_vectorized, sekaligus memastikan hasil keduanya identik.
+
+Jalankan: python -m benchmarks.bench_growth [jumlah_usaha ...] [--output hasil.json]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import calculate_growth_vectorized
+from benchmarks.report import add_output_argument, write_report
+
+# Loop lama sangat lambat (kuadratik), jadi hanya dijalankan sampai ukuran ini
+LEGACY_MAX_BUSINESSES = 5_000
+DEFAULT_SIZES = [1_000, 5_000, 20_000, 50_000, 100_000, 200_000]
+
+
+def make_processed_frame(n_businesses, n_months=12, seed=17):
+    """
+    Buat DataFrame berbentuk output tahap status di process_data_flexible
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = n_businesses * n_months
+
+    pajak = rng.lognormal(mean=13, sigma=1, size=n_rows).round(0)
+    # Sekitar 20% sel kosong / tidak bayar
+    pajak[rng.random(n_rows) < 0.2] = np.nan
+
+    df = pd.DataFrame({
+        'nopd': np.repeat([f"NOPD{i:07d}" for i in range(n_businesses)], n_months),
+        'bulan_iso': np.tile([f"2025-{m:02d}" for m in range(1, n_months + 1)], n_businesses),
+        'jumlah_pajak_dibayar': pajak,
+    })
+    df['status'] = np.where(df['jumlah_pajak_dibayar'] > 0, 'VALID', 'TIDAK VALID')
+
+    # Acak urutan baris agar sort benar-benar diuji
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def legacy_growth(df_processed):
+    """
+    Salinan loop growth lama dari process_data_flexible (sebagai pembanding)
+    """
+    df_processed = df_processed.copy()
+    df_processed['growth'] = pd.NA
+
+    for nopd in df_processed['nopd'].unique():
+        usaha_data = df_processed[df_processed['nopd'] == nopd].copy()
+
+        if 'bulan_iso' in usaha_data.columns:
+            usaha_data = usaha_data.sort_values('bulan_iso')
+        else:
+            usaha_data = usaha_data.sort_values('bulan')
+
+        valid_data = usaha_data[usaha_data['status'] == 'VALID'].copy()
+
+        if len(valid_data) >= 2:
+            prev_pajak = None
+
+            for idx, row in valid_data.iterrows():
+                if prev_pajak is None:
+                    df_processed.loc[idx, 'growth'] = pd.NA
+                else:
+                    cur_pajak = row['jumlah_pajak_dibayar']
+
+                    if prev_pajak == 0:
+                        growth = 1.0 if cur_pajak > 0 else 0.0
+                    else:
+                        growth = (cur_pajak - prev_pajak) / prev_pajak
+
+                    growth = min(max(growth, -1.0), 10.0)
+                    df_processed.loc[idx, 'growth'] = growth
+
+                prev_pajak = row['jumlah_pajak_dibayar']
+
+    return df_processed['growth']
+
+
+def run(sizes, output=None):
+    results = []
+    print(f"{'usaha':>10} {'baris':>10} {'legacy (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+
+    for n_businesses in sizes:
+        df = make_processed_frame(n_businesses)
+
+        start = time.perf_counter()
+        growth = calculate_growth_vectorized(df)
+        vectorized_time = time.perf_counter() - start
+
+        legacy_time = None
+        if n_businesses <= LEGACY_MAX_BUSINESSES:
+            start = time.perf_counter()
+            expected = legacy_growth(df)
+            legacy_time = time.perf_counter() - start
+
+            expected = pd.to_numeric(expected, errors='coerce')
+            if not np.allclose(expected, growth, equal_nan=True, rtol=0, atol=0):
+                raise AssertionError(f"Hasil growth berbeda untuk {n_businesses} usaha")
+
+        results.append({'size': n_businesses, 'stage': 'vectorized', 'rows': len(df), 'seconds': vectorized_time})
+        if legacy_time is not None:
+            results.append({'size': n_businesses, 'stage': 'legacy', 'rows': len(df), 'seconds': legacy_time})
+
+        legacy_str = f"{legacy_time:.3f}" if legacy_time is not None else '-'
+        speedup_str = f"{legacy_time / vectorized_time:.0f}x" if legacy_time is not None else '-'
+        print(f"{n_businesses:>10} {len(df):>10} {legacy_str:>12} {vectorized_time:>15.3f} {speedup_str:>9}")
+
+    return write_report(output, 'bench_growth', results, sizes=sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah usaha')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, output=args.output)
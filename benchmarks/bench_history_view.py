@@ -0,0 +1,103 @@
+"""
+Benchmark halaman riwayat: jalur lama (fetch Decimal/date, lalu validasi +
+clean_text_data + to_numeric + to_datetime ulang) vs fetch bertipe (float64 /
+datetime64 langsung dari cursor, batch ditandai prevalidated).
+
+Batch dibuat dari workbook sintetis lewat pipeline upload lalu disimpan ke
+database. Dashboard dan format tampilan kedua jalur harus sama (jumlah float
+boleh beda di digit terakhir karena dihitung per potongan). Waktu jalur baru
+diukur sebagai request GET /riwayat/<batch_id> penuh dengan cache kosong.
+
+Jalankan: python -m benchmarks.bench_history_view [jumlah_usaha ...] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import time
+
+import db
+from app import (app, calculate_dashboard_metrics, get_display_columns, prepare_display_data,
+                 prepare_history_data, preprocess_sheet, process_data_flexible)
+from benchmarks.pgcluster import local_postgres
+from benchmarks.report import add_output_argument, write_report
+from benchmarks.synthetic import make_wide_sheet
+from cache import history_cache
+
+DEFAULT_SIZES = [1_000, 10_000, 41_667]
+
+
+def _quiet(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def legacy_view(batch_id):
+    """Jalur lama (referensi): fetch mentah satu DataFrame lalu dibersihkan ulang"""
+    df_validated = prepare_history_data(db.fetch_by_batch_flexible(batch_id, typed=False))
+    return df_validated, calculate_dashboard_metrics(df_validated)
+
+
+def _close(expected, got):
+    if isinstance(expected, dict):
+        return list(expected) == list(got) and all(_close(expected[k], got[k]) for k in expected)
+    if isinstance(expected, list):
+        return len(expected) == len(got) and all(_close(a, b) for a, b in zip(expected, got))
+    if isinstance(expected, float):
+        return math.isclose(expected, got, rel_tol=1e-12)
+    return expected == got
+
+
+def check_parity(batch_id, legacy_frame, legacy_dashboard):
+    typed_frame = prepare_history_data(db.fetch_by_batch_flexible(batch_id))
+    if not _close(legacy_dashboard, calculate_dashboard_metrics(typed_frame)):
+        raise AssertionError("Dashboard berbeda antara fetch lama dan fetch bertipe")
+
+    expected = prepare_display_data(legacy_frame)
+    got = prepare_display_data(typed_frame)
+    for col in get_display_columns(expected) + ['bulan_iso']:
+        if not expected[col].astype(object).equals(got[col].astype(object)):
+            raise AssertionError(f"Format tampilan kolom {col} berbeda")
+
+
+def run(sizes, output=None):
+    client = app.test_client()
+    results = []
+    print(f"{'usaha':>10} {'baris':>10} {'lama (s)':>10} {'request baru (s)':>17} {'speedup':>8}")
+
+    with local_postgres():
+        for n_businesses in sizes:
+            df = _quiet(process_data_flexible, _quiet(preprocess_sheet, make_wide_sheet(n_businesses)))
+            batch_id = _quiet(db.insert_history_flexible, df, f"riwayat_{n_businesses}.xlsx")
+            try:
+                start = time.perf_counter()
+                legacy_frame, legacy_dashboard = _quiet(legacy_view, batch_id)
+                legacy_time = time.perf_counter() - start
+
+                history_cache.clear()
+                start = time.perf_counter()
+                response = _quiet(client.get, f"/riwayat/{batch_id}")
+                request_time = time.perf_counter() - start
+                if response.status_code != 200:
+                    raise RuntimeError(f"GET /riwayat/{batch_id} gagal: {response.status_code}")
+
+                _quiet(check_parity, batch_id, legacy_frame, legacy_dashboard)
+                results += [
+                    {'size': n_businesses, 'stage': 'legacy', 'rows': len(df), 'seconds': legacy_time},
+                    {'size': n_businesses, 'stage': 'request', 'rows': len(df), 'seconds': request_time},
+                ]
+                print(f"{n_businesses:>10} {len(df):>10} {legacy_time:>10.3f} {request_time:>17.3f} "
+                      f"{legacy_time / request_time:>7.1f}x")
+            finally:
+                _quiet(db.delete_batch, batch_id)
+
+    return write_report(output, 'bench_history_view', results, sizes=sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah usaha')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, output=args.output)
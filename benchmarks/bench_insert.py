@@ -0,0 +1,86 @@
+"""
+Benchmark insert_history_flexible: mode 'row' (INSERT per baris) vs 'copy'.
+
+Membutuhkan PostgreSQL sesuai DB_PARAMS di db.py (gunakan database uji, bukan
+produksi). Batch hasil benchmark dihapus kembali setelah diukur.
+
+Jalankan: python -m benchmarks.bench_insert [jumlah_baris ...] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+import db
+from benchmarks.report import add_output_argument, write_report
+
+DEFAULT_SIZES = [10_000, 100_000]
+# Jalur per baris sangat lambat, jadi hanya dijalankan sampai ukuran ini
+ROW_MODE_MAX_ROWS = 100_000
+
+
+def make_history_frame(n_rows, seed=17):
+    """
+    Buat DataFrame berbentuk output process_data_flexible
+    """
+    rng = np.random.default_rng(seed)
+    n_months = 12
+    n_businesses = max(n_rows // n_months, 1)
+
+    pajak = rng.lognormal(mean=13, sigma=1, size=n_rows).round(0)
+    pajak[rng.random(n_rows) < 0.2] = np.nan
+    paid = ~np.isnan(pajak)
+    months = np.tile(np.arange(1, n_months + 1), n_businesses + 1)[:n_rows]
+
+    return pd.DataFrame({
+        'nopd': np.repeat([f"3201.{i:07d}" for i in range(n_businesses + 1)], n_months)[:n_rows],
+        'nama_usaha': np.repeat([f"USAHA {i}" for i in range(n_businesses + 1)], n_months)[:n_rows],
+        'bulan': np.array(['januari', 'februari', 'maret', 'april', 'mei', 'juni', 'juli',
+                           'agustus', 'september', 'oktober', 'november', 'desember'])[months - 1],
+        'omset_perbulan': pajak * 10,
+        'jumlah_pajak_dibayar': pajak,
+        'tanggal_pembayaran': pd.to_datetime(
+            pd.Series([f"2025-{m:02d}-15" for m in months])
+        ).where(paid),
+        'status': np.where(paid, 'VALID', 'TIDAK VALID'),
+        'growth': np.where(paid, rng.normal(0, 0.2, size=n_rows), np.nan),
+        'kondisi': np.where(paid, 'NORMAL', 'TIDAK TAAT PAJAK'),
+    })
+
+
+def run(sizes, output=None):
+    db.create_table_if_not_exists()
+    results = []
+    print(f"{'baris':>10} {'mode':>6} {'waktu (s)':>10} {'baris/detik':>12}")
+
+    for n_rows in sizes:
+        df = make_history_frame(n_rows)
+
+        for mode in ['row', 'copy']:
+            if mode == 'row' and n_rows > ROW_MODE_MAX_ROWS:
+                continue
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                batch_id = db.insert_history_flexible(df, f"bench_{n_rows}.xlsx", mode=mode)
+            elapsed = time.perf_counter() - start
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                db.delete_batch(batch_id)
+
+            results.append({'size': n_rows, 'stage': f"insert_{mode}", 'rows': n_rows, 'seconds': elapsed})
+            print(f"{n_rows:>10} {mode:>6} {elapsed:>10.2f} {n_rows / elapsed:>12.0f}")
+
+    return write_report(output, 'bench_insert', results, sizes=sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah baris')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, output=args.output)
@@ -0,0 +1,95 @@
+"""
+Benchmark ingest multi-sheet: analyse_sheet (preprocess + process_data_flexible)
+untuk setiap sheet, berurutan di satu proses vs paralel di process pool
+dengan 2..N proses (ingest.run_sheets).
+
+Sheet saling independen, jadi speedup idealnya mendekati jumlah proses selama
+jumlah core mencukupi; kolom "core" menunjukkan core yang tersedia. Hasil
+paralel dicek harus identik dengan hasil berurutan.
+
+Jalankan: python -m benchmarks.bench_multisheet [jumlah_sheet] [usaha_per_sheet] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from app import analyse_sheet
+from benchmarks.report import add_output_argument, write_report
+from benchmarks.synthetic import write_multisheet_workbook
+from ingest import INGEST_START_METHOD, list_sheet_sources, run_sheets
+
+DEFAULT_SHEETS = 4
+DEFAULT_BUSINESSES = 5_000
+
+
+def _quiet():
+    # Sembunyikan print DEBUG dari proses worker
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _run(sources, processes):
+    if processes == 1:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run_sheets(analyse_sheet, sources, parallel=False)
+        return results, time.perf_counter() - start
+
+    context = multiprocessing.get_context(INGEST_START_METHOD)
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=_quiet) as pool:
+        # Pemanasan: start proses worker + import app tidak ikut diukur
+        list(pool.map(abs, range(processes)))
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run_sheets(analyse_sheet, sources, executor=pool)
+        return results, time.perf_counter() - start
+
+
+def run(n_sheets, n_businesses, output=None):
+    report = []
+    cores = os.cpu_count() or 1
+    process_counts = sorted({1, 2, min(n_sheets, max(cores, 2))})
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = write_multisheet_workbook(os.path.join(tmpdir, 'multi.xlsx'), n_sheets, n_businesses)
+        with contextlib.redirect_stdout(io.StringIO()):
+            sources = list_sheet_sources(path, 'multi.xlsx', tmpdir)
+
+        print(f"{n_sheets} sheet x {n_businesses} usaha, {cores} core")
+        print(f"{'proses':>8} {'waktu (s)':>10} {'speedup':>8}")
+
+        baseline = None
+        for processes in process_counts:
+            results, elapsed = _run(sources, processes)
+            errors = [error for _, _, error in results if error is not None]
+            if errors:
+                raise errors[0]
+
+            frames = [result[0] for _, result, _ in results]
+            if baseline is None:
+                baseline = (frames, elapsed)
+            else:
+                for expected, actual in zip(baseline[0], frames):
+                    pd.testing.assert_frame_equal(expected, actual)
+
+            report.append({'size': n_sheets * n_businesses, 'stage': f"proses_{processes}", 'seconds': elapsed})
+            print(f"{processes:>8} {elapsed:>10.3f} {baseline[1] / elapsed:>8.2f}")
+
+    return write_report(output, 'bench_multisheet', report, sheets=n_sheets, businesses=n_businesses, cores=cores)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sheets', nargs='?', type=int, default=DEFAULT_SHEETS, help='jumlah sheet')
+    parser.add_argument('businesses', nargs='?', type=int, default=DEFAULT_BUSINESSES, help='jumlah usaha per sheet')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sheets, args.businesses, output=args.output)
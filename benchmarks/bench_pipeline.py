@@ -0,0 +1,140 @@
+"""
+Benchmark semua tahap pipeline upload + riwayat pada workbook sintetis:
+preprocess_excel, process_data_flexible, calculate_dashboard_metrics,
+prepare_display_data, insert_history_flexible, fetch_by_batch_flexible.
+
+Setiap tahap diukur waktunya (minimum dari --repeat run) dan peak memory
+tambahannya (tracemalloc, run terpisah karena tracemalloc memperlambat).
+Tahap database memakai PostgreSQL lokal (lihat benchmarks/pgcluster.py);
+batch hasil benchmark dihapus kembali. Hasil ditulis sebagai JSON agar bisa
+dibandingkan antar commit dengan benchmarks.compare.
+
+Jalankan: python -m benchmarks.bench_pipeline [jumlah_usaha ...] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import db
+from app import (calculate_dashboard_metrics, prepare_display_data,
+                 preprocess_excel, process_data_flexible)
+from benchmarks.pgcluster import local_postgres
+from benchmarks.report import add_output_argument, write_report
+from benchmarks.synthetic import write_workbook
+
+DEFAULT_SIZES = [1_000, 10_000]
+STAGES = ['preprocess_excel', 'process_data_flexible', 'calculate_dashboard_metrics',
+          'prepare_display_data', 'insert_history_flexible', 'fetch_by_batch_flexible']
+DB_STAGES = {'insert_history_flexible', 'fetch_by_batch_flexible'}
+
+
+def _stage_calls(path, with_db):
+    """
+    Urutan tahap sebagai (nama, fungsi(state) -> hasil). state menyimpan
+    output tahap sebelumnya; batch_id yang dibuat dicatat agar bisa dihapus.
+    """
+    calls = [
+        ('preprocess_excel', lambda state: preprocess_excel(path)),
+        ('process_data_flexible', lambda state: process_data_flexible(state['preprocess_excel'])),
+        ('calculate_dashboard_metrics', lambda state: calculate_dashboard_metrics(state['process_data_flexible'])),
+        ('prepare_display_data', lambda state: prepare_display_data(state['process_data_flexible'])),
+    ]
+    if with_db:
+        calls += [
+            ('insert_history_flexible', lambda state: insert_history_flexible_tracked(state)),
+            ('fetch_by_batch_flexible', lambda state: db.fetch_by_batch_flexible(state['insert_history_flexible'])),
+        ]
+    return calls
+
+
+def insert_history_flexible_tracked(state):
+    batch_id = db.insert_history_flexible(
+        state['process_data_flexible'], 'benchmark.xlsx',
+        metrics=state['calculate_dashboard_metrics']
+    )
+    state.setdefault('batch_ids', []).append(batch_id)
+    return batch_id
+
+
+def _rows(result):
+    return len(result) if isinstance(result, pd.DataFrame) else None
+
+
+def _run_pipeline(path, with_db, trace_memory):
+    """Jalankan semua tahap sekali. Return: {stage: (detik, peak tambahan bytes, baris)}"""
+    state = {}
+    measured = {}
+    try:
+        for name, call in _stage_calls(path, with_db):
+            if trace_memory:
+                tracemalloc.start()
+                base = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                state[name] = call(state)
+            elapsed = time.perf_counter() - start
+            peak = None
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                tracemalloc.stop()
+            measured[name] = (elapsed, peak, _rows(state[name]))
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for batch_id in state.get('batch_ids', []):
+                db.delete_batch(batch_id)
+    return measured
+
+
+def run_size(path, n_businesses, with_db, repeat):
+    timings = [_run_pipeline(path, with_db, trace_memory=False) for _ in range(repeat)]
+    memory = _run_pipeline(path, with_db, trace_memory=True)
+
+    results = []
+    for stage in timings[0]:
+        seconds = [run[stage][0] for run in timings]
+        results.append({
+            'size': n_businesses,
+            'n_businesses': n_businesses,
+            'stage': stage,
+            'rows': timings[0][stage][2],
+            'seconds': min(seconds),
+            'seconds_median': float(np.median(seconds)),
+            'peak_mb': memory[stage][1] / 1e6,
+        })
+    return results
+
+
+def run(sizes, repeat=3, with_db=True, output=None):
+    print(f"{'usaha':>10} {'tahap':<28} {'baris':>9} {'waktu (s)':>10} {'peak (MB)':>10}")
+
+    with contextlib.ExitStack() as stack:
+        server_version = stack.enter_context(local_postgres()) if with_db else None
+        tmpdir = stack.enter_context(tempfile.TemporaryDirectory())
+
+        results = []
+        for n_businesses in sizes:
+            path = write_workbook(os.path.join(tmpdir, f"pajak_{n_businesses}.xlsx"), n_businesses)
+            for row in run_size(path, n_businesses, with_db, repeat):
+                results.append(row)
+                rows = '' if row['rows'] is None else row['rows']
+                print(f"{n_businesses:>10} {row['stage']:<28} {rows:>9} {row['seconds']:>10.3f} {row['peak_mb']:>10.1f}")
+
+    return write_report(output, 'bench_pipeline', results, sizes=sizes, repeat=repeat, postgres=server_version)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah usaha per workbook')
+    parser.add_argument('--repeat', type=int, default=3, help='jumlah run untuk pengukuran waktu')
+    add_output_argument(parser)
+    parser.add_argument('--no-db', action='store_true', help='lewati tahap database')
+    args = parser.parse_args()
+    run(args.sizes, repeat=args.repeat, with_db=not args.no_db, output=args.output)
@@ -0,0 +1,55 @@
+"""
+Benchmark preprocess_sheet (complete matrix usaha × bulan).
+
+Mengukur waktu dan peak memory (tracemalloc) dibandingkan ukuran frame output.
+Pembacaan Excel tidak ikut diukur; sheet sintetis dibuat langsung sebagai DataFrame.
+
+Jalankan: python -m benchmarks.bench_preprocess [jumlah_usaha ...] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import time
+import tracemalloc
+
+from app import preprocess_sheet
+from benchmarks.report import add_output_argument, write_report
+from benchmarks.synthetic import make_wide_sheet
+
+DEFAULT_SIZES = [1_000, 10_000, 50_000]
+
+
+def run(sizes, output=None):
+    results = []
+    print(f"{'usaha':>10} {'baris':>10} {'waktu (s)':>10} {'peak (MB)':>10} {'output (MB)':>12}")
+
+    for n_businesses in sizes:
+        sheet = make_wide_sheet(n_businesses)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            df_long = preprocess_sheet(sheet)
+        elapsed = time.perf_counter() - start
+
+        # tracemalloc memperlambat eksekusi, jadi memory diukur di run terpisah
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            preprocess_sheet(sheet)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        output_mb = df_long.memory_usage(deep=True).sum() / 1e6
+        results.append({'size': n_businesses, 'stage': 'preprocess_sheet', 'rows': len(df_long),
+                        'seconds': elapsed, 'peak_mb': peak / 1e6, 'memory_mb': output_mb})
+        print(f"{n_businesses:>10} {len(df_long):>10} {elapsed:>10.3f} {peak / 1e6:>10.1f} {output_mb:>12.1f}")
+
+    return write_report(output, 'bench_preprocess', results, sizes=sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah usaha')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, output=args.output)
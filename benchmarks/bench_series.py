@@ -0,0 +1,106 @@
+"""
+Benchmark endpoint seri usaha: GET /api/usaha/<id_usaha>/series untuk usaha
+acak setelah beberapa tahun workbook sintetis (satu batch per tahun) disimpan.
+
+Seri dibaca dari tabel seri_usaha lewat range scan primary key
+(id_usaha, periode_bulan), jadi waktunya tidak bergantung pada jumlah batch
+maupun jumlah usaha. Growth Januari setiap tahun harus dihitung dari Desember
+tahun sebelumnya.
+
+Jalankan: python -m benchmarks.bench_series [jumlah_usaha ...] [--output hasil.json]
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import time
+
+import db
+from app import app, calculate_dashboard_metrics, preprocess_sheet, process_data_flexible, recompute_series
+from benchmarks.pgcluster import local_postgres
+from benchmarks.report import add_output_argument, write_report
+from benchmarks.synthetic import make_wide_sheet
+
+DEFAULT_SIZES = [1_000, 10_000]
+YEARS = [2023, 2024, 2025]
+REQUESTS = 200
+
+
+def _quiet(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def upload_year(n_businesses, tahun):
+    """Upload biasa satu workbook setahun (seri_usaha ikut diperbarui)"""
+    sheet = make_wide_sheet(n_businesses, tahun=tahun, seed=tahun)
+    df = process_data_flexible(preprocess_sheet(sheet))
+    return db.insert_history_flexible(df, f"pajak_{tahun}.xlsx", metrics=calculate_dashboard_metrics(df),
+                                      recompute=recompute_series)
+
+
+def check_year_boundary(series):
+    """Growth Januari = pajak Januari / pajak Desember tahun sebelumnya - 1 (keduanya VALID, di-clamp)"""
+    by_period = {row['periode']: row for row in series}
+    for tahun in YEARS[1:]:
+        january, december = by_period.get(f"{tahun}-01"), by_period.get(f"{tahun - 1}-12")
+        if not (january and december and january['status'] == december['status'] == 'VALID' and december['pajak']):
+            continue
+        expected = min(max(january['pajak'] / december['pajak'] - 1, -1.0), 10.0)
+        if abs(january['growth'] - expected) > 1e-9:
+            raise AssertionError(f"Growth {tahun}-01 tidak dihitung dari {tahun - 1}-12")
+
+
+def run(sizes, output=None):
+    client = app.test_client()
+    results = []
+    print(f"{'usaha':>10} {'tahun':>6} {'baris seri':>11} {'upload (s)':>11} {'median (ms)':>12} {'p95 (ms)':>9}")
+
+    with local_postgres():
+        for n_businesses in sizes:
+            batch_ids = []
+            try:
+                start = time.perf_counter()
+                for tahun in YEARS:
+                    batch_ids.append(_quiet(upload_year, n_businesses, tahun))
+                upload_time = time.perf_counter() - start
+
+                # NOPD sintetis '3201.xxx.yyy' tersimpan sebagai '3201xxxyyy'
+                ids = [f"{3201000000 + i}" for i in random.Random(0).sample(range(n_businesses), 50)]
+                durations = []
+                series_rows = 0
+                for i in range(REQUESTS):
+                    start = time.perf_counter()
+                    response = _quiet(client.get, f"/api/usaha/{ids[i % len(ids)]}/series")
+                    durations.append(time.perf_counter() - start)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"Seri {ids[i % len(ids)]} gagal: {response.status_code}")
+                    series = response.get_json()['series']
+                    series_rows = len(series)
+                    check_year_boundary(series)
+
+                durations.sort()
+                results += [
+                    {'size': n_businesses, 'stage': 'upload', 'rows': series_rows, 'seconds': upload_time},
+                    {'size': n_businesses, 'stage': 'series_median', 'rows': series_rows,
+                     'seconds': statistics.median(durations)},
+                    {'size': n_businesses, 'stage': 'series_p95', 'rows': series_rows,
+                     'seconds': durations[int(len(durations) * 0.95)]},
+                ]
+                print(f"{n_businesses:>10} {len(YEARS):>6} {series_rows:>11} {upload_time:>11.3f} "
+                      f"{statistics.median(durations) * 1000:>12.2f} {durations[int(len(durations) * 0.95)] * 1000:>9.2f}")
+            finally:
+                for batch_id in batch_ids:
+                    _quiet(db.delete_batch, batch_id)
+
+    return write_report(output, 'bench_series', results, sizes=sizes, years=YEARS)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES, help='jumlah usaha')
+    add_output_argument(parser)
+    args = parser.parse_args()
+    run(args.sizes, output=args.output)
@@ -0,0 +1,76 @@
+"""
+Bandingkan dua file JSON hasil benchmark (--output), mis. dari dua commit.
+
+Metrik (waktu, peak memory, memory frame) yang naik lebih dari --threshold
+(relatif) dan lebih dari batas noise absolut ditandai REGRESI; exit code 1 jika
+ada regresi, sehingga bisa dipakai di CI. Format file: lihat benchmarks/report.py.
+
+Jalankan: python -m benchmarks.compare base.json baru.json [--threshold 0.1]
+"""
+
+import argparse
+import json
+import sys
+
+# Metrik yang dibandingkan dan batas noise absolutnya (perubahan di bawah
+# batas ini dianggap noise pengukuran)
+METRICS = {
+    'seconds': 0.01,
+    'peak_mb': 1.0,
+    'memory_mb': 1.0,
+}
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report['metadata'], {(row['size'], row['stage']): row for row in report['results']}
+
+
+def _ratio(base, new):
+    return new / base if base else float('inf') if new else 1.0
+
+
+def compare(base_path, new_path, threshold=0.1):
+    """Cetak tabel perbandingan. Return: list (size, stage, metrik) yang regresi"""
+    base_meta, base = load(base_path)
+    new_meta, new = load(new_path)
+    if base_meta.get('benchmark') != new_meta.get('benchmark'):
+        print(f"PERINGATAN: benchmark berbeda ({base_meta.get('benchmark')} vs {new_meta.get('benchmark')})")
+    print(f"base: {base_meta.get('commit')} ({base_meta.get('created_at')})")
+    print(f"baru: {new_meta.get('commit')} ({new_meta.get('created_at')})")
+    print(f"{'ukuran':>10} {'tahap':<28} {'metrik':<10} {'base':>11} {'baru':>11} {'rasio':>6}")
+
+    regressions = []
+    # Urutan baris mengikuti file base (ukuran lalu urutan tahap)
+    for key in [key for key in base if key in new]:
+        old_row, new_row = base[key], new[key]
+        for metric, min_delta in METRICS.items():
+            old_value, new_value = old_row.get(metric), new_row.get(metric)
+            if old_value is None or new_value is None:
+                continue
+            ratio = _ratio(old_value, new_value)
+            regressed = ratio > 1 + threshold and new_value - old_value > min_delta
+            if regressed:
+                regressions.append((*key, metric))
+
+            mark = '  REGRESI' if regressed else ''
+            print(f"{key[0]:>10} {key[1]:<28} {metric:<10} {old_value:>11.3f} {new_value:>11.3f} {ratio:>6.2f}{mark}")
+
+    for key in [key for key in base if key not in new] + [key for key in new if key not in base]:
+        print(f"{key[0]:>10} {key[1]:<28} hanya ada di {'base' if key in base else 'baru'}")
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.1, help='kenaikan relatif yang dianggap regresi')
+    args = parser.parse_args()
+
+    regressions = compare(args.base, args.new, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regresi di atas {args.threshold:.0%}")
+        sys.exit(1)
@@ -0,0 +1,101 @@
+"""
+PostgreSQL untuk benchmark tahap database.
+
+Default: cluster sementara dibuat dengan initdb + pg_ctl (dari PATH atau folder
+PG_BIN), dijalankan lewat unix socket di folder sementara, lalu dihentikan dan
+dihapus setelah benchmark. initdb tidak bisa dijalankan sebagai root.
+
+BENCH_PG=existing: pakai server yang sudah jalan sesuai DB_PARAMS di db.py
+(atur lewat DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD). Gunakan database
+uji, bukan produksi.
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+import psycopg2
+
+import db
+
+BENCH_PG = os.environ.get('BENCH_PG', 'local')
+PG_BIN = os.environ.get('PG_BIN')
+
+
+def _pg_command(name):
+    if PG_BIN:
+        return os.path.join(PG_BIN, name)
+    path = shutil.which(name)
+    if path is None:
+        raise RuntimeError(
+            f"{name} tidak ditemukan; tambahkan bin PostgreSQL ke PATH, isi PG_BIN, "
+            f"atau gunakan BENCH_PG=existing"
+        )
+    return path
+
+
+def _server_version():
+    with contextlib.closing(db.get_connection()) as conn:
+        return conn.server_version
+
+
+def _create_tables():
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.create_table_if_not_exists()
+
+
+@contextlib.contextmanager
+def local_postgres():
+    """
+    Siapkan PostgreSQL untuk benchmark dan arahkan db.DB_PARAMS ke sana.
+    Yield: versi server (mis. 160004)
+    """
+    if BENCH_PG == 'existing':
+        _create_tables()
+        yield _server_version()
+        return
+
+    if hasattr(os, 'geteuid') and os.geteuid() == 0:
+        raise RuntimeError("initdb tidak bisa dijalankan sebagai root; gunakan BENCH_PG=existing")
+
+    workdir = tempfile.mkdtemp(prefix='bench_pg_')
+    datadir = os.path.join(workdir, 'data')
+    original_params = dict(db.DB_PARAMS)
+    started = False
+    try:
+        subprocess.run(
+            [_pg_command('initdb'), '-D', datadir, '-U', 'postgres', '-A', 'trust',
+             '-E', 'UTF8', '--no-sync'],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        # Tanpa TCP (listen_addresses kosong), hanya unix socket di workdir;
+        # fsync=off karena data benchmark tidak perlu tahan crash
+        subprocess.run(
+            [_pg_command('pg_ctl'), '-D', datadir, '-l', os.path.join(workdir, 'server.log'),
+             '-o', f"-k {workdir} -c listen_addresses='' -c fsync=off", '-w', 'start'],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        started = True
+
+        admin = psycopg2.connect(dbname='postgres', user='postgres', host=workdir)
+        admin.autocommit = True
+        with contextlib.closing(admin):
+            admin.cursor().execute("CREATE DATABASE tren_pajak")
+
+        db.close_pool()
+        db.DB_PARAMS.update(dbname='tren_pajak', user='postgres', password='', host=workdir, port='5432')
+        _create_tables()
+        yield _server_version()
+    finally:
+        db.close_pool()
+        db.DB_PARAMS.clear()
+        db.DB_PARAMS.update(original_params)
+        if started:
+            subprocess.run(
+                [_pg_command('pg_ctl'), '-D', datadir, '-m', 'fast', '-w', 'stop'],
+                stdout=subprocess.DEVNULL
+            )
+        shutil.rmtree(workdir, ignore_errors=True)
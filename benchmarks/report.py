@@ -0,0 +1,59 @@
+"""
+Hasil benchmark sebagai JSON agar bisa dibandingkan antar commit dengan
+benchmarks.compare.
+
+Format: {"metadata": {...}, "results": [baris, ...]}. Setiap baris punya
+'size' (ukuran input benchmark tsb, mis. jumlah usaha atau jumlah baris),
+'stage' (tahap / varian yang diukur) dan metrik yang dibandingkan compare
+('seconds', 'peak_mb', 'memory_mb'; yang tidak diukur boleh tidak ada),
+ditambah kolom informasi lain sesuai benchmark.
+"""
+
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(benchmark, **extra):
+    """Commit, waktu, dan lingkungan run; extra = parameter benchmark (sizes, repeat, ...)"""
+    return {
+        'benchmark': benchmark,
+        'commit': _git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        **extra,
+    }
+
+
+def add_output_argument(parser):
+    parser.add_argument('--output', '-o', help='file JSON hasil benchmark (untuk benchmarks.compare)')
+
+
+def write_report(output, benchmark, results, **extra):
+    """Tulis hasil ke file JSON jika output diberikan. Return: dict report"""
+    report = {'metadata': metadata(benchmark, **extra), 'results': results}
+    if output:
+        with open(output, 'w') as f:
+            # Skalar numpy (np.int64 dst.) ditulis sebagai angka biasa
+            json.dump(report, f, indent=2, default=lambda value: value.item())
+        print(f"Hasil ditulis ke {output}")
+    return report
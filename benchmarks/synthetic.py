@@ -0,0 +1,82 @@
+"""
+Generator data pajak sintetis dengan layout yang sama seperti file Excel
+yang dibaca preprocess_excel: baris header kolom identitas + "PEMBAYARAN TAHUN",
+lalu satu baris berisi nama bulan, lalu satu baris per usaha.
+"""
+
+import numpy as np
+import pandas as pd
+
+MONTH_HEADERS = ['JANUARI', 'FEBRUARI', 'MARET', 'APRIL', 'MEI', 'JUNI',
+                 'JULI', 'AGUSTUS', 'SEPTEMBER', 'OKTOBER', 'NOVEMBER', 'DESEMBER']
+
+JENIS_PAJAK = ['PAJAK RESTORAN', 'PAJAK HOTEL', 'PAJAK HIBURAN', 'PAJAK PARKIR', 'PAJAK REKLAME']
+
+
+def make_wide_sheet(n_businesses, n_months=12, seed=17, tahun=2025,
+                    gap_ratio=0.15, anomaly_ratio=0.03):
+    """
+    Buat DataFrame persis seperti hasil pd.read_excel pada workbook pajak:
+    kolom identitas, kolom "PEMBAYARAN TAHUN <tahun>" + "Unnamed: i" untuk bulan,
+    dan baris pertama berisi nama bulan.
+    """
+    rng = np.random.default_rng(seed)
+
+    identity = {
+        'JENIS PAJAK USAHA': rng.choice(JENIS_PAJAK, size=n_businesses),
+        'NPWPD': [f"P.2.{i:07d}.01.01" for i in range(n_businesses)],
+        'NOPD': [f"3201.{i // 1000:03d}.{i % 1000:03d}" for i in range(n_businesses)],
+        'NAMA USAHA': [f"USAHA {JENIS_PAJAK[i % len(JENIS_PAJAK)].split()[-1]} {i}" for i in range(n_businesses)],
+    }
+
+    # Pajak dasar per usaha dengan sedikit variasi bulanan
+    base = rng.lognormal(mean=13, sigma=1, size=(n_businesses, 1))
+    pajak = (base * rng.normal(1.0, 0.08, size=(n_businesses, n_months))).round(0)
+
+    # Lonjakan/penurunan ekstrem (anomali)
+    anomalies = rng.random((n_businesses, n_months)) < anomaly_ratio
+    pajak[anomalies] *= rng.choice([0.2, 3.0], size=anomalies.sum())
+
+    # Bulan tanpa pembayaran (gap) dan usaha yang baru mulai bayar di tengah tahun
+    pajak[rng.random((n_businesses, n_months)) < gap_ratio] = np.nan
+    late_start = rng.integers(0, n_months, size=n_businesses)
+    late_mask = rng.random(n_businesses) < 0.1
+    for month in range(n_months):
+        pajak[late_mask & (late_start > month), month] = np.nan
+
+    month_columns = [f"PEMBAYARAN TAHUN {tahun}"] + [
+        f"Unnamed: {len(identity) + i}" for i in range(1, n_months)
+    ]
+
+    header_row = {col: np.nan for col in identity}
+    header_row.update(dict(zip(month_columns, MONTH_HEADERS[:n_months])))
+
+    data = pd.DataFrame(identity)
+    for i, col in enumerate(month_columns):
+        data[col] = pajak[:, i]
+
+    header = pd.DataFrame([header_row], columns=list(identity) + month_columns)
+    return pd.concat([header, data], ignore_index=True)
+
+
+def write_workbook(path, n_businesses, **kwargs):
+    """
+    Tulis sheet sintetis ke file .xlsx (membutuhkan openpyxl)
+    """
+    df = make_wide_sheet(n_businesses, **kwargs)
+    # Nama kolom "Unnamed: i" ditulis sebagai sel kosong seperti file aslinya
+    columns = [None if str(col).startswith('Unnamed') else col for col in df.columns]
+    df.to_excel(path, index=False, header=columns)
+    return path
+
+
+def write_multisheet_workbook(path, n_sheets, n_businesses, seed=17, **kwargs):
+    """
+    Tulis workbook dengan n_sheets sheet sintetis (seed berbeda per sheet)
+    """
+    with pd.ExcelWriter(path) as writer:
+        for i in range(n_sheets):
+            df = make_wide_sheet(n_businesses, seed=seed + i, **kwargs)
+            columns = [None if str(col).startswith('Unnamed') else col for col in df.columns]
+            df.to_excel(writer, sheet_name=f"Sheet{i + 1}", index=False, header=columns)
+    return path
@@ -0,0 +1,106 @@
+# cache.py
+
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Batas ukuran cache hasil olahan riwayat (MB, bisa diubah lewat environment variable)
+HISTORY_CACHE_MAX_MB = float(os.environ.get('HISTORY_CACHE_MAX_MB', '256'))
+
+def estimate_size(value):
+    """Perkiraan ukuran objek di memori (bytes)"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+class LRUCache:
+    """
+    Cache LRU thread-safe dengan batas total ukuran (bytes).
+    Key berupa tuple dengan batch_id di posisi pertama agar satu batch
+    bisa di-invalidate sekaligus. Nilai yang disimpan dianggap read-only.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                # Lebih besar dari seluruh cache - tidak disimpan
+                return False
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+            return True
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        return entry is not None
+
+    def invalidate(self, batch_id):
+        """Hapus semua entri milik satu batch"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == batch_id]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += removed
+            return removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+# Cache global per proses untuk tampilan riwayat (dashboard + halaman baris)
+history_cache = LRUCache(max_bytes=HISTORY_CACHE_MAX_MB * 1024 * 1024)
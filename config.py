@@ -1,5 +1,28 @@
 # config.py
 
+# Tahun default untuk data bulan tanpa tahun (sesuai "PEMBAYARAN TAHUN 2025")
+DEFAULT_TAHUN = 2025
+
+MONTH_NAMES = ['januari', 'februari', 'maret', 'april', 'mei', 'juni',
+               'juli', 'agustus', 'september', 'oktober', 'november', 'desember']
+
+# Lookup nama/singkatan bulan -> nomor bulan
+MONTH_NUMBER_LOOKUP = {
+    'januari': 1, 'jan': 1,
+    'februari': 2, 'feb': 2,
+    'maret': 3, 'mar': 3,
+    'april': 4, 'apr': 4,
+    'mei': 5, 'may': 5,
+    'juni': 6, 'jun': 6,
+    'juli': 7, 'jul': 7,
+    'agustus': 8, 'agu': 8, 'aug': 8,
+    'september': 9, 'sep': 9,
+    'oktober': 10, 'okt': 10, 'oct': 10,
+    'november': 11, 'nov': 11,
+    'desember': 12, 'des': 12, 'dec': 12
+}
+
+
 class DataAttributeConfig:
     """
     Konfigurasi fleksibel untuk atribut data pajak
@@ -66,9 +89,14 @@ class DataAttributeConfig:
             'description': 'Status pembayaran (VALID/TIDAK VALID)'
         },
         'kondisi': {
-            'calculation': 'detect_condition',  # Fungsi terpisah
+            'calculation': 'classify_kondisi',  # Fungsi terpisah
             'type': 'string', 
             'description': 'Kondisi pembayaran (NORMAL/ANOMALI/TIDAK TAAT PAJAK)'
+        },
+        'skor_anomali': {
+            'calculation': 'anomaly_scores',  # anomaly.py, detektor dipilih per upload
+            'type': 'numeric',
+            'description': 'Skor anomali bertanda; ANOMALI jika |skor| >= threshold detektor'
         }
     }
     
@@ -93,7 +121,8 @@ class DataAttributeConfig:
         'jumlah_pajak_dibayar': 'JUMLAH PAJAK DIBAYAR',
         'tanggal_pembayaran': 'TANGGAL PEMBAYARAN',
         'status': 'STATUS',
-        'kondisi': 'KONDISI'
+        'kondisi': 'KONDISI',
+        'skor_anomali': 'SKOR ANOMALI'
     }
 
 
@@ -1,72 +1,609 @@
 # db.py
 
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+import psycopg2.pool
+import hashlib
+import io
+import logging
 import os
+import re
+import threading
+import time
 import uuid
+import numpy as np
 import pandas as pd
+from contextlib import contextmanager
+from psycopg2 import sql
+from psycopg2.extras import Json
 from datetime import datetime
+from anomaly import SERIES_DETECTOR, get_detector
+from config import DEFAULT_TAHUN, MONTH_NUMBER_LOOKUP
+from metrics import timed_query
+from trend import recompute_series
 
+logger = logging.getLogger(__name__)
+
+# Bisa diganti lewat environment variable (mis. database uji / benchmark)
 DB_PARAMS = {
-    'dbname': 'tren_pajak',
-    'user': 'postgres',
-    'password': 'Bismillah17',
-    'host': 'localhost',
-    'port': '5432'
+    'dbname': os.environ.get('DB_NAME', 'tren_pajak'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', 'Bismillah17'),
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'port': os.environ.get('DB_PORT', '5432')
 }
 
+# Pengaturan connection pool (bisa diubah lewat environment variable)
+POOL_MIN_CONN = int(os.environ.get('DB_POOL_MIN', '1'))
+POOL_MAX_CONN = int(os.environ.get('DB_POOL_MAX', '10'))
+# Lama menunggu koneksi bebas saat pool penuh (detik)
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))
+# Koneksi yang menganggur lebih lama dari ini dicek dulu dengan SELECT 1 (detik)
+POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+
 def get_connection():
+    """Buka koneksi baru langsung (tanpa pool)"""
     return psycopg2.connect(**DB_PARAMS)
 
-def insert_history_flexible(df, filename):
+class PoolTimeout(psycopg2.pool.PoolError):
+    """Tidak ada koneksi bebas sampai batas POOL_TIMEOUT"""
+
+class ConnectionPool:
+    """
+    Connection pool thread-safe dengan antrean tunggu, cek liveness,
+    dan counter untuk checkout, waktu tunggu, dan pool penuh
+    """
+    
+    def __init__(self, minconn=POOL_MIN_CONN, maxconn=POOL_MAX_CONN,
+                 timeout=POOL_TIMEOUT, ping_after=POOL_PING_AFTER):
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.pid = os.getpid()
+        
+        self._cond = threading.Condition()
+        self._idle = []  # list of (conn, waktu terakhir dikembalikan)
+        self._size = 0   # jumlah koneksi terbuka (idle + dipakai)
+        
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.exhausted = 0
+        self.discarded = 0
+        
+        for _ in range(self.minconn):
+            self._idle.append((get_connection(), time.monotonic()))
+            self._size += 1
+    
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        counted_exhausted = False
+        
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.maxconn:
+                    if not counted_exhausted:
+                        self.exhausted += 1
+                        counted_exhausted = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"Tidak ada koneksi database bebas setelah {self.timeout} detik "
+                            f"(DB_POOL_MAX={self.maxconn})"
+                        )
+                    self._cond.wait(remaining)
+                
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    conn, last_used = None, None
+                    self._size += 1
+            
+            if conn is None:
+                try:
+                    conn = get_connection()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_alive(conn, last_used):
+                self._discard(conn)
+                continue
+            
+            waited = time.monotonic() - start
+            with self._cond:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            return conn
+    
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                # Pastikan koneksi kembali ke pool tanpa transaksi menggantung
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+        
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+    
+    def _is_alive(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+    
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self.discarded += 1
+            self._cond.notify()
+    
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _ in idle:
+            conn.close()
+    
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max': self.maxconn,
+                'checkouts': self.checkouts,
+                'wait_seconds_total': self.wait_seconds_total,
+                'wait_seconds_max': self.wait_seconds_max,
+                'exhausted': self.exhausted,
+                'discarded': self.discarded,
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Pool global per proses (dibuat ulang setelah fork)"""
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool()
+    return _pool
+
+def get_pool_stats(create=True):
+    """Statistik pool; create=False mengembalikan None jika pool belum dibuat"""
+    if not create and (_pool is None or _pool.pid != os.getpid()):
+        return None
+    return get_pool().stats()
+
+def close_pool():
+    """Tutup koneksi idle dan buang pool global (mis. setelah DB_PARAMS diganti)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+@contextmanager
+def db_connection():
+    """
+    Pinjam koneksi dari pool; otomatis dikembalikan (dan di-rollback jika
+    masih ada transaksi terbuka). Koneksi yang rusak dibuang dari pool.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    discard = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        discard = True
+        raise
+    finally:
+        pool.putconn(conn, discard=discard)
+
+# Definisikan kolom yang akan disimpan ke database
+DB_COLUMN_MAPPING = {
+    'nopd': 'id_usaha',
+    'nama_usaha': 'nama_usaha',
+    'bulan': 'bulan',
+    'omset_perbulan': 'omset_perbulan',
+    'jumlah_pajak_dibayar': 'jumlah_pajak_dibayar',
+    'tanggal_pembayaran': 'tanggal_pembayaran',
+    'status': 'status',
+    'growth': 'growth',
+    'kondisi': 'kondisi',
+    'skor_anomali': 'skor_anomali'
+}
+
+# Mapping nama kolom database ke nama kolom config (kebalikan DB_COLUMN_MAPPING)
+DB_TO_CONFIG_MAPPING = {db_col: config_col for config_col, db_col in DB_COLUMN_MAPPING.items()}
+
+def _rename_db_columns(df):
+    """Rename kolom hasil query sesuai config (id_usaha -> nopd, dst.)"""
+    return df.rename(columns={
+        db_col: config_col for db_col, config_col in DB_TO_CONFIG_MAPPING.items()
+        if db_col in df.columns and db_col != config_col
+    })
+
+DATE_COLUMNS = ['tanggal_pembayaran']
+NUMERIC_COLUMNS = ['omset_perbulan', 'jumlah_pajak_dibayar', 'growth', 'skor_anomali']
+EMPTY_MARKERS = ['', '-', 'nan', 'None']
+
+# Fetch bertipe: NUMERIC langsung jadi float (bukan Decimal per sel) dan DATE
+# tetap string ISO dari server, lalu diparse sekali per kolom jadi datetime64.
+# Memakai typecaster bawaan psycopg2 (C), bukan fungsi Python per sel
+TYPED_NUMERIC = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, 'TYPED_NUMERIC', psycopg2.extensions.FLOAT
+)
+TYPED_DATE = psycopg2.extensions.new_type(
+    psycopg2.extensions.DATE.values, 'TYPED_DATE', psycopg2.extensions.UNICODE
+)
+
+def _register_typed_casters(cursor):
+    """Typecaster fetch bertipe, hanya untuk cursor ini"""
+    psycopg2.extensions.register_type(TYPED_NUMERIC, cursor)
+    psycopg2.extensions.register_type(TYPED_DATE, cursor)
+
+def _typed_frame(rows, column_names):
+    """
+    DataFrame dari cursor bertipe: angka float64, tanggal datetime64, kolom
+    sesuai config. Data di riwayat sudah dibersihkan sebelum disimpan, jadi
+    ditandai attrs['prevalidated'] agar prepare_history_data tidak
+    membersihkan ulang.
+    """
+    df = _rename_db_columns(pd.DataFrame(rows, columns=column_names))
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('float64')
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format='%Y-%m-%d', errors='coerce')
+    df.attrs['prevalidated'] = True
+    return df
+
+# Jumlah baris per potongan buffer COPY
+COPY_CHUNK_SIZE = 50000
+
+# Periode bertipe DATE (tanggal 1 bulan tsb), diisi saat insert dari bulan_iso / bulan.
+# Dipakai untuk urutan fetch per batch lewat index (batch_id, id_usaha, periode_bulan)
+PERIODE_COLUMN = 'periode_bulan'
+ISO_MONTH_REGEX = re.compile(r'^(\d{4})-(\d{2})$')
+
+def _periode_from_month(value):
+    """'2025-03' / 'maret' -> '2025-03-01'; None jika bulan tidak dikenali"""
+    text = str(value).strip()
+    match = ISO_MONTH_REGEX.match(text)
+    if match:
+        return f"{text}-01" if 1 <= int(match.group(2)) <= 12 else None
+    number = MONTH_NUMBER_LOOKUP.get(text.lower())
+    return f"{DEFAULT_TAHUN}-{number:02d}-01" if number else None
+
+def _as_object(series):
+    """Kolom category dari pipeline analisis -> object (batas database)"""
+    return series.astype(object) if isinstance(series.dtype, pd.CategoricalDtype) else series
+
+def _periode_values(df):
+    """
+    Nilai periode_bulan per baris (string YYYY-MM-01 atau None).
+    Sumber: bulan_iso, fallback ke bulan; dikonversi sekali per nilai unik.
+    """
+    if 'bulan_iso' in df.columns and 'bulan' in df.columns:
+        source = _as_object(df['bulan_iso']).where(df['bulan_iso'].notna(), _as_object(df['bulan']))
+    elif 'bulan_iso' in df.columns:
+        source = df['bulan_iso']
+    elif 'bulan' in df.columns:
+        source = df['bulan']
+    else:
+        return np.full(len(df), None, dtype=object)
+    
+    codes, uniques = pd.factorize(source)
+    # Kode -1 (NaN) menunjuk ke elemen terakhir (None)
+    lookup = np.array([_periode_from_month(value) for value in uniques] + [None], dtype=object)
+    return lookup[codes]
+
+ADD_RIWAYAT_PERIODE_QUERY = f"ALTER TABLE riwayat ADD COLUMN IF NOT EXISTS {PERIODE_COLUMN} DATE;"
+
+# Migrasi: isi periode_bulan untuk baris lama (bulan ISO atau nama bulan)
+BACKFILL_PERIODE_QUERIES = [
+    f"""
+    UPDATE riwayat SET {PERIODE_COLUMN} = to_date(trim(bulan) || '-01', 'YYYY-MM-DD')
+    WHERE {PERIODE_COLUMN} IS NULL AND trim(bulan) ~ '^\\d{{4}}-(0[1-9]|1[0-2])$'
+    """,
+    f"""
+    UPDATE riwayat r SET {PERIODE_COLUMN} = make_date({DEFAULT_TAHUN}, m.nomor, 1)
+    FROM (VALUES {', '.join(f"('{name}', {number})" for name, number in MONTH_NUMBER_LOOKUP.items())}) AS m(nama, nomor)
+    WHERE r.{PERIODE_COLUMN} IS NULL AND lower(trim(r.bulan)) = m.nama
+    """,
+]
+
+# Katalog batch: satu baris per upload, dibaca oleh halaman Riwayat
+CREATE_BATCHES_QUERY = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    uploaded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    row_count INTEGER NOT NULL DEFAULT 0,
+    business_count INTEGER NOT NULL DEFAULT 0,
+    persentase_patuh NUMERIC,
+    total_omset NUMERIC,
+    jumlah_anomali INTEGER,
+    jumlah_normal INTEGER,
+    detektor TEXT,
+    jumlah_kondisi INTEGER
+);
+"""
+
+# Jumlah baris NORMAL dipakai untuk update persentase_patuh secara inkremental
+# saat append; NULL untuk batch lama (dihitung ulang penuh sekali saat append pertama)
+ADD_BATCHES_NORMAL_QUERY = "ALTER TABLE batches ADD COLUMN IF NOT EXISTS jumlah_normal INTEGER;"
+
+# Jumlah baris yang punya kondisi (penyebut persentase_patuh), sama seperti jumlah_normal
+ADD_BATCHES_KONDISI_QUERY = "ALTER TABLE batches ADD COLUMN IF NOT EXISTS jumlah_kondisi INTEGER;"
+
+# Detektor anomali yang dipakai saat upload (anomaly.DETECTORS), dipakai lagi saat append.
+# NULL untuk batch lama (detektor default)
+ADD_BATCHES_DETECTOR_QUERY = "ALTER TABLE batches ADD COLUMN IF NOT EXISTS detektor TEXT;"
+
+CREATE_BATCHES_INDEX_QUERY = "CREATE INDEX IF NOT EXISTS idx_batches_uploaded_at ON batches(uploaded_at DESC);"
+
+# Migrasi: isi katalog dari batch lama yang sudah ada di riwayat
+BACKFILL_BATCHES_QUERY = """
+INSERT INTO batches (
+    batch_id, filename, uploaded_at, row_count, business_count,
+    persentase_patuh, total_omset, jumlah_anomali
+)
+SELECT
+    r.batch_id,
+    MIN(r.filename),
+    MIN(r.timestamp),
+    COUNT(*),
+    COUNT(DISTINCT r.id_usaha),
+    ROUND(100.0 * COUNT(*) FILTER (WHERE upper(trim(r.kondisi)) = 'NORMAL') / NULLIF(COUNT(r.kondisi), 0)),
+    COALESCE(SUM(r.omset_perbulan), 0),
+    COUNT(*) FILTER (WHERE upper(trim(r.kondisi)) = 'ANOMALI')
+FROM riwayat r
+WHERE NOT EXISTS (SELECT 1 FROM batches b WHERE b.batch_id = r.batch_id)
+GROUP BY r.batch_id
+ON CONFLICT (batch_id) DO NOTHING
+"""
+
+# Status job upload (jobs.py) agar /api/jobs/<id> bisa dijawab proses mana pun
+CREATE_JOBS_QUERY = """
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    job_id TEXT PRIMARY KEY,
+    status JSONB NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+def _business_count(df, metrics=None):
+    """Jumlah usaha untuk katalog batch: NOPD unik, atau total_usaha dari metrics"""
+    if 'nopd' in df.columns:
+        return int(df['nopd'].nunique())
+    return int((metrics or {}).get('total_usaha', 0))
+
+def _record_batch(cursor, batch_id, filename, business_count, row_count, metrics=None, detector=None):
+    """
+    Tulis baris katalog batch di transaksi yang sama dengan insert riwayat
+    business_count: jumlah usaha (_business_count)
+    metrics: hasil calculate_dashboard_metrics (opsional)
+    detector: nama detektor anomali yang dipakai (opsional)
+    """
+    metrics = metrics or {}
+    
+    total_omset = metrics.get('total_omset')
+    status_counts = metrics.get('status_counts')
+    cursor.execute("""
+        INSERT INTO batches (
+            batch_id, filename, uploaded_at, row_count, business_count,
+            persentase_patuh, total_omset, jumlah_anomali, jumlah_normal, detektor, jumlah_kondisi
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (batch_id) DO UPDATE SET
+            row_count = EXCLUDED.row_count,
+            business_count = EXCLUDED.business_count,
+            persentase_patuh = EXCLUDED.persentase_patuh,
+            total_omset = EXCLUDED.total_omset,
+            jumlah_anomali = EXCLUDED.jumlah_anomali,
+            jumlah_normal = EXCLUDED.jumlah_normal,
+            detektor = EXCLUDED.detektor,
+            jumlah_kondisi = EXCLUDED.jumlah_kondisi
+    """, (
+        batch_id, filename, datetime.now(), int(row_count), business_count,
+        metrics.get('persentase_patuh'),
+        float(total_omset) if total_omset is not None else None,
+        metrics.get('jumlah_anomali'),
+        status_counts.get('NORMAL', 0) if status_counts else None,
+        detector,
+        sum(status_counts.values()) if status_counts else None,
+    ))
+
+@timed_query('insert_history')
+def insert_history_flexible(df, filename, mode='copy', metrics=None, progress=None, recompute=None,
+                            detector=None):
     """
     FIXED: Insert data ke database dengan penanganan tipe data yang benar
+    mode='copy' : konversi per kolom + COPY FROM STDIN (bulk, default)
+    mode='row'  : INSERT per baris (jalur lama, fallback)
+    metrics     : hasil calculate_dashboard_metrics, disimpan di katalog batches
+    progress    : callback(jumlah_baris_tersimpan), dipanggil per potongan COPY
+    recompute   : callback growth/kondisi untuk seri_usaha, dengan SERIES_DETECTOR (lihat _sync_series)
+    detector    : nama detektor anomali, dicatat di katalog batches
     """
-    conn = get_connection()
-    cursor = conn.cursor()
     batch_id = str(uuid.uuid4())
     
-    print(f"DEBUG INSERT: Processing {len(df)} rows for batch_id: {batch_id}")
-    print(f"DEBUG INSERT: Input columns: {list(df.columns)}")
-    
-    # Definisikan kolom yang akan disimpan ke database
-    db_column_mapping = {
-        'nopd': 'id_usaha',
-        'nama_usaha': 'nama_usaha',
-        'bulan': 'bulan',
-        'omset_perbulan': 'omset_perbulan',
-        'jumlah_pajak_dibayar': 'jumlah_pajak_dibayar',
-        'tanggal_pembayaran': 'tanggal_pembayaran',
-        'status': 'status',
-        'growth': 'growth',
-        'kondisi': 'kondisi'
-    }
+    logger.debug("INSERT: Processing %s rows for batch_id: %s (mode=%s)", len(df), batch_id, mode)
+    logger.debug("INSERT: Input columns: %s", list(df.columns))
     
     # Buat list kolom yang tersedia dari DataFrame
     available_data_columns = []
     available_db_columns = []
     
-    for config_col, db_col in db_column_mapping.items():
+    for config_col, db_col in DB_COLUMN_MAPPING.items():
         if config_col in df.columns:
             available_data_columns.append(config_col)
             available_db_columns.append(db_col)
     
-    print(f"DEBUG INSERT: Saving columns to DB: {available_db_columns}")
+    logger.debug("INSERT: Saving columns to DB: %s", available_db_columns)
+    
+    success_count = 0
+    error_count = 0
+    
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            # Tabel partisi: data ditulis ke tabel batch sendiri lalu di-ATTACH
+            partitioned = _riwayat_kind(cursor) == 'p'
+            table = _create_batch_table(cursor, batch_id) if partitioned else 'riwayat'
+            
+            if mode == 'copy':
+                try:
+                    success_count, error_count = _copy_history_rows(
+                        cursor, df, filename, batch_id, available_data_columns, available_db_columns,
+                        progress, table
+                    )
+                except psycopg2.DatabaseError as e:
+                    # COPY gagal di sisi database - ulangi dengan jalur per baris
+                    logger.error("Error in COPY ingest, falling back to row inserts: %s", e)
+                    conn.rollback()
+                    mode = 'row'
+                    if partitioned:
+                        table = _create_batch_table(cursor, batch_id)
+            
+            if mode == 'row':
+                success_count, error_count = _insert_history_rows(
+                    cursor, df, filename, batch_id, available_data_columns, available_db_columns, table
+                )
+            
+            if partitioned:
+                _attach_batch_table(cursor, table, batch_id)
+            _record_batch(cursor, batch_id, filename, _business_count(df, metrics), success_count, metrics, detector)
+            if _has_series(cursor):
+                _sync_series(cursor, batch_id, recompute)
+            conn.commit()
+            if progress:
+                progress(success_count)
+        finally:
+            cursor.close()
+    
+    logger.debug("INSERT: Successfully inserted %s rows, %s errors", success_count, error_count)
+    logger.debug("INSERT: Batch ID: %s", batch_id)
+    
+    return batch_id
+
+@timed_query('insert_history')
+def insert_history_chunks(chunks, filename, metrics=None, progress=None, recompute=None, detector=None):
+    """
+    Insert satu batch dari potongan DataFrame (mis. generator upload mode stream)
+    tanpa menggabungkannya: setiap potongan langsung di-COPY lalu dilepas.
+    Semua potongan masuk dalam satu transaksi. Tidak ada fallback per baris
+    karena potongan yang sudah lewat tidak bisa dibaca ulang.
+    metrics     : dict, atau callable tanpa argumen (mis. DashboardAccumulator.result)
+                  yang dipanggil setelah semua potongan habis
+    progress    : callback(jumlah_baris_tersimpan), dipanggil per potongan COPY
+    recompute / detector: sama dengan insert_history_flexible
+    """
+    batch_id = str(uuid.uuid4())
+    timestamp = datetime.now()
+    
+    logger.debug("INSERT: Processing chunks for batch_id: %s", batch_id)
     
+    success_count = 0
+    error_count = 0
+    
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            partitioned = _riwayat_kind(cursor) == 'p'
+            table = _create_batch_table(cursor, batch_id) if partitioned else 'riwayat'
+            has_nopd = False
+            
+            for df in chunks:
+                available_data_columns = [col for col in DB_COLUMN_MAPPING if col in df.columns]
+                available_db_columns = [DB_COLUMN_MAPPING[col] for col in available_data_columns]
+                has_nopd = has_nopd or 'nopd' in df.columns
+                
+                chunk_progress = None
+                if progress:
+                    chunk_progress = lambda rows, offset=success_count: progress(offset + rows)
+                rows, errors = _copy_history_rows(
+                    cursor, df, filename, batch_id, available_data_columns, available_db_columns,
+                    chunk_progress, table, timestamp
+                )
+                success_count += rows
+                error_count += errors
+            
+            if callable(metrics):
+                metrics = metrics()
+            if has_nopd:
+                # NOPD unik dihitung di tabel batch, bukan dari potongan yang sudah dilepas
+                cursor.execute(f'SELECT COUNT(DISTINCT id_usaha) FROM "{table}" WHERE batch_id = %s', (batch_id,))
+                business_count = cursor.fetchone()[0]
+            else:
+                business_count = int((metrics or {}).get('total_usaha', 0))
+            
+            if partitioned:
+                _attach_batch_table(cursor, table, batch_id)
+            _record_batch(cursor, batch_id, filename, business_count, success_count, metrics, detector)
+            if _has_series(cursor):
+                _sync_series(cursor, batch_id, recompute)
+            conn.commit()
+            if progress:
+                progress(success_count)
+        finally:
+            cursor.close()
+    
+    logger.debug("INSERT: Successfully inserted %s rows, %s errors", success_count, error_count)
+    logger.debug("INSERT: Batch ID: %s", batch_id)
+    
+    return batch_id
+
+def _insert_history_rows(cursor, df, filename, batch_id, available_data_columns, available_db_columns,
+                         table='riwayat'):
+    """
+    Jalur lama: konversi tipe per sel dan satu INSERT per baris
+    table: tabel tujuan (tabel batch sebelum di-ATTACH, atau riwayat)
+    """
     # Build dynamic INSERT query
     placeholders = ', '.join(['%s'] * len(available_db_columns))
     columns_str = ', '.join(available_db_columns)
     
     insert_query = f"""
-        INSERT INTO riwayat ({columns_str}, filename, batch_id, timestamp)
-        VALUES ({placeholders}, %s, %s, %s)
+        INSERT INTO "{table}" ({columns_str}, {PERIODE_COLUMN}, filename, batch_id, timestamp)
+        VALUES ({placeholders}, %s, %s, %s, %s)
     """
     
-    print(f"DEBUG INSERT: Query: {insert_query}")
+    logger.debug("INSERT: Query: %s", insert_query)
 
     success_count = 0
     error_count = 0
+    periodes = _periode_values(df)
     
-    for index, row in df.iterrows():
+    for position, (index, row) in enumerate(df.iterrows()):
         try:
             # Prepare values untuk kolom yang tersedia
             values = []
@@ -112,244 +649,1388 @@ def insert_history_flexible(df, filename):
                     else:
                         values.append(str(raw_value).strip())
             
-            # Tambahkan filename, batch_id, timestamp
-            values.extend([filename, batch_id, datetime.now()])
+            # Tambahkan periode, filename, batch_id, timestamp
+            values.extend([periodes[position], filename, batch_id, datetime.now()])
             
             cursor.execute(insert_query, values)
             success_count += 1
             
         except Exception as e:
-            print(f"ERROR inserting row {index}: {e}")
-            print(f"Row data: {row.to_dict()}")
-            print(f"Values: {values}")
+            logger.error("Error inserting row %s: %s", index, e)
+            logger.error("Row data: %s", row.to_dict())
+            logger.error("Values: %s", values)
             error_count += 1
             continue
+    
+    return success_count, error_count
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+def _convert_history_columns(df, available_data_columns):
+    """
+    Konversi tipe data per kolom (vectorized) untuk COPY.
+    Nilai yang tidak bisa dikonversi menjadi NULL, sama seperti jalur per baris.
+    Output: (DataFrame siap tulis, mask baris yang punya nilai gagal konversi)
+    """
+    converted = {}
+    failed_rows = np.zeros(len(df), dtype=bool)
     
-    print(f"DEBUG INSERT: Successfully inserted {success_count} rows, {error_count} errors")
-    print(f"DEBUG INSERT: Batch ID: {batch_id}")
+    for config_col in available_data_columns:
+        raw = df[config_col]
+        is_null = raw.isna().to_numpy()
+        
+        if config_col in DATE_COLUMNS:
+            if pd.api.types.is_datetime64_any_dtype(raw):
+                is_empty = is_null
+                parsed = raw
+            else:
+                is_empty = is_null | raw.astype(str).str.strip().isin(EMPTY_MARKERS).to_numpy()
+                parsed = pd.to_datetime(raw.where(~is_empty), errors='coerce')
+            is_missing = parsed.isna().to_numpy()
+            failed_rows |= ~is_empty & is_missing
+            values = parsed.dt.strftime('%Y-%m-%d').to_numpy(dtype=object)
+            values[is_missing] = None
+            
+        elif config_col in NUMERIC_COLUMNS:
+            if pd.api.types.is_numeric_dtype(raw) and not pd.api.types.is_bool_dtype(raw):
+                is_empty = is_null
+                parsed = raw.astype('float64')
+            else:
+                is_empty = is_null | raw.astype(str).str.strip().isin(EMPTY_MARKERS).to_numpy()
+                parsed = pd.to_numeric(raw.where(~is_empty), errors='coerce')
+            failed_rows |= ~is_empty & parsed.isna().to_numpy()
+            values = parsed.to_numpy(dtype='float64')
+            
+        elif isinstance(raw.dtype, pd.CategoricalDtype):
+            # Kolom teks category: strip cukup per kategori, lalu dipetakan lewat kode
+            categories = pd.Series(raw.cat.categories.astype(str)).str.strip()
+            lookup = np.append(categories.to_numpy(dtype=object), None)
+            lookup[np.append(categories.isin(['nan', 'None', '']).to_numpy(), True)] = None
+            values = lookup[raw.cat.codes.to_numpy()]
+            
+        else:
+            # Kolom teks: '-' tetap disimpan, seperti jalur per baris
+            raw_str = raw.astype(str).str.strip()
+            is_empty = is_null | raw_str.isin(['nan', 'None', '']).to_numpy()
+            values = raw_str.to_numpy(dtype=object)
+            values[is_empty] = None
+        
+        converted[DB_COLUMN_MAPPING[config_col]] = values
     
-    return batch_id
+    return pd.DataFrame(converted, index=df.index), failed_rows
 
-def fetch_by_batch_flexible(batch_id):
+def _copy_frame(cursor, table, frame, progress=None):
     """
-    FIXED: Fetch data dari database dengan error handling yang lebih baik
+    COPY FROM STDIN seluruh kolom frame (nama kolom = kolom tabel) lewat
+    buffer CSV in-memory, per potongan COPY_CHUNK_SIZE baris
     """
-    conn = get_connection()
-    cursor = conn.cursor()
+    columns_str = ', '.join(frame.columns)
+    copy_query = f"COPY \"{table}\" ({columns_str}) FROM STDIN WITH (FORMAT csv, NULL '')"
     
-    print(f"DEBUG FETCH: Fetching data for batch_id: {batch_id}")
+    logger.debug("INSERT: Query: %s", copy_query)
     
-    try:
-        # Query dengan SELECT * untuk mengambil semua kolom yang ada
-        cursor.execute("""
-            SELECT id_usaha, nama_usaha, bulan, omset_perbulan, 
-                   jumlah_pajak_dibayar, tanggal_pembayaran, 
-                   status, growth, kondisi 
-            FROM riwayat
-            WHERE batch_id = %s
-            ORDER BY id_usaha, CASE 
-                WHEN bulan ~ '^\\d{4}-\\d{2}$' THEN bulan
-                ELSE '9999-99' 
-            END
-        """, (batch_id,))
-
-        rows = cursor.fetchall()
-        
-        # Get column names from cursor description
-        column_names = [desc[0] for desc in cursor.description]
-        
-        print(f"DEBUG FETCH: Found {len(rows)} rows with columns: {column_names}")
-        
-    except Exception as e:
-        print(f"ERROR in fetch query: {e}")
-        rows = []
-        column_names = []
-    finally:
-        cursor.close()
-        conn.close()
+    for start in range(0, len(frame), COPY_CHUNK_SIZE):
+        buffer = io.StringIO()
+        frame.iloc[start:start + COPY_CHUNK_SIZE].to_csv(buffer, header=False, index=False, na_rep='')
+        buffer.seek(0)
+        cursor.copy_expert(copy_query, buffer)
+        if progress:
+            progress(min(start + COPY_CHUNK_SIZE, len(frame)))
 
-    if not rows:
-        print(f"DEBUG FETCH: No data found for batch_id: {batch_id}")
-        return pd.DataFrame()
+def _copy_history_rows(cursor, df, filename, batch_id, available_data_columns, available_db_columns,
+                       progress=None, table='riwayat', timestamp=None):
+    """
+    Jalur bulk: konversi kolom sekali lalu stream ke tabel tujuan lewat COPY FROM STDIN
+    dari buffer CSV in-memory, per potongan COPY_CHUNK_SIZE baris
+    timestamp: waktu simpan (default sekarang); sama untuk semua potongan satu batch
+    """
+    converted, failed_rows = _convert_history_columns(df, available_data_columns)
+    converted[PERIODE_COLUMN] = _periode_values(df)
+    converted['filename'] = filename
+    converted['batch_id'] = batch_id
+    converted['timestamp'] = (timestamp or datetime.now()).isoformat(sep=' ')
+    
+    _copy_frame(cursor, table, converted, progress)
+    
+    error_count = int(failed_rows.sum())
+    if error_count:
+        logger.warning("INSERT: %s rows had values that could not be converted (stored as NULL)", error_count)
     
-    df = pd.DataFrame(rows, columns=column_names)
-    
-    # FIXED: Mapping database column names ke config names yang benar
-    db_to_config_mapping = {
-        'id_usaha': 'nopd',
-        'nama_usaha': 'nama_usaha',
-        'bulan': 'bulan',
-        'omset_perbulan': 'omset_perbulan',
-        'jumlah_pajak_dibayar': 'jumlah_pajak_dibayar',
-        'tanggal_pembayaran': 'tanggal_pembayaran',
-        'status': 'status',
-        'growth': 'growth',
-        'kondisi': 'kondisi'
+    return len(converted), error_count
+
+# ===== APPEND KE BATCH YANG SUDAH ADA =====
+# Upload bulanan cukup menambah sel (usaha, bulan) yang baru / berubah ke batch
+# lama. Sel dikunci dengan (id_usaha, periode_bulan); sel yang berubah jika
+# pajak atau nama usaha berbeda dari yang tersimpan
+APPEND_CELL_COLUMNS = ['nopd', 'nama_usaha', 'bulan', 'omset_perbulan', 'jumlah_pajak_dibayar',
+                       'tanggal_pembayaran', 'status']
+
+CREATE_APPEND_TABLES_QUERY = """
+CREATE TEMP TABLE append_cells (
+    id_usaha TEXT,
+    nama_usaha TEXT,
+    bulan TEXT,
+    omset_perbulan NUMERIC,
+    jumlah_pajak_dibayar NUMERIC,
+    tanggal_pembayaran DATE,
+    status TEXT,
+    periode_bulan DATE
+) ON COMMIT DROP;
+CREATE TEMP TABLE append_updates (
+    id INTEGER,
+    nama_usaha TEXT,
+    bulan TEXT,
+    omset_perbulan NUMERIC,
+    jumlah_pajak_dibayar NUMERIC,
+    tanggal_pembayaran DATE,
+    status TEXT,
+    growth NUMERIC,
+    kondisi TEXT,
+    skor_anomali NUMERIC
+) ON COMMIT DROP;
+"""
+
+# Sel upload yang belum ada di batch (id NULL) atau nilainya berbeda (id baris lama)
+APPEND_DELTA_QUERY = """
+CREATE TEMP TABLE append_delta ON COMMIT DROP AS
+SELECT r.id, c.id_usaha, c.nama_usaha, c.bulan, c.omset_perbulan, c.jumlah_pajak_dibayar,
+       c.tanggal_pembayaran, c.status, NULL::NUMERIC AS growth, NULL::TEXT AS kondisi,
+       NULL::NUMERIC AS skor_anomali, c.periode_bulan, FALSE AS sebelum
+FROM append_cells c
+LEFT JOIN riwayat r
+       ON r.batch_id = %(batch_id)s AND r.id_usaha = c.id_usaha AND r.periode_bulan = c.periode_bulan
+WHERE r.id IS NULL
+   OR r.jumlah_pajak_dibayar IS DISTINCT FROM c.jumlah_pajak_dibayar
+   OR r.nama_usaha IS DISTINCT FROM c.nama_usaha
+"""
+
+# Baris tersimpan yang growth/kondisi/skor-nya bisa berubah: usaha yang terdampak
+# mulai bulan batas (bulan delta paling awal), ditambah maksimal lookback baris
+# VALID sebelum batas sebagai pembanding (lookback detektor, NULL = semua; lihat
+# anomaly.Detector). Keduanya lewat index (id_usaha, periode_bulan)
+APPEND_CONTEXT_QUERY = """
+WITH bounds AS (
+    SELECT id_usaha, MIN(periode_bulan) AS batas FROM append_delta GROUP BY id_usaha
+)
+SELECT r.id, r.id_usaha, r.nama_usaha, r.bulan, r.omset_perbulan, r.jumlah_pajak_dibayar,
+       r.tanggal_pembayaran, r.status, r.growth, r.kondisi, r.skor_anomali, r.periode_bulan, FALSE AS sebelum
+FROM bounds b
+JOIN riwayat r ON r.batch_id = %(batch_id)s AND r.id_usaha = b.id_usaha AND r.periode_bulan >= b.batas
+UNION ALL
+SELECT p.*, TRUE AS sebelum
+FROM bounds b
+CROSS JOIN LATERAL (
+    SELECT r.id, r.id_usaha, r.nama_usaha, r.bulan, r.omset_perbulan, r.jumlah_pajak_dibayar,
+           r.tanggal_pembayaran, r.status, r.growth, r.kondisi, r.skor_anomali, r.periode_bulan
+    FROM riwayat r
+    WHERE r.batch_id = %(batch_id)s AND r.id_usaha = b.id_usaha
+      AND r.periode_bulan < b.batas AND r.status = 'VALID'
+    ORDER BY r.periode_bulan DESC
+    LIMIT %(lookback)s
+) p
+"""
+
+APPEND_UPDATE_QUERY = """
+UPDATE riwayat r SET
+    nama_usaha = u.nama_usaha,
+    bulan = u.bulan,
+    omset_perbulan = u.omset_perbulan,
+    jumlah_pajak_dibayar = u.jumlah_pajak_dibayar,
+    tanggal_pembayaran = u.tanggal_pembayaran,
+    status = u.status,
+    growth = u.growth,
+    kondisi = u.kondisi,
+    skor_anomali = u.skor_anomali,
+    filename = %(filename)s,
+    timestamp = %(timestamp)s
+FROM append_updates u
+WHERE r.batch_id = %(batch_id)s AND r.id = u.id
+"""
+
+# Usaha di delta yang belum punya baris sama sekali di batch (untuk business_count)
+APPEND_NEW_BUSINESS_QUERY = """
+SELECT COUNT(*)
+FROM (SELECT DISTINCT id_usaha FROM append_delta) d
+WHERE NOT EXISTS (SELECT 1 FROM riwayat r WHERE r.batch_id = %s AND r.id_usaha = d.id_usaha)
+"""
+
+# Agregat katalog sama dengan BACKFILL_BATCHES_QUERY; persentase dibulatkan di
+# Python seperti calculate_dashboard_metrics. Hanya untuk batch yang belum
+# punya jumlah_normal (satu scan penuh, setelah itu katalog diupdate inkremental)
+BATCH_STATS_QUERY = """
+SELECT COUNT(*),
+       COUNT(DISTINCT id_usaha),
+       COUNT(kondisi),
+       COUNT(*) FILTER (WHERE upper(trim(kondisi)) = 'NORMAL'),
+       COALESCE(SUM(omset_perbulan), 0),
+       COUNT(*) FILTER (WHERE upper(trim(kondisi)) = 'ANOMALI')
+FROM riwayat
+WHERE batch_id = %s
+"""
+
+def _update_batch_stats(cursor, batch_id, row_count, business_count, kondisi_count, normal_count,
+                       total_omset, anomali_count):
+    persentase_patuh = round((normal_count / kondisi_count) * 100) if kondisi_count > 0 else 0
+    cursor.execute("""
+        UPDATE batches SET
+            row_count = %s, business_count = %s, persentase_patuh = %s,
+            total_omset = %s, jumlah_anomali = %s, jumlah_normal = %s, jumlah_kondisi = %s
+        WHERE batch_id = %s
+    """, (int(row_count), int(business_count), persentase_patuh, float(total_omset), int(anomali_count),
+          int(normal_count), int(kondisi_count), batch_id))
+
+def _refresh_batch_stats(cursor, batch_id):
+    """Hitung ulang ringkasan katalog batches dari isi batch (satu agregat di database)"""
+    cursor.execute(BATCH_STATS_QUERY, (batch_id,))
+    row_count, business_count, kondisi_count, normal_count, total_omset, anomali_count = cursor.fetchone()
+    _update_batch_stats(cursor, batch_id, row_count, business_count, kondisi_count, normal_count,
+                        total_omset, anomali_count)
+    return row_count
+
+def _kondisi_totals(frame):
+    """(jumlah baris berkondisi, NORMAL, ANOMALI, total omset) sekumpulan baris"""
+    kondisi = frame['kondisi'].astype(object)
+    omset = frame['omset_perbulan'].astype('float64')
+    return (int(kondisi.notna().sum()), int((kondisi == 'NORMAL').sum()), int((kondisi == 'ANOMALI').sum()),
+            float(omset.sum()))
+
+def _fetch_typed(cursor, query, params):
+    """Jalankan query lalu kembalikan DataFrame bertipe (lihat _typed_frame)"""
+    cursor.execute(query, params)
+    column_names = [desc[0] for desc in cursor.description]
+    return _typed_frame(cursor.fetchall(), column_names)
+
+def _recompute_trend(frame, recompute, lookback):
+    """
+    Jalankan recompute (growth + kondisi + skor) pada baris konteks dari
+    database, urut bulan lewat periode_bulan (lintas tahun). Baris pembanding
+    sebelum batas (kolom sebelum) dibuang dari hasil, kecuali lookback None:
+    skor bulan lama detektor seluruh seri bisa ikut berubah
+    """
+    frame['status'] = frame['status'].astype(object)
+    frame['bulan_iso'] = frame[PERIODE_COLUMN].str[:7]
+    frame = recompute(frame)
+    if lookback is None:
+        return frame
+    return frame[~frame['sebelum'].astype(bool)]
+
+TREND_COLUMNS = ['growth', 'skor_anomali']
+
+def _trend_changed(frame, old):
+    """Mask baris frame yang growth, skor_anomali, atau kondisi-nya berbeda dari old (sejajar)"""
+    changed = frame['kondisi'].astype(object).to_numpy() != old['kondisi'].to_numpy()
+    for col in TREND_COLUMNS:
+        changed |= ~np.isclose(
+            frame[col].to_numpy(dtype='float64'), old[col].to_numpy(dtype='float64'),
+            rtol=0, atol=0, equal_nan=True
+        )
+    return changed
+
+def _append_cells(df):
+    """
+    Sel upload dalam representasi database (seperti _copy_history_rows), satu
+    baris per (id_usaha, periode_bulan). Sel tanpa id usaha / bulan yang
+    dikenali tidak punya kunci dan dilewati.
+    Return: (DataFrame sel, jumlah sel yang dilewati)
+    """
+    available_data_columns = [col for col in APPEND_CELL_COLUMNS if col in df.columns]
+    cells, failed_rows = _convert_history_columns(df, available_data_columns)
+    cells[PERIODE_COLUMN] = _periode_values(df)
+    if failed_rows.any():
+        logger.warning("APPEND: %s rows had values that could not be converted (stored as NULL)", int(failed_rows.sum()))
+    
+    has_key = cells['id_usaha'].notna() & cells[PERIODE_COLUMN].notna()
+    skipped = int((~has_key).sum())
+    # Usaha yang muncul dua kali di upload: ambil sel pertama, seperti build_complete_matrix
+    cells = cells[has_key].drop_duplicates(['id_usaha', PERIODE_COLUMN], keep='first')
+    return cells, skipped
+
+@timed_query('append_history')
+def append_history_flexible(batch_id, df, filename, recompute, progress=None, series_recompute=None):
+    """
+    Tambahkan upload ke batch yang sudah ada tanpa menulis ulang seluruh batch.
+    df        : hasil prepare_records (status sudah ada, growth/kondisi belum)
+    recompute : callback(DataFrame) -> DataFrame dengan kolom growth, skor_anomali
+                dan kondisi (trend.recompute_trend, dengan detektor batch)
+    progress  : callback(jumlah_baris_baru_tersimpan)
+    series_recompute : callback yang sama untuk seri_usaha, dengan SERIES_DETECTOR
+                       (bukan detektor batch, lihat _sync_series)
+    
+    Upload dibandingkan dengan isi batch di database; hanya sel baru / berubah
+    yang ditulis, dan growth/kondisi/skor dihitung ulang hanya untuk usaha yang
+    terdampak mulai bulan batasnya (baris lama ditulis hanya jika nilainya
+    berubah). Baris tersimpan yang tidak ada di upload
+    tidak pernah dihapus. Semua langkah dalam satu transaksi.
+    Return: dict jumlah sel baru, baris yang di-update, usaha terdampak, total baris batch
+    """
+    logger.debug("APPEND: Processing %s rows for batch_id: %s", len(df), batch_id)
+    
+    cells, skipped = _append_cells(df)
+    if skipped:
+        logger.warning("APPEND: %s rows without id_usaha/periode skipped", skipped)
+    
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        _register_typed_casters(cursor)
+        try:
+            # Kunci baris katalog: append lain ke batch yang sama menunggu
+            cursor.execute("""
+                SELECT row_count, business_count, total_omset, jumlah_anomali, jumlah_normal, jumlah_kondisi,
+                       detektor
+                FROM batches WHERE batch_id = %s FOR UPDATE
+            """, (batch_id,))
+            catalog = cursor.fetchone()
+            if catalog is None:
+                raise ValueError(f"Batch {batch_id} tidak ditemukan")
+            detector = catalog[-1]
+            lookback = get_detector(detector).lookback
+            
+            cursor.execute(CREATE_APPEND_TABLES_QUERY)
+            _copy_frame(cursor, 'append_cells', cells)
+            cursor.execute(APPEND_DELTA_QUERY, {'batch_id': batch_id})
+            logger.debug("APPEND: %s new/changed cells out of %s", cursor.rowcount, len(cells))
+            
+            delta = _fetch_typed(cursor, "SELECT * FROM append_delta", None)
+            if delta.empty:
+                conn.commit()
+                return {'inserted': 0, 'updated': 0, 'businesses': 0, 'row_count': None}
+            context = _fetch_typed(cursor, APPEND_CONTEXT_QUERY, {'batch_id': batch_id, 'lookback': lookback})
+            cursor.execute(APPEND_NEW_BUSINESS_QUERY, (batch_id,))
+            new_businesses = cursor.fetchone()[0]
+            
+            # Baris tersimpan yang diganti sel delta tidak ikut; sisanya dipakai apa adanya
+            stored = context[~context['id'].isin(delta['id'].dropna())]
+            previous = stored[['id', *TREND_COLUMNS, 'kondisi']].set_index('id')
+            
+            frame = _recompute_trend(pd.concat([stored, delta], ignore_index=True), recompute, lookback)
+            
+            # Baris lama ditulis ulang jika nilainya dari upload atau growth/kondisi berubah
+            is_new = frame['id'].isna()
+            is_delta = frame['id'].isin(delta['id'].dropna())
+            trend_changed = _trend_changed(frame, previous.reindex(frame['id']))
+            to_update = frame[~is_new & (is_delta | trend_changed)]
+            to_insert = frame[is_new].sort_values(['nopd', 'bulan_iso'])
+            
+            available_data_columns = [col for col in DB_COLUMN_MAPPING if col in frame.columns]
+            if len(to_update):
+                updates, _ = _convert_history_columns(to_update, available_data_columns)
+                updates.insert(0, 'id', to_update['id'].astype('int64').to_numpy())
+                _copy_frame(cursor, 'append_updates', updates.drop(columns=['id_usaha']))
+                cursor.execute(APPEND_UPDATE_QUERY, {
+                    'batch_id': batch_id, 'filename': filename, 'timestamp': datetime.now()
+                })
+            
+            if len(to_insert):
+                _copy_history_rows(
+                    cursor, to_insert, filename, batch_id, available_data_columns,
+                    [DB_COLUMN_MAPPING[col] for col in available_data_columns], progress
+                )
+            
+            if _has_series(cursor):
+                written = pd.concat([to_update, to_insert])
+                _sync_series(cursor, batch_id, series_recompute, keys=pd.DataFrame({
+                    'id_usaha': written['nopd'].to_numpy(dtype=object),
+                    PERIODE_COLUMN: (written['bulan_iso'] + '-01').to_numpy(dtype=object),
+                }))
+            
+            row_count, business_count, total_omset, anomali_count, normal_count, kondisi_count, _ = catalog
+            if normal_count is None or kondisi_count is None or total_omset is None:
+                # Batch lama tanpa jumlah_normal / jumlah_kondisi: hitung penuh sekali
+                row_count = _refresh_batch_stats(cursor, batch_id)
+            else:
+                # Katalog diupdate dengan selisih baris yang ditulis saja (lama -> baru)
+                written_kondisi, written_normal, written_anomali, written_omset = _kondisi_totals(
+                    pd.concat([to_update, to_insert])
+                )
+                replaced_kondisi, replaced_normal, replaced_anomali, replaced_omset = _kondisi_totals(
+                    context.set_index('id').loc[to_update['id']]
+                )
+                row_count += len(to_insert)
+                _update_batch_stats(
+                    cursor, batch_id, row_count, business_count + new_businesses,
+                    kondisi_count + written_kondisi - replaced_kondisi,
+                    normal_count + written_normal - replaced_normal,
+                    total_omset + written_omset - replaced_omset,
+                    anomali_count + written_anomali - replaced_anomali
+                )
+            conn.commit()
+        finally:
+            cursor.close()
+    
+    summary = {
+        'inserted': len(to_insert),
+        'updated': len(to_update),
+        'businesses': int(frame['nopd'].nunique()),
+        'row_count': row_count,
     }
+    logger.debug("APPEND: %s", summary)
+    return summary
+
+# ===== SERI WAKTU PER USAHA (LINTAS BATCH DAN TAHUN) =====
+# Satu baris per (id_usaha, periode_bulan) dari semua batch. Sel yang sama di
+# beberapa batch disimpan sekali: sel berisi pembayaran menang dari sel kosong,
+# selebihnya tulisan terakhir yang menang. Growth/kondisi di sini dihitung
+# sepanjang seluruh seri usaha, jadi melewati batas tahun dan batas batch
+SERIES_COLUMNS = ['id_usaha', PERIODE_COLUMN, 'nama_usaha', 'bulan', 'omset_perbulan', 'jumlah_pajak_dibayar',
+                  'tanggal_pembayaran', 'status', 'growth', 'kondisi', 'skor_anomali', 'batch_id', 'updated_at']
+
+# Primary key (id_usaha, periode_bulan) sekaligus index untuk query rentang
+# periode satu usaha; index batch_id untuk melepas sel milik batch yang dihapus.
+# seri_pending: sel yang dilepas batch terhapus dan belum diisi ulang
+# (refresh_released_series), disimpan permanen agar tidak hilang jika refresh gagal.
+# Sengaja tanpa primary key: insert saat hapus batch tetap murah, duplikat dibuang saat diklaim
+CREATE_SERIES_QUERY = """
+CREATE TABLE IF NOT EXISTS seri_usaha (
+    id_usaha TEXT NOT NULL,
+    periode_bulan DATE NOT NULL,
+    nama_usaha TEXT,
+    bulan TEXT,
+    omset_perbulan NUMERIC,
+    jumlah_pajak_dibayar NUMERIC,
+    tanggal_pembayaran DATE,
+    status TEXT,
+    growth NUMERIC,
+    kondisi TEXT,
+    skor_anomali NUMERIC,
+    batch_id TEXT NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id_usaha, periode_bulan)
+);
+CREATE INDEX IF NOT EXISTS idx_seri_usaha_batch ON seri_usaha(batch_id);
+CREATE TABLE IF NOT EXISTS seri_pending (
+    id_usaha TEXT NOT NULL,
+    periode_bulan DATE NOT NULL
+);
+"""
+
+ADD_SERIES_SCORE_QUERY = "ALTER TABLE seri_usaha ADD COLUMN IF NOT EXISTS skor_anomali NUMERIC;"
+
+CREATE_SERIES_TEMP_QUERY = """
+CREATE TEMP TABLE IF NOT EXISTS seri_keys (id_usaha TEXT, periode_bulan DATE) ON COMMIT DROP;
+CREATE TEMP TABLE IF NOT EXISTS seri_source (LIKE seri_usaha) ON COMMIT DROP;
+CREATE TEMP TABLE IF NOT EXISTS seri_changed (id_usaha TEXT, batas DATE) ON COMMIT DROP;
+CREATE TEMP TABLE IF NOT EXISTS seri_trend (
+    id_usaha TEXT, periode_bulan DATE, growth NUMERIC, kondisi TEXT, skor_anomali NUMERIC
+) ON COMMIT DROP;
+TRUNCATE seri_keys, seri_source, seri_changed, seri_trend;
+"""
+
+# Sel kandidat dari riwayat, satu per (id_usaha, periode_bulan) dengan aturan
+# dedup yang sama (berisi pembayaran dulu, lalu tulisan terbaru)
+SERIES_SOURCE_QUERY = f"""
+INSERT INTO seri_source ({', '.join(SERIES_COLUMNS)})
+SELECT DISTINCT ON (r.id_usaha, r.periode_bulan)
+       r.id_usaha, r.periode_bulan, r.nama_usaha, r.bulan, r.omset_perbulan, r.jumlah_pajak_dibayar,
+       r.tanggal_pembayaran, r.status, r.growth, r.kondisi, r.skor_anomali, r.batch_id, r.timestamp
+FROM riwayat r
+{{join}}
+WHERE {{where}} AND r.id_usaha IS NOT NULL AND r.periode_bulan IS NOT NULL
+ORDER BY r.id_usaha, r.periode_bulan, r.jumlah_pajak_dibayar IS NULL, r.timestamp DESC, r.id
+"""
+
+# Pengisi ulang sel yang dilepas batch terhapus: lookup index (id_usaha,
+# periode_bulan) per sel di setiap partisi, bukan join seri_keys ke seluruh
+# riwayat. Dijalankan refresh_released_series, di luar transaksi hapus batch
+SERIES_REFILL_QUERY = f"""
+INSERT INTO seri_source ({', '.join(SERIES_COLUMNS)})
+SELECT p.*
+FROM seri_keys k
+CROSS JOIN LATERAL (
+    SELECT r.id_usaha, r.periode_bulan, r.nama_usaha, r.bulan, r.omset_perbulan, r.jumlah_pajak_dibayar,
+           r.tanggal_pembayaran, r.status, r.growth, r.kondisi, r.skor_anomali, r.batch_id, r.timestamp
+    FROM riwayat r
+    WHERE r.id_usaha = k.id_usaha AND r.periode_bulan = k.periode_bulan
+    ORDER BY r.jumlah_pajak_dibayar IS NULL, r.timestamp DESC, r.id
+    LIMIT 1
+) p
+"""
+
+# Usaha yang serinya berubah + bulan paling awal yang berubah
+SERIES_CHANGED_QUERY = """
+INSERT INTO seri_changed
+SELECT src.id_usaha, MIN(src.periode_bulan)
+FROM seri_source src
+LEFT JOIN seri_usaha s ON s.id_usaha = src.id_usaha AND s.periode_bulan = src.periode_bulan
+WHERE s.id_usaha IS NULL
+   OR ((src.jumlah_pajak_dibayar IS NOT NULL OR s.jumlah_pajak_dibayar IS NULL)
+       AND (s.nama_usaha, s.bulan, s.jumlah_pajak_dibayar, s.status)
+           IS DISTINCT FROM (src.nama_usaha, src.bulan, src.jumlah_pajak_dibayar, src.status))
+GROUP BY src.id_usaha
+"""
+
+# Growth/kondisi/skor sel lama tidak ditimpa nilai per batch; yang berubah dihitung
+# ulang lewat seri_changed. batch_id selalu menunjuk ke tulisan terbaru
+SERIES_UPSERT_QUERY = """
+INSERT INTO seri_usaha AS s
+SELECT * FROM seri_source
+ON CONFLICT (id_usaha, periode_bulan) DO UPDATE SET
+    nama_usaha = EXCLUDED.nama_usaha,
+    bulan = EXCLUDED.bulan,
+    omset_perbulan = EXCLUDED.omset_perbulan,
+    jumlah_pajak_dibayar = EXCLUDED.jumlah_pajak_dibayar,
+    tanggal_pembayaran = EXCLUDED.tanggal_pembayaran,
+    status = EXCLUDED.status,
+    batch_id = EXCLUDED.batch_id,
+    updated_at = EXCLUDED.updated_at
+WHERE EXCLUDED.jumlah_pajak_dibayar IS NOT NULL OR s.jumlah_pajak_dibayar IS NULL
+"""
+
+# Sama seperti APPEND_CONTEXT_QUERY, di tabel seri
+SERIES_CONTEXT_QUERY = """
+SELECT s.id_usaha, s.nama_usaha, s.bulan, s.jumlah_pajak_dibayar, s.status, s.growth, s.kondisi,
+       s.skor_anomali, s.periode_bulan, FALSE AS sebelum
+FROM seri_changed c
+JOIN seri_usaha s ON s.id_usaha = c.id_usaha AND s.periode_bulan >= c.batas
+UNION ALL
+SELECT p.*, TRUE AS sebelum
+FROM seri_changed c
+CROSS JOIN LATERAL (
+    SELECT s.id_usaha, s.nama_usaha, s.bulan, s.jumlah_pajak_dibayar, s.status, s.growth, s.kondisi,
+           s.skor_anomali, s.periode_bulan
+    FROM seri_usaha s
+    WHERE s.id_usaha = c.id_usaha AND s.periode_bulan < c.batas AND s.status = 'VALID'
+    ORDER BY s.periode_bulan DESC
+    LIMIT %(lookback)s
+) p
+"""
+
+SERIES_TREND_UPDATE_QUERY = """
+UPDATE seri_usaha s SET growth = t.growth, kondisi = t.kondisi, skor_anomali = t.skor_anomali
+FROM seri_trend t
+WHERE s.id_usaha = t.id_usaha AND s.periode_bulan = t.periode_bulan
+"""
+
+SERIES_SELECT_QUERY = """
+SELECT id_usaha, nama_usaha, bulan, omset_perbulan, jumlah_pajak_dibayar, tanggal_pembayaran,
+       status, growth, kondisi, skor_anomali, periode_bulan, batch_id
+FROM seri_usaha
+WHERE id_usaha = %s AND periode_bulan BETWEEN %s AND %s
+ORDER BY periode_bulan
+"""
+
+def _has_series(cursor):
+    """
+    True jika tabel seri_usaha dan seri_pending sudah dibuat (db_setup.py /
+    create_table_if_not_exists); instalasi lama tanpa seri_pending harus
+    menjalankan setup ulang sebelum seri diperbarui lagi
+    """
+    cursor.execute("SELECT to_regclass('seri_usaha') IS NOT NULL AND to_regclass('seri_pending') IS NOT NULL")
+    return cursor.fetchone()[0]
+
+def _refresh_series_trend(cursor, recompute):
+    """
+    Hitung ulang growth/kondisi/skor seri untuk usaha di seri_changed, mulai
+    bulan batasnya (ditambah baris VALID sebelum batas sebanyak lookback
+    SERIES_DETECTOR sebagai pembanding). recompute harus memakai SERIES_DETECTOR
+    juga, supaya seluruh seri dihitung dengan satu detektor.
+    Hanya baris yang nilainya berubah yang ditulis.
+    Return: jumlah baris seri yang di-update
+    """
+    if recompute is None:
+        return 0
     
-    # Rename kolom sesuai config
-    for db_col, config_col in db_to_config_mapping.items():
-        if db_col in df.columns and db_col != config_col:
-            df = df.rename(columns={db_col: config_col})
+    _register_typed_casters(cursor)
+    lookback = get_detector(SERIES_DETECTOR).lookback
+    context = _fetch_typed(cursor, SERIES_CONTEXT_QUERY, {'lookback': lookback})
+    if context.empty:
+        return 0
     
-    print(f"DEBUG FETCH: Final dataframe shape: {df.shape}")
-    print(f"DEBUG FETCH: Final columns: {list(df.columns)}")
+    frame = _recompute_trend(context.copy(), recompute, lookback)
+    frame = frame[_trend_changed(frame, context.loc[frame.index])]
     
+    if len(frame):
+        _copy_frame(cursor, 'seri_trend', pd.DataFrame({
+            'id_usaha': frame['nopd'].to_numpy(dtype=object),
+            PERIODE_COLUMN: frame[PERIODE_COLUMN].to_numpy(dtype=object),
+            'growth': frame['growth'].to_numpy(dtype='float64'),
+            'kondisi': frame['kondisi'].astype(object).to_numpy(),
+            'skor_anomali': frame['skor_anomali'].to_numpy(dtype='float64'),
+        }))
+        cursor.execute(SERIES_TREND_UPDATE_QUERY)
+    logger.debug("SERIES: Recomputed %s rows, updated %s", len(context), len(frame))
+    return len(frame)
+
+def _sync_series(cursor, batch_id, recompute=None, keys=None):
+    """
+    Masukkan sel satu batch ke seri_usaha (dalam transaksi cursor), lalu hitung
+    ulang growth/kondisi usaha yang serinya berubah (recompute dengan
+    SERIES_DETECTOR, bukan detektor batch).
+    keys: DataFrame (id_usaha, periode_bulan) untuk membatasi ke sel tertentu
+          (mode append); None = seluruh batch
+    """
+    cursor.execute(CREATE_SERIES_TEMP_QUERY)
+    join = ''
+    if keys is not None:
+        _copy_frame(cursor, 'seri_keys', keys)
+        join = 'JOIN seri_keys k ON k.id_usaha = r.id_usaha AND k.periode_bulan = r.periode_bulan'
+    cursor.execute(SERIES_SOURCE_QUERY.format(join=join, where='r.batch_id = %(batch_id)s'), {'batch_id': batch_id})
+    cursor.execute(SERIES_CHANGED_QUERY)
+    cursor.execute(SERIES_UPSERT_QUERY)
+    logger.debug("SERIES: Synced %s cells from batch %s", cursor.rowcount, batch_id)
+    return _refresh_series_trend(cursor, recompute)
+
+def _release_series(cursor, batch_id):
+    """
+    Lepas sel seri yang berasal dari batch yang dihapus (dalam transaksi hapus
+    batch): sel dibuang lewat index batch_id dan kuncinya dicatat di
+    seri_pending, jadi waktunya ikut jumlah sel batch, bukan besar riwayat.
+    Pengisian ulang dari batch lain dilakukan terpisah (refresh_released_series)
+    """
+    cursor.execute("""
+        WITH removed AS (DELETE FROM seri_usaha WHERE batch_id = %s RETURNING id_usaha, periode_bulan)
+        INSERT INTO seri_pending SELECT id_usaha, periode_bulan FROM removed
+    """, (batch_id,))
+    logger.debug("SERIES: Released %s cells of batch %s", cursor.rowcount, batch_id)
+    return cursor.rowcount
+
+def refresh_released_series(recompute=None, id_usaha=None):
+    """
+    Isi ulang sel seri yang dilepas batch terhapus (seri_pending) dari batch
+    lain yang masih punya sel yang sama, lalu hitung ulang growth/kondisi usaha
+    tsb. Transaksi sendiri, di luar hapus batch; kunci yang diklaim dihapus dari
+    seri_pending, jadi beberapa pemanggil bersamaan tidak mengerjakan sel yang sama
+    dan kunci yang gagal diproses tetap tersimpan untuk pemanggil berikutnya.
+    id_usaha: hanya sel usaha ini (dipanggil sebelum seri usaha dibaca);
+              None = semua sel yang tertunda
+    Return: jumlah sel yang diisi ulang
+    """
+    where = 'TRUE' if id_usaha is None else 'id_usaha = %(id_usaha)s'
+    params = {'id_usaha': id_usaha}
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if not _has_series(cursor):
+                return 0
+            # Cek dulu tanpa menulis apa pun: biasanya tidak ada sel tertunda
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM seri_pending WHERE {where})", params)
+            if not cursor.fetchone()[0]:
+                conn.commit()
+                return 0
+            cursor.execute(CREATE_SERIES_TEMP_QUERY)
+            cursor.execute(f"""
+                WITH claimed AS (DELETE FROM seri_pending WHERE {where} RETURNING id_usaha, periode_bulan)
+                INSERT INTO seri_keys SELECT DISTINCT id_usaha, periode_bulan FROM claimed
+            """, params)
+            if cursor.rowcount == 0:
+                conn.commit()
+                return 0
+            logger.debug("SERIES: Refreshing %s released cells", cursor.rowcount)
+            cursor.execute("INSERT INTO seri_changed SELECT id_usaha, MIN(periode_bulan) FROM seri_keys GROUP BY id_usaha")
+            cursor.execute(SERIES_REFILL_QUERY)
+            refilled = cursor.rowcount
+            logger.debug("SERIES: Refilled %s cells from other batches", refilled)
+            cursor.execute(SERIES_UPSERT_QUERY)
+            _refresh_series_trend(cursor, recompute)
+            conn.commit()
+            return refilled
+        finally:
+            cursor.close()
+
+def backfill_series(cursor, recompute=None):
+    """
+    Isi seri_usaha dari semua batch yang sudah ada (migrasi, sekali jalan).
+    Dengan recompute, growth/kondisi semua usaha dihitung ulang sepanjang seri,
+    termasuk seri yang sudah ada (mis. dihitung dengan detektor lain sebelum
+    SERIES_DETECTOR dipakai tetap atau setelah nilainya diganti).
+    Return: jumlah sel yang dimasukkan
+    """
+    cursor.execute(CREATE_SERIES_TEMP_QUERY)
+    cursor.execute(SERIES_SOURCE_QUERY.format(join='', where='TRUE'))
+    cursor.execute(SERIES_UPSERT_QUERY)
+    inserted = cursor.rowcount
+    cursor.execute("INSERT INTO seri_changed SELECT id_usaha, MIN(periode_bulan) FROM seri_usaha GROUP BY id_usaha")
+    _refresh_series_trend(cursor, recompute)
+    return inserted
+
+@timed_query('fetch_series')
+def fetch_business_series(id_usaha, start=None, end=None):
+    """
+    Seri bulanan satu usaha lintas batch dan tahun, urut periode
+    (range scan primary key). start/end: 'YYYY-MM' (opsional, inklusif)
+    """
+    start = f"{start}-01" if start else '0001-01-01'
+    end = f"{end}-01" if end else '9999-12-01'
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        _register_typed_casters(cursor)
+        try:
+            return _fetch_typed(cursor, SERIES_SELECT_QUERY, (id_usaha, start, end))
+        finally:
+            cursor.close()
+
+# Jumlah baris per potongan fetch riwayat (bisa diubah lewat environment variable)
+FETCH_CHUNK_SIZE = int(os.environ.get('FETCH_CHUNK_ROWS', '50000'))
+
+BATCH_SELECT_QUERY = """
+    SELECT id_usaha, nama_usaha, bulan, omset_perbulan, 
+           jumlah_pajak_dibayar, tanggal_pembayaran, 
+           status, growth, kondisi, skor_anomali,
+           to_char(periode_bulan, 'YYYY-MM') AS bulan_iso
+    FROM riwayat
+    WHERE batch_id = %s
+    ORDER BY id_usaha, periode_bulan
+"""
+
+def iter_by_batch_flexible(batch_id, chunk_size=None, typed=True):
+    """
+    Generator DataFrame per potongan chunk_size baris untuk satu batch
+    (urutan sama dengan fetch_by_batch_flexible).
+    Memakai named cursor (server-side): PostgreSQL mengirim baris per
+    fetchmany, jadi yang ada di memory hanya satu potongan tuple + DataFrame-nya.
+    Koneksi pool dipinjam sampai generator selesai / ditutup.
+    typed=False: nilai mentah psycopg2 (Decimal, date) tanpa tanda prevalidated
+    """
+    chunk_size = chunk_size or FETCH_CHUNK_SIZE
+
+    with db_connection() as conn:
+        cursor = conn.cursor(name=f"riwayat_fetch_{uuid.uuid4().hex}")
+        cursor.itersize = chunk_size
+        if typed:
+            _register_typed_casters(cursor)
+        try:
+            cursor.execute(BATCH_SELECT_QUERY, (batch_id,))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                column_names = [desc[0] for desc in cursor.description]
+                if typed:
+                    yield _typed_frame(rows, column_names)
+                else:
+                    yield _rename_db_columns(pd.DataFrame(rows, columns=column_names))
+        finally:
+            cursor.close()
+
+@timed_query('fetch_by_batch')
+def fetch_by_batch_flexible(batch_id, typed=True):
+    """
+    FIXED: Fetch data dari database dengan error handling yang lebih baik
+    Dibaca per potongan (iter_by_batch_flexible): dari setiap potongan hanya
+    array per kolom yang disimpan, lalu digabung kolom demi kolom. Puncak
+    memory = hasil + satu kolom, bukan hasil + semua potongan seperti pd.concat.
+    Untuk batch besar, konsumsi iter_by_batch_flexible langsung.
+    """
+    logger.debug("FETCH: Fetching data for batch_id: %s", batch_id)
+
+    columns = {}
+    attrs = {}
+    n_rows = 0
+    try:
+        for chunk in iter_by_batch_flexible(batch_id, typed=typed):
+            # copy: array tidak boleh jadi view blok potongan, agar potongan bisa dilepas
+            for col in chunk.columns:
+                columns.setdefault(col, []).append(chunk[col].to_numpy(copy=True))
+            attrs = chunk.attrs
+            n_rows += len(chunk)
+            del chunk
+    except Exception as e:
+        logger.error("Error in fetch query: %s", e)
+        columns = {}
+
+    if not columns:
+        logger.debug("FETCH: No data found for batch_id: %s", batch_id)
+        return pd.DataFrame()
+
+    df = pd.DataFrame(index=pd.RangeIndex(n_rows))
+    for col in list(columns):
+        pieces = columns.pop(col)
+        df[col] = pieces[0] if len(pieces) == 1 else np.concatenate(pieces)
+        del pieces
+    df.attrs.update(attrs)
+
+    logger.debug("FETCH: Final dataframe shape: %s", df.shape)
+    logger.debug("FETCH: Final columns: %s", list(df.columns))
+
     return df
 
+# Kolom yang boleh dipakai untuk sorting halaman tabel. Masing-masing didukung
+# index (primary key / idx_riwayat_usaha_row di partisi batch) sehingga LIMIT
+# tidak perlu sort seluruh batch
+PAGE_SORT_COLUMNS = {
+    'id': ['id'],
+    'nopd': ['id_usaha', 'id'],
+}
+
+PAGE_SELECT_COLUMNS = """
+    id, id_usaha, nama_usaha, bulan, omset_perbulan,
+    jumlah_pajak_dibayar, tanggal_pembayaran,
+    status, growth, kondisi, skor_anomali,
+    to_char(periode_bulan, 'YYYY-MM') AS bulan_iso
+"""
+
+PAGE_SEARCH_COLUMNS = ['id_usaha', 'nama_usaha', 'bulan', 'status', 'kondisi']
+
+ISO_MONTH_SQL = r"'^\d{4}-\d{2}$'"
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _month_range_clause(min_month, max_month):
+    """
+    Filter rentang bulan (YYYY-MM), sama seperti filter di result.html.
+    Baris dengan periode_bulan dibandingkan dengan tahun aslinya; baris lama
+    tanpa periode: nama bulan dibandingkan sebagai DEFAULT_TAHUN-MM, bulan
+    yang tidak dikenali tetap ditampilkan
+    """
+    lower = min_month or '0000-00'
+    upper = max_month or '9999-99'
+    known_names = sorted(MONTH_NUMBER_LOOKUP)
+    names_in_range = sorted(
+        name for name, number in MONTH_NUMBER_LOOKUP.items()
+        if lower <= f"{DEFAULT_TAHUN}-{number:02d}" <= upper
+    )
+
+    clause = f"""(
+        (periode_bulan IS NOT NULL AND to_char(periode_bulan, 'YYYY-MM') BETWEEN %s AND %s)
+        OR (periode_bulan IS NULL AND (
+            bulan IS NULL
+            OR lower(trim(bulan)) = ANY(%s)
+            OR (trim(bulan) ~ {ISO_MONTH_SQL} AND trim(bulan) BETWEEN %s AND %s)
+            OR NOT (lower(trim(bulan)) = ANY(%s) OR trim(bulan) ~ {ISO_MONTH_SQL})
+        ))
+    )"""
+    return clause, [lower, upper, names_in_range, lower, upper, known_names]
+
+def _batch_where(batch_id, filters=None):
+    """
+    Klausa WHERE untuk satu batch + filter tabel.
+    filters: dict dengan key opsional search, status, kondisi, min_month, max_month
+    """
+    clauses = ["batch_id = %s"]
+    params = [batch_id]
+    filters = filters or {}
+
+    for column in ('status', 'kondisi'):
+        if filters.get(column):
+            clauses.append(f"{column} = %s")
+            params.append(filters[column])
+
+    if filters.get('search'):
+        pattern = f"%{_escape_like(filters['search'])}%"
+        clauses.append("(" + " OR ".join(f"{col} ILIKE %s" for col in PAGE_SEARCH_COLUMNS) + ")")
+        params.extend([pattern] * len(PAGE_SEARCH_COLUMNS))
+
+    if filters.get('min_month') or filters.get('max_month'):
+        clause, month_params = _month_range_clause(filters.get('min_month'), filters.get('max_month'))
+        clauses.append(clause)
+        params.extend(month_params)
+
+    return " AND ".join(clauses), params
+
+@timed_query('count_batch_rows')
+def count_batch_rows(batch_id, filters=None):
+    """
+    Jumlah baris satu batch (setelah filter tabel jika ada). Tanpa filter
+    dibaca dari katalog batches (row_count), jadi tidak scan seluruh batch; COUNT(*)
+    hanya dipakai untuk filter atau batch yang belum tercatat di katalog
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if not (filters and any(filters.values())):
+                cursor.execute("SELECT row_count FROM batches WHERE batch_id = %s", (batch_id,))
+                row = cursor.fetchone()
+                if row is not None:
+                    return row[0]
+            where, params = _batch_where(batch_id, filters)
+            cursor.execute(f"SELECT COUNT(*) FROM riwayat WHERE {where}", params)
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+@timed_query('fetch_batch_page')
+def fetch_batch_page(batch_id, offset=0, limit=15, order_by='id', direction='asc', filters=None):
+    """
+    Ambil satu halaman baris batch (LIMIT/OFFSET) untuk tabel server-side.
+    order_by harus salah satu PAGE_SORT_COLUMNS; id selalu ikut sebagai
+    tie-breaker agar urutan antar halaman stabil.
+    """
+    sort_columns = PAGE_SORT_COLUMNS.get(order_by, PAGE_SORT_COLUMNS['id'])
+    direction = 'DESC' if str(direction).lower() == 'desc' else 'ASC'
+    order_sql = ", ".join(f"{col} {direction}" for col in sort_columns)
+    where, params = _batch_where(batch_id, filters)
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        _register_typed_casters(cursor)
+        try:
+            cursor.execute(f"""
+                SELECT {PAGE_SELECT_COLUMNS}
+                FROM riwayat
+                WHERE {where}
+                ORDER BY {order_sql}
+                LIMIT %s OFFSET %s
+            """, params + [limit, offset])
+            rows = cursor.fetchall()
+            column_names = [desc[0] for desc in cursor.description]
+        finally:
+            cursor.close()
+
+    return _typed_frame(rows, column_names)
+
+# Jumlah baris per potongan export (bisa diubah lewat environment variable)
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_ROWS', '20000'))
+
+def iter_batch_chunks(batch_id, chunk_size=None):
+    """
+    Generator DataFrame per potongan untuk export satu batch (urut id).
+    Keyset pagination (id > id terakhir) lewat primary key (batch_id, id):
+    setiap potongan satu query pendek, jadi koneksi pool tidak tertahan
+    selama client mengunduh dan memory tetap sebesar satu potongan.
+    """
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    last_id = None
+
+    while True:
+        clauses = "batch_id = %s" if last_id is None else "batch_id = %s AND id > %s"
+        params = [batch_id] if last_id is None else [batch_id, last_id]
+
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            _register_typed_casters(cursor)
+            try:
+                cursor.execute(f"""
+                    SELECT {PAGE_SELECT_COLUMNS}
+                    FROM riwayat
+                    WHERE {clauses}
+                    ORDER BY id
+                    LIMIT %s
+                """, params + [chunk_size])
+                rows = cursor.fetchall()
+                column_names = [desc[0] for desc in cursor.description]
+            finally:
+                cursor.close()
+
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield _typed_frame(rows, column_names)
+        if len(rows) < chunk_size:
+            return
+
+# riwayat dipartisi LIST per batch_id: satu partisi per upload, sehingga hapus
+# batch = DETACH + DROP partisi dan hapus semua = TRUNCATE, tanpa DELETE per baris
+CREATE_RIWAYAT_QUERY = """
+CREATE SEQUENCE IF NOT EXISTS riwayat_id_seq;
+CREATE TABLE IF NOT EXISTS riwayat (
+    id INTEGER NOT NULL DEFAULT nextval('riwayat_id_seq'),
+    id_usaha TEXT,
+    nama_usaha TEXT,
+    bulan TEXT,
+    omset_perbulan NUMERIC,
+    jumlah_pajak_dibayar NUMERIC,
+    tanggal_pembayaran DATE,
+    status TEXT,
+    growth NUMERIC,
+    kondisi TEXT,
+    skor_anomali NUMERIC,
+    periode_bulan DATE,
+    filename TEXT NOT NULL,
+    batch_id TEXT NOT NULL,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (batch_id, id)
+) PARTITION BY LIST (batch_id);
+ALTER SEQUENCE riwayat_id_seq OWNED BY riwayat.id;
+"""
+
+# Skor anomali (anomaly.py) di samping kondisi; NULL untuk baris lama
+ADD_RIWAYAT_SCORE_QUERY = "ALTER TABLE riwayat ADD COLUMN IF NOT EXISTS skor_anomali NUMERIC;"
+
+RIWAYAT_COLUMNS = [
+    'id', 'id_usaha', 'nama_usaha', 'bulan', 'omset_perbulan', 'jumlah_pajak_dibayar',
+    'tanggal_pembayaran', 'status', 'growth', 'kondisi', 'skor_anomali', PERIODE_COLUMN,
+    'filename', 'batch_id', 'timestamp'
+]
+
+# Index dibuat di tabel induk dan otomatis ada di setiap partisi. Satu partisi
+# berisi satu batch, jadi batch_id tidak perlu jadi kolom index (partition pruning);
+# (batch_id, id) sudah dicakup primary key
+RIWAYAT_INDEX_QUERIES = [
+    "CREATE INDEX IF NOT EXISTS idx_riwayat_timestamp ON riwayat(timestamp);",
+    # Halaman tabel server-side urut id_usaha
+    "CREATE INDEX IF NOT EXISTS idx_riwayat_usaha_row ON riwayat(id_usaha, id);",
+    # Fetch satu batch urut usaha + periode (index scan, tanpa sort)
+    "CREATE INDEX IF NOT EXISTS idx_riwayat_usaha_periode ON riwayat(id_usaha, periode_bulan);"
+]
+
+# Index tabel lama (non-partisi) yang dibuang saat migrasi
+LEGACY_RIWAYAT_INDEXES = [
+    'idx_riwayat_batch_id', 'idx_riwayat_id_usaha', 'idx_riwayat_timestamp',
+    'idx_riwayat_batch_row', 'idx_riwayat_batch_usaha_row', 'idx_riwayat_batch_usaha_periode'
+]
+
+def _riwayat_kind(cursor):
+    """'p' (partisi), 'r' (tabel biasa, belum dimigrasi), atau None jika belum ada"""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('riwayat')")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def _partition_name(batch_id):
+    """Nama tabel partisi untuk satu batch (riwayat_b_<uuid hex>)"""
+    try:
+        suffix = uuid.UUID(str(batch_id)).hex
+    except ValueError:
+        suffix = hashlib.md5(str(batch_id).encode('utf-8')).hexdigest()
+    return f"riwayat_b_{suffix}"
+
+def _create_partition(cursor, batch_id):
+    """Buat partisi kosong untuk batch_id langsung di bawah riwayat"""
+    cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF riwayat FOR VALUES IN ({})").format(
+        sql.Identifier(_partition_name(batch_id)), sql.Literal(batch_id)
+    ))
+
+def _create_batch_table(cursor, batch_id):
+    """
+    Tabel kosong untuk satu batch, diisi dulu sebelum di-ATTACH ke riwayat.
+    CHECK batch_id membuat ATTACH tidak perlu scan ulang isinya.
+    Return: nama tabel
+    """
+    table = _partition_name(batch_id)
+    cursor.execute(sql.SQL("CREATE TABLE {} (LIKE riwayat INCLUDING DEFAULTS)").format(sql.Identifier(table)))
+    cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} CHECK (batch_id = {})").format(
+        sql.Identifier(table), sql.Identifier(f"{table}_batch_check"), sql.Literal(batch_id)
+    ))
+    return table
+
+def _attach_batch_table(cursor, table, batch_id):
+    """
+    Pasang tabel batch sebagai partisi riwayat. Index partisi dibangun di sini
+    (setelah data masuk), dan ATTACH hanya butuh lock SHARE UPDATE EXCLUSIVE
+    sehingga baca/upload lain tetap jalan
+    """
+    cursor.execute(sql.SQL("ALTER TABLE riwayat ATTACH PARTITION {} FOR VALUES IN ({})").format(
+        sql.Identifier(table), sql.Literal(batch_id)
+    ))
+    # Statistik partisi baru langsung tersedia agar planner memakai index batch
+    cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table)))
+
+def migrate_riwayat_to_partitions(cursor):
+    """
+    Migrasi riwayat non-partisi ke tabel partisi per batch (dalam transaksi cursor).
+    Data lama dipindah sekali jalan; id dan sequence tetap dipakai.
+    Return: jumlah baris yang dipindah
+    """
+    cursor.execute("ALTER TABLE riwayat RENAME TO riwayat_legacy")
+    # Sequence SERIAL lama dilepas dulu agar tidak ikut terhapus bersama tabel lama
+    cursor.execute("ALTER SEQUENCE riwayat_id_seq OWNED BY NONE")
+    # Nama index dan primary key dipakai ulang oleh tabel baru
+    for index_name in LEGACY_RIWAYAT_INDEXES:
+        cursor.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(index_name)))
+    cursor.execute("ALTER TABLE riwayat_legacy RENAME CONSTRAINT riwayat_pkey TO riwayat_legacy_pkey")
+    
+    cursor.execute(CREATE_RIWAYAT_QUERY)
+    cursor.execute("SELECT DISTINCT batch_id FROM riwayat_legacy")
+    for (batch_id,) in cursor.fetchall():
+        _create_partition(cursor, batch_id)
+    
+    columns = sql.SQL(', ').join(sql.Identifier(col) for col in RIWAYAT_COLUMNS)
+    cursor.execute(sql.SQL("INSERT INTO riwayat ({cols}) SELECT {cols} FROM riwayat_legacy").format(cols=columns))
+    moved = cursor.rowcount
+    cursor.execute("DROP TABLE riwayat_legacy")
+    return moved
+
 def create_table_if_not_exists():
     """
     FIXED: Buat tabel dengan struktur PostgreSQL yang benar
+    riwayat dipartisi per batch; tabel lama (non-partisi) dimigrasi otomatis.
+    Semua langkah satu transaksi: jika ada yang gagal (migrasi, backfill, index)
+    semuanya di-rollback dan error diteruskan ke pemanggil
     """
-    conn = get_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    # Drop dan buat ulang tabel untuk memastikan struktur yang benar
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS riwayat (
-        id SERIAL PRIMARY KEY,
-        id_usaha TEXT,
-        nama_usaha TEXT,
-        bulan TEXT,
-        omset_perbulan NUMERIC,
-        jumlah_pajak_dibayar NUMERIC,
-        tanggal_pembayaran DATE,
-        status TEXT,
-        growth NUMERIC,
-        kondisi TEXT,
-        filename TEXT NOT NULL,
-        batch_id TEXT NOT NULL,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-    """
-    
-    # Index terpisah - FIXED untuk PostgreSQL
-    index_queries = [
-        "CREATE INDEX IF NOT EXISTS idx_riwayat_batch_id ON riwayat(batch_id);",
-        "CREATE INDEX IF NOT EXISTS idx_riwayat_id_usaha ON riwayat(id_usaha);",
-        "CREATE INDEX IF NOT EXISTS idx_riwayat_timestamp ON riwayat(timestamp);"
-    ]
-    
-    try:
-        cursor.execute(create_table_query)
-        print("DEBUG: Table 'riwayat' created or verified successfully")
+        try:
+            kind = _riwayat_kind(cursor)
+            if kind is None:
+                cursor.execute(CREATE_RIWAYAT_QUERY)
+            logger.debug("Table 'riwayat' created or verified successfully")
+            
+            # Migrasi tabel lama: tambah kolom periode_bulan lalu isi dari bulan
+            cursor.execute(ADD_RIWAYAT_PERIODE_QUERY)
+            cursor.execute(ADD_RIWAYAT_SCORE_QUERY)
+            backfilled = 0
+            for query in BACKFILL_PERIODE_QUERIES:
+                cursor.execute(query)
+                backfilled += cursor.rowcount
+            logger.debug("Column '%s' verified, backfilled %s rows", PERIODE_COLUMN, backfilled)
+            
+            if kind == 'r':
+                moved = migrate_riwayat_to_partitions(cursor)
+                logger.debug("Table 'riwayat' migrated to partitions, moved %s rows", moved)
+            
+            cursor.execute(CREATE_BATCHES_QUERY)
+            cursor.execute(ADD_BATCHES_NORMAL_QUERY)
+            cursor.execute(ADD_BATCHES_KONDISI_QUERY)
+            cursor.execute(ADD_BATCHES_DETECTOR_QUERY)
+            cursor.execute(CREATE_BATCHES_INDEX_QUERY)
+            cursor.execute(BACKFILL_BATCHES_QUERY)
+            logger.debug("Table 'batches' verified, backfilled %s batches", cursor.rowcount)
+            cursor.execute(CREATE_JOBS_QUERY)
+            
+            # Seri per usaha: diisi dari riwayat yang sudah ada saat tabel baru dibuat
+            has_series = _has_series(cursor)
+            cursor.execute(CREATE_SERIES_QUERY)
+            cursor.execute(ADD_SERIES_SCORE_QUERY)
+            if not has_series:
+                inserted = backfill_series(cursor, recompute_series)
+                logger.debug("Table 'seri_usaha' created, backfilled %s cells", inserted)
         
-        # Buat index
-        for index_query in index_queries:
-            try:
+            # Buat index
+            for index_query in RIWAYAT_INDEX_QUERIES:
                 cursor.execute(index_query)
-            except Exception as idx_error:
-                print(f"DEBUG: Index creation info: {idx_error}")
         
-        conn.commit()
-        print("DEBUG: All indexes created or verified successfully")
+            conn.commit()
+            logger.debug("All indexes created or verified successfully")
         
-    except Exception as e:
-        print(f"ERROR: Table/index creation failed: {e}")
-        conn.rollback()
-    finally:
-        cursor.close()
-        conn.close()
+        except Exception as e:
+            logger.error("Table/index creation failed: %s", e)
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
 
+@timed_query('fetch_file_list')
 def fetch_file_list():
     """Fetch list file dengan error handling"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    try:
-        cursor.execute("""
-            SELECT DISTINCT ON (batch_id) filename, batch_id, timestamp
-            FROM riwayat
-            ORDER BY batch_id, timestamp DESC
-        """)
-        results = cursor.fetchall()
+        try:
+            cursor.execute("""
+                SELECT filename, batch_id, uploaded_at, row_count, business_count,
+                       persentase_patuh, total_omset, jumlah_anomali
+                FROM batches
+                ORDER BY uploaded_at DESC
+            """)
+            results = cursor.fetchall()
         
-        print(f"DEBUG: Found {len(results)} files in history")
+            logger.debug("Found %s files in history", len(results))
         
-        return [{'filename': row[0], 'batch_id': row[1]} for row in results]
+            return [{
+                'filename': row[0],
+                'batch_id': row[1],
+                'uploaded_at': row[2],
+                'row_count': row[3],
+                'business_count': row[4],
+                'persentase_patuh': row[5],
+                'total_omset': row[6],
+                'jumlah_anomali': row[7]
+            } for row in results]
         
-    except Exception as e:
-        print(f"ERROR fetching file list: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
+        except Exception as e:
+            logger.error("Error fetching file list: %s", e)
+            return []
+        finally:
+            cursor.close()
+
+def fetch_batch_detector(batch_id):
+    """Nama detektor anomali yang dipakai saat upload batch (None untuk batch lama / tidak ada)"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT detektor FROM batches WHERE batch_id = %s", (batch_id,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        finally:
+            cursor.close()
+
+def save_job_status(status):
+    """Simpan status satu job upload (dict Job.to_dict) ke upload_jobs"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO upload_jobs (job_id, status, updated_at) VALUES (%s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (job_id) DO UPDATE SET status = EXCLUDED.status, updated_at = EXCLUDED.updated_at
+            """, (status['job_id'], Json(status)))
+            conn.commit()
+        finally:
+            cursor.close()
+
+def fetch_job_status(job_id):
+    """Status job upload terakhir yang disimpan (dict), None jika tidak ada"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT status FROM upload_jobs WHERE job_id = %s", (job_id,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        finally:
+            cursor.close()
 
+def prune_job_status(retention_seconds):
+    """Hapus status job yang tidak berubah lebih lama dari retention_seconds"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "DELETE FROM upload_jobs WHERE updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)",
+                (retention_seconds,)
+            )
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+@timed_query('delete_all_history')
 def delete_all_history():
     """Hapus semua data riwayat"""
-    conn = get_connection()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if _riwayat_kind(cursor) == 'p':
+                # TRUNCATE semua partisi lalu buang tabel partisi yang sudah kosong
+                cursor.execute("SELECT COALESCE(SUM(row_count), 0) FROM batches")
+                affected_rows = int(cursor.fetchone()[0])
+                cursor.execute("""
+                    SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = 'riwayat'::regclass
+                """)
+                partitions = [row[0] for row in cursor.fetchall()]
+                cursor.execute("TRUNCATE riwayat, batches")
+                if _has_series(cursor):
+                    cursor.execute("TRUNCATE seri_usaha, seri_pending")
+                if partitions:
+                    cursor.execute(sql.SQL("DROP TABLE {}").format(
+                        sql.SQL(', ').join(sql.Identifier(name) for name in partitions)
+                    ))
+            else:
+                cursor.execute("DELETE FROM riwayat")
+                affected_rows = cursor.rowcount
+                cursor.execute("DELETE FROM batches")
+                if _has_series(cursor):
+                    cursor.execute("DELETE FROM seri_usaha")
+                    cursor.execute("DELETE FROM seri_pending")
+            conn.commit()
+            logger.debug("Deleted %s rows from riwayat", affected_rows)
+            return affected_rows
+        except Exception as e:
+            logger.error("Error deleting all history: %s", e)
+            conn.rollback()
+            return 0
+        finally:
+            cursor.close()
+
+# DETACH CONCURRENTLY menunggu lock sebentar saja lalu diulang, supaya tidak
+# ikut mengantre lama di belakang transaksi lain yang sedang memakai riwayat
+DETACH_LOCK_TIMEOUT = os.environ.get('DETACH_LOCK_TIMEOUT', '2s')
+DETACH_RETRIES = int(os.environ.get('DETACH_RETRIES', '5'))
+DETACH_RETRY_DELAY = float(os.environ.get('DETACH_RETRY_DELAY', '0.5'))
+
+def _detach_state(cursor, table):
+    """None jika tabel sudah lepas dari riwayat, True jika DETACH tertunda (pending), False jika masih terpasang"""
+    cursor.execute("""
+        SELECT inhdetachpending FROM pg_inherits
+        WHERE inhrelid = to_regclass(%s) AND inhparent = 'riwayat'::regclass
+    """, (table,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def _detach_partition(conn, table):
+    """
+    Lepas partisi batch dengan DETACH PARTITION ... CONCURRENTLY (autocommit,
+    tidak boleh di dalam transaksi). Hanya butuh SHARE UPDATE EXCLUSIVE pada
+    riwayat, jadi baca/upload lain tetap jalan; menunggu transaksi yang masih
+    memakai riwayat dibatasi DETACH_LOCK_TIMEOUT lalu diulang.
+    DETACH yang terputus (pending) diselesaikan dengan FINALIZE.
+    """
+    conn.autocommit = True
     cursor = conn.cursor()
     try:
-        cursor.execute("DELETE FROM riwayat")
-        affected_rows = cursor.rowcount
-        conn.commit()
-        print(f"DEBUG: Deleted {affected_rows} rows from riwayat")
-        return affected_rows
-    except Exception as e:
-        print(f"ERROR deleting all history: {e}")
-        conn.rollback()
-        return 0
+        cursor.execute("SET lock_timeout = %s", (DETACH_LOCK_TIMEOUT,))
+        for attempt in range(DETACH_RETRIES + 1):
+            pending = _detach_state(cursor, table)
+            if pending is None:
+                return
+            action = 'FINALIZE' if pending else 'CONCURRENTLY'
+            try:
+                cursor.execute(sql.SQL("ALTER TABLE riwayat DETACH PARTITION {} {}").format(
+                    sql.Identifier(table), sql.SQL(action)
+                ))
+                return
+            except psycopg2.errors.LockNotAvailable:
+                if attempt == DETACH_RETRIES:
+                    raise
+                logger.warning("Detach %s waiting for lock, retry %s/%s", table, attempt + 1, DETACH_RETRIES)
+                time.sleep(DETACH_RETRY_DELAY * (attempt + 1))
     finally:
+        cursor.execute("RESET lock_timeout")
         cursor.close()
-        conn.close()
+        conn.autocommit = False
 
+@timed_query('delete_batch')
 def delete_batch(batch_id):
-    """Hapus data berdasarkan batch_id tertentu"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("DELETE FROM riwayat WHERE batch_id = %s", (batch_id,))
-        affected_rows = cursor.rowcount
-        conn.commit()
-        print(f"DEBUG: Deleted {affected_rows} rows for batch_id: {batch_id}")
-        return affected_rows
-    except Exception as e:
-        print(f"ERROR deleting batch {batch_id}: {e}")
-        conn.rollback()
-        return 0
-    finally:
-        cursor.close()
-        conn.close()
+    """
+    Hapus data berdasarkan batch_id tertentu
+    Partisi batch dilepas dulu (_detach_partition, tanpa lock eksklusif pada
+    riwayat), lalu tabelnya dibuang bersama catatan batches dalam transaksi
+    terpisah. Sel seri_usaha milik batch ini hanya dilepas (_release_series);
+    panggil refresh_released_series sesudahnya untuk mengisinya ulang dari batch lain
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            table = _partition_name(batch_id)
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+            has_partition = cursor.fetchone()[0]
+            partitioned = _riwayat_kind(cursor) == 'p'
+            conn.commit()
+            
+            if has_partition and partitioned:
+                # Lepas lalu buang partisi batch: O(1), tanpa DELETE per baris
+                _detach_partition(conn, table)
+                cursor.execute("SELECT row_count FROM batches WHERE batch_id = %s", (batch_id,))
+                row = cursor.fetchone()
+                affected_rows = row[0] if row else 0
+                cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(table)))
+            else:
+                cursor.execute("DELETE FROM riwayat WHERE batch_id = %s", (batch_id,))
+                affected_rows = cursor.rowcount
+            cursor.execute("DELETE FROM batches WHERE batch_id = %s", (batch_id,))
+            if _has_series(cursor):
+                _release_series(cursor, batch_id)
+            conn.commit()
+            logger.debug("Deleted %s rows for batch_id: %s", affected_rows, batch_id)
+            return affected_rows
+        except Exception as e:
+            logger.error("Error deleting batch %s: %s", batch_id, e)
+            conn.rollback()
+            return 0
+        finally:
+            cursor.close()
 
 # DEBUGGING FUNCTION - Tambahan untuk troubleshooting
 def debug_batch_data(batch_id):
     """
     Fungsi debugging untuk melihat data mentah di database
     """
-    conn = get_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    try:
-        cursor.execute("""
-            SELECT id, id_usaha, nama_usaha, bulan, omset_perbulan, 
-                   jumlah_pajak_dibayar, tanggal_pembayaran, status, growth, kondisi,
-                   filename, batch_id, timestamp
-            FROM riwayat
-            WHERE batch_id = %s
-            LIMIT 5
-        """, (batch_id,))
+        try:
+            cursor.execute("""
+                SELECT id, id_usaha, nama_usaha, bulan, omset_perbulan, 
+                       jumlah_pajak_dibayar, tanggal_pembayaran, status, growth, kondisi,
+                       filename, batch_id, timestamp
+                FROM riwayat
+                WHERE batch_id = %s
+                LIMIT 5
+            """, (batch_id,))
         
-        rows = cursor.fetchall()
-        column_names = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
+            column_names = [desc[0] for desc in cursor.description]
         
-        print(f"\n=== DEBUG BATCH DATA: {batch_id} ===")
-        print(f"Found {len(rows)} rows")
-        print(f"Columns: {column_names}")
+            print(f"\n=== DEBUG BATCH DATA: {batch_id} ===")
+            print(f"Found {len(rows)} rows")
+            print(f"Columns: {column_names}")
         
-        for i, row in enumerate(rows):
-            print(f"Row {i+1}: {dict(zip(column_names, row))}")
+            for i, row in enumerate(rows):
+                print(f"Row {i+1}: {dict(zip(column_names, row))}")
         
-        print("=== END DEBUG ===\n")
+            print("=== END DEBUG ===\n")
         
-    except Exception as e:
-        print(f"ERROR in debug_batch_data: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+        except Exception as e:
+            print(f"ERROR in debug_batch_data: {e}")
+        finally:
+            cursor.close()
 
 # Initialize database saat import
 if __name__ == "__main__":
@@ -4,11 +4,22 @@ db_setup.py
 Panduan & script untuk setup database sistem ini.
 
 1. Ubah DB_PARAMS sesuai kredensial PostgreSQL instansi.
-2. Jalankan script ini sekali saja untuk membuat tabel 'riwayat'.
+2. Jalankan script ini sekali saja untuk membuat tabel 'riwayat', 'batches' dan 'upload_jobs'.
+   Aman dijalankan ulang: batch lama di 'riwayat' akan dimasukkan ke katalog 'batches',
+   dan tabel 'riwayat' lama (non-partisi) dimigrasi ke partisi per batch.
+3. Tabel seri 'seri_usaha' (satu baris per usaha per bulan, lintas batch dan tahun)
+   diisi dari semua batch lama, lalu growth/kondisi dihitung ulang sepanjang seri.
 """
 
 import psycopg2
 
+from db import CREATE_RIWAYAT_QUERY, CREATE_SERIES_QUERY, RIWAYAT_INDEX_QUERIES, backfill_series
+from db import ADD_RIWAYAT_PERIODE_QUERY, ADD_RIWAYAT_SCORE_QUERY, ADD_SERIES_SCORE_QUERY, BACKFILL_PERIODE_QUERIES
+from db import (CREATE_BATCHES_QUERY, ADD_BATCHES_NORMAL_QUERY, ADD_BATCHES_KONDISI_QUERY,
+                ADD_BATCHES_DETECTOR_QUERY, CREATE_BATCHES_INDEX_QUERY, BACKFILL_BATCHES_QUERY)
+from db import CREATE_JOBS_QUERY, migrate_riwayat_to_partitions
+from trend import recompute_series
+
 # >>>> EDIT BAGIAN INI SESUAI DB INSTANSI <<<<
 DB_PARAMS = {
     'dbname': 'nama_database_anda',   # ganti dengan nama database yang sudah dibuat
@@ -22,33 +33,55 @@ def create_table():
     conn = psycopg2.connect(**DB_PARAMS)
     cursor = conn.cursor()
 
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS riwayat (
-        id SERIAL PRIMARY KEY,
-        id_usaha TEXT,
-        nama_usaha TEXT,
-        bulan TEXT,
-        omset_perbulan NUMERIC,
-        jumlah_pajak_dibayar NUMERIC,
-        tanggal_pembayaran DATE,
-        status TEXT,
-        growth NUMERIC,
-        kondisi TEXT,
-        filename TEXT NOT NULL,
-        batch_id TEXT NOT NULL,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
-
-    # Buat index agar query lebih cepat
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_riwayat_batch_id ON riwayat(batch_id);")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_riwayat_id_usaha ON riwayat(id_usaha);")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_riwayat_timestamp ON riwayat(timestamp);")
+    # Tabel riwayat dipartisi per batch (hapus batch = drop partisi)
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('riwayat')")
+    row = cursor.fetchone()
+    kind = row[0] if row else None
+    if kind is None:
+        cursor.execute(CREATE_RIWAYAT_QUERY)
+
+    # Migrasi tabel lama: kolom periode_bulan (DATE) diisi dari bulan ISO / nama bulan
+    cursor.execute(ADD_RIWAYAT_PERIODE_QUERY)
+    # Skor anomali (anomaly.py) di samping kondisi; baris lama tetap NULL
+    cursor.execute(ADD_RIWAYAT_SCORE_QUERY)
+    backfilled = 0
+    for query in BACKFILL_PERIODE_QUERIES:
+        cursor.execute(query)
+        backfilled += cursor.rowcount
+    print(f"ℹ️  {backfilled} baris lama diisi kolom 'periode_bulan'.")
+
+    # Migrasi tabel lama (non-partisi) ke partisi per batch, sekali jalan
+    if kind == 'r':
+        moved = migrate_riwayat_to_partitions(cursor)
+        print(f"ℹ️  {moved} baris lama dipindah ke tabel 'riwayat' berpartisi.")
+
+    # Buat index agar query lebih cepat (otomatis berlaku di setiap partisi)
+    for index_query in RIWAYAT_INDEX_QUERIES:
+        cursor.execute(index_query)
+
+    # Katalog batch untuk halaman Riwayat (satu baris per upload)
+    cursor.execute(CREATE_BATCHES_QUERY)
+    cursor.execute(ADD_BATCHES_NORMAL_QUERY)
+    cursor.execute(ADD_BATCHES_KONDISI_QUERY)
+    cursor.execute(ADD_BATCHES_DETECTOR_QUERY)
+    cursor.execute(CREATE_BATCHES_INDEX_QUERY)
+
+    # Migrasi: isi katalog dari batch lama yang sudah ada di riwayat
+    cursor.execute(BACKFILL_BATCHES_QUERY)
+    print(f"ℹ️  {cursor.rowcount} batch lama dimasukkan ke tabel 'batches'.")
+
+    # Status job upload, dibaca halaman progress dari proses aplikasi mana pun
+    cursor.execute(CREATE_JOBS_QUERY)
+
+    # Seri per usaha lintas batch/tahun; growth/kondisi dihitung ulang sepanjang seri
+    cursor.execute(CREATE_SERIES_QUERY)
+    cursor.execute(ADD_SERIES_SCORE_QUERY)
+    print(f"ℹ️  {backfill_series(cursor, recompute_series)} sel dimasukkan ke tabel 'seri_usaha'.")
 
     conn.commit()
     cursor.close()
     conn.close()
-    print("✅ Tabel 'riwayat' berhasil dibuat (atau sudah ada).")
+    print("✅ Tabel 'riwayat', 'batches', dan 'seri_usaha' berhasil dibuat (atau sudah ada).")
 
 if __name__ == "__main__":
     print("=== Setup Database Dimulai ===")
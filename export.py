@@ -0,0 +1,305 @@
+# export.py
+
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+from config import DataAttributeConfig
+from db import DATE_COLUMNS, NUMERIC_COLUMNS
+
+# Format export: mimetype + ekstensi file
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# Kolom yang diexport (urutan sama dengan tabel hasil), nilai mentah tanpa format tampilan
+EXPORT_COLUMNS = [
+    'nopd', 'nama_usaha', 'bulan', 'omset_perbulan', 'jumlah_pajak_dibayar',
+    'tanggal_pembayaran', 'status', 'growth', 'kondisi', 'skor_anomali'
+]
+
+def export_available(fmt):
+    """Parquet butuh pyarrow (ada di requirement.txt, tapi bisa belum terpasang di instalasi lama); format lain selalu tersedia"""
+    if fmt != 'parquet':
+        return fmt in EXPORT_FORMATS
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def export_headers():
+    """Judul kolom CSV/XLSX sesuai nama tampilan tabel"""
+    display_names = DataAttributeConfig.DISPLAY_NAMES
+    return [display_names.get(col, col.upper()) for col in EXPORT_COLUMNS]
+
+def export_frame(df):
+    """
+    Potongan hasil query -> kolom export dengan dtype tetap di setiap potongan:
+    NUMERIC (Decimal) -> float64, DATE -> datetime64, teks -> object (None jika kosong)
+    """
+    columns = {}
+    for col in EXPORT_COLUMNS:
+        values = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if col in NUMERIC_COLUMNS:
+            columns[col] = pd.to_numeric(values, errors='coerce').astype('float64')
+        elif col in DATE_COLUMNS:
+            columns[col] = pd.to_datetime(values, errors='coerce')
+        else:
+            values = values.astype(object)
+            columns[col] = values.where(values.notna(), None)
+    return pd.DataFrame(columns, index=df.index)
+
+class _StreamSink:
+    """
+    File tulis-saja untuk zipfile/pyarrow: byte ditampung sampai diambil
+    dengan drain(). Tanpa seek, jadi zipfile menulis entri dengan data
+    descriptor dan archive bisa dikirim sambil ditulis.
+    """
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+def iter_csv(chunks):
+    """CSV per potongan; BOM di awal agar Excel membaca UTF-8 dengan benar"""
+    first = True
+    for chunk in chunks:
+        frame = export_frame(chunk)
+        frame.columns = export_headers()
+        text = frame.to_csv(index=False, header=first, date_format='%Y-%m-%d', lineterminator='\r\n')
+        yield (('\ufeff' if first else '') + text).encode('utf-8')
+        first = False
+
+    if first:
+        yield ('\ufeff' + ','.join(export_headers()) + '\r\n').encode('utf-8')
+
+# ===== XLSX =====
+# Ditulis langsung sebagai XML di dalam zip yang di-stream (inline string, tanpa
+# shared strings), jadi byte pertama terkirim sebelum query selesai dan memory
+# tetap satu potongan. openpyxl write-only juga hemat memory, tetapi zip baru
+# terbentuk saat save() setelah semua baris masuk.
+
+# Batas baris per sheet Excel; sisa baris lanjut ke sheet berikutnya
+XLSX_MAX_ROWS = 1048576
+XLSX_SHEET_NAME = 'Riwayat'
+# Tanggal Excel = jumlah hari sejak 1899-12-30
+EXCEL_EPOCH = np.datetime64('1899-12-30', 'D')
+# Karakter yang tidak boleh ada di XML 1.0
+XML_ILLEGAL_PATTERN = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+XLSX_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+XLSX_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# Style 1 = tanggal yyyy-mm-dd, style 2 = header tebal
+XLSX_STYLES = XML_HEAD + f'''<styleSheet xmlns="{XLSX_NS}">
+<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd"/></numFmts>
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>\
+<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>\
+<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>'''
+
+XLSX_ROOT_RELS = XML_HEAD + '''<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>'''
+
+XLSX_SHEET_HEAD = XML_HEAD + f'''<worksheet xmlns="{XLSX_NS}">
+<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>
+<sheetData>'''
+XLSX_SHEET_TAIL = '</sheetData></worksheet>'
+
+XLSX_EMPTY_CELL = '<c/>'
+
+def _xlsx_text(value):
+    text = XML_ILLEGAL_PATTERN.sub('', str(value))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+def _xlsx_text_cells(series):
+    """Teks berulang (nama usaha, bulan, status) di-escape sekali per nilai unik"""
+    cache = {}
+    cells = []
+    for value in series.tolist():
+        if value is None:
+            cells.append(XLSX_EMPTY_CELL)
+            continue
+        cell = cache.get(value)
+        if cell is None:
+            cell = cache[value] = _xlsx_text(value)
+        cells.append(cell)
+    return cells
+
+def _xlsx_number_cells(series):
+    values = series.to_numpy(dtype='float64')
+    finite = np.isfinite(values)
+    return [f'<c><v>{value!r}</v></c>' if ok else XLSX_EMPTY_CELL
+            for value, ok in zip(values.tolist(), finite.tolist())]
+
+def _xlsx_date_cells(series):
+    days = (series.to_numpy(dtype='datetime64[D]') - EXCEL_EPOCH).astype('int64')
+    valid = series.notna().to_numpy()
+    return [f'<c s="1"><v>{day}</v></c>' if ok else XLSX_EMPTY_CELL
+            for day, ok in zip(days.tolist(), valid.tolist())]
+
+def _xlsx_rows(frame):
+    """XML baris untuk satu potongan (tanpa atribut r; posisi sel berurutan)"""
+    columns = []
+    for col in EXPORT_COLUMNS:
+        if col in NUMERIC_COLUMNS:
+            columns.append(_xlsx_number_cells(frame[col]))
+        elif col in DATE_COLUMNS:
+            columns.append(_xlsx_date_cells(frame[col]))
+        else:
+            columns.append(_xlsx_text_cells(frame[col]))
+    return ''.join(f"<row>{''.join(cells)}</row>" for cells in zip(*columns))
+
+def _xlsx_header_row():
+    cells = ''.join(_xlsx_text(name).replace('<c ', '<c s="2" ', 1) for name in export_headers())
+    return f'<row>{cells}</row>'
+
+def _xlsx_package_parts(sheet_count):
+    """workbook.xml, relasi, dan content types; ditulis terakhir karena jumlah sheet baru diketahui di akhir"""
+    sheets = ''.join(
+        f'<sheet name="{XLSX_SHEET_NAME}{"" if i == 1 else f" {i}"}" sheetId="{i}" r:id="rId{i}"/>'
+        for i in range(1, sheet_count + 1)
+    )
+    sheet_rels = ''.join(
+        f'<Relationship Id="rId{i}" Type="{XLSX_REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+        for i in range(1, sheet_count + 1)
+    )
+    sheet_types = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, sheet_count + 1)
+    )
+    return {
+        'xl/workbook.xml': XML_HEAD + (
+            f'<workbook xmlns="{XLSX_NS}" xmlns:r="{XLSX_REL_NS}"><sheets>{sheets}</sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': XML_HEAD + (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{sheet_rels}<Relationship Id="rId{sheet_count + 1}" Type="{XLSX_REL_NS}/styles" Target="styles.xml"/>'
+            '</Relationships>'
+        ),
+        '[Content_Types].xml': XML_HEAD + (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{sheet_types}</Types>'
+        ),
+    }
+
+def iter_xlsx(chunks):
+    """XLSX yang di-stream: satu sheet per XLSX_MAX_ROWS baris (termasuk header)"""
+    sink = _StreamSink()
+    header = _xlsx_header_row()
+
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/styles.xml', XLSX_STYLES)
+
+        sheet_count = 0
+        sheet = None
+        sheet_rows = XLSX_MAX_ROWS
+        try:
+            for chunk in chunks:
+                frame = export_frame(chunk)
+                start = 0
+                while start < len(frame):
+                    if sheet_rows >= XLSX_MAX_ROWS:
+                        if sheet is not None:
+                            sheet.write(XLSX_SHEET_TAIL.encode('utf-8'))
+                            sheet.close()
+                        sheet_count += 1
+                        sheet = archive.open(f'xl/worksheets/sheet{sheet_count}.xml', 'w', force_zip64=True)
+                        sheet.write((XLSX_SHEET_HEAD + header).encode('utf-8'))
+                        sheet_rows = 1
+                    part = frame.iloc[start:start + XLSX_MAX_ROWS - sheet_rows]
+                    sheet.write(_xlsx_rows(part).encode('utf-8'))
+                    sheet_rows += len(part)
+                    start += len(part)
+                yield sink.drain()
+
+            if sheet is None:
+                sheet_count = 1
+                sheet = archive.open('xl/worksheets/sheet1.xml', 'w')
+                sheet.write((XLSX_SHEET_HEAD + header).encode('utf-8'))
+            sheet.write(XLSX_SHEET_TAIL.encode('utf-8'))
+        finally:
+            if sheet is not None:
+                sheet.close()
+
+        for name, content in _xlsx_package_parts(sheet_count).items():
+            archive.writestr(name, content)
+
+    yield sink.drain()
+
+# ===== Parquet =====
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    fields = []
+    for col in EXPORT_COLUMNS:
+        if col in NUMERIC_COLUMNS:
+            fields.append(pa.field(col, pa.float64()))
+        elif col in DATE_COLUMNS:
+            fields.append(pa.field(col, pa.date32()))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+def iter_parquet(chunks):
+    """Parquet dengan satu row group per potongan; footer ditulis saat selesai"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for chunk in chunks:
+            frame = export_frame(chunk)
+            arrays = [pa.array(frame[field.name], type=field.type, from_pandas=True) for field in schema]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def iter_export(chunks, fmt):
+    """Generator bytes file export dari potongan DataFrame hasil iter_batch_chunks"""
+    writers = {'csv': iter_csv, 'xlsx': iter_xlsx, 'parquet': iter_parquet}
+    return writers[fmt](chunks)
@@ -0,0 +1,153 @@
+# ingest.py
+
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Pengaturan ingest paralel (bisa diubah lewat environment variable)
+# Jumlah proses untuk memproses sheet secara paralel (default: jumlah core)
+INGEST_PROCESSES = int(os.environ.get('INGEST_PROCESSES', str(os.cpu_count() or 1)))
+# Start method proses worker; 'spawn' aman untuk aplikasi yang multi-thread
+INGEST_START_METHOD = os.environ.get('INGEST_START_METHOD', 'spawn')
+# Batas total ukuran isi ZIP setelah diekstrak (MB)
+INGEST_ZIP_MAX_MB = float(os.environ.get('INGEST_ZIP_MAX_MB', '2048'))
+
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')
+
+class SheetSource:
+    """Satu sheet yang akan diproses: file workbook + nama sheet"""
+
+    def __init__(self, path, sheet_name, workbook_name):
+        self.path = path
+        self.sheet_name = sheet_name
+        self.workbook_name = workbook_name
+
+    @property
+    def label(self):
+        return f"{self.workbook_name} [{self.sheet_name}]"
+
+    def __repr__(self):
+        return f"SheetSource({self.label!r})"
+
+def extract_workbooks(zip_path, target_dir):
+    """
+    Ekstrak workbook dari arsip ZIP ke target_dir.
+    Hanya file Excel yang diambil; nama file diratakan (tanpa folder) agar
+    entri seperti ../x.xlsx tidak bisa keluar dari target_dir.
+    Return: list (path, nama file asli)
+    """
+    max_bytes = INGEST_ZIP_MAX_MB * 1024 * 1024
+    workbooks = []
+
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith('__MACOSX/')
+            and not os.path.basename(info.filename).startswith(('.', '~$'))
+            and info.filename.lower().endswith(WORKBOOK_EXTENSIONS)
+        ]
+
+        total = sum(info.file_size for info in members)
+        if total > max_bytes:
+            raise ValueError(f"Isi ZIP terlalu besar ({total / 1e6:.0f} MB), batas {INGEST_ZIP_MAX_MB:.0f} MB")
+
+        for i, info in enumerate(members):
+            name = os.path.basename(info.filename)
+            path = os.path.join(target_dir, f"{i:03d}_{name}")
+            with archive.open(info) as source, open(path, 'wb') as target:
+                while True:
+                    chunk = source.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+            workbooks.append((path, name))
+
+    if not workbooks:
+        raise ValueError("Tidak ada file Excel di dalam ZIP")
+
+    return workbooks
+
+def list_sheet_sources(path, filename, work_dir):
+    """
+    Daftar semua sheet dari file upload (workbook atau ZIP berisi workbook)
+    work_dir: folder sementara untuk hasil ekstrak ZIP
+    """
+    if filename.lower().endswith('.zip'):
+        workbooks = extract_workbooks(path, work_dir)
+    else:
+        workbooks = [(path, filename)]
+
+    sources = []
+    for workbook_path, workbook_name in workbooks:
+        with pd.ExcelFile(workbook_path) as excel:
+            for sheet_name in excel.sheet_names:
+                sources.append(SheetSource(workbook_path, sheet_name, workbook_name))
+
+    logger.debug("INGEST: %s sheets from %s workbooks", len(sources), len(workbooks))
+    return sources
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def get_process_pool():
+    """Process pool global per proses (dibuat ulang setelah fork)"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ProcessPoolExecutor(
+                    max_workers=max(1, INGEST_PROCESSES),
+                    mp_context=multiprocessing.get_context(INGEST_START_METHOD)
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+def run_sheets(func, sources, on_done=None, parallel=None, executor=None):
+    """
+    Jalankan func(source.path, source.sheet_name) untuk setiap sheet.
+    Lebih dari satu sheet dijalankan paralel di process pool; func harus
+    fungsi level modul agar bisa di-pickle.
+    on_done(source, result, error) dipanggil setiap sheet selesai.
+    executor: process pool lain (default get_process_pool())
+    Return: list (source, result, error) sesuai urutan sources
+    """
+    if parallel is None:
+        parallel = len(sources) > 1 and (executor is not None or INGEST_PROCESSES > 1)
+
+    results = [None] * len(sources)
+
+    def record(i, result, error):
+        results[i] = (sources[i], result, error)
+        if on_done:
+            on_done(sources[i], result, error)
+
+    if not parallel:
+        for i, source in enumerate(sources):
+            try:
+                record(i, func(source.path, source.sheet_name), None)
+            except Exception as e:
+                record(i, None, e)
+        return results
+
+    pool = executor or get_process_pool()
+    futures = {
+        pool.submit(func, source.path, source.sheet_name): i
+        for i, source in enumerate(sources)
+    }
+    for future in as_completed(futures):
+        i = futures[future]
+        try:
+            record(i, future.result(), None)
+        except Exception as e:
+            record(i, None, e)
+
+    return results
@@ -0,0 +1,244 @@
+# jobs.py
+
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from db import fetch_job_status, prune_job_status, save_job_status
+
+logger = logging.getLogger(__name__)
+
+# Pengaturan antrean upload (bisa diubah lewat environment variable)
+# Jumlah upload yang diproses bersamaan
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', '2'))
+# Batas job yang menunggu + sedang berjalan; upload baru ditolak jika penuh
+UPLOAD_QUEUE_MAX = int(os.environ.get('UPLOAD_QUEUE_MAX', '10'))
+# File di atas batas ini dianggap berat dan dibatasi UPLOAD_HEAVY_WORKERS sekaligus
+UPLOAD_HEAVY_MB = float(os.environ.get('UPLOAD_HEAVY_MB', '50'))
+UPLOAD_HEAVY_WORKERS = int(os.environ.get('UPLOAD_HEAVY_WORKERS', '1'))
+# Job yang sudah selesai disimpan selama ini (detik) agar status masih bisa dibaca
+JOB_RETENTION_SECONDS = float(os.environ.get('UPLOAD_JOB_RETENTION', '3600'))
+# Status job juga ditulis ke database (tabel upload_jobs) agar proses lain bisa
+# membacanya; update progress ditulis paling sering sekali per interval ini (detik)
+JOB_PERSIST_INTERVAL = float(os.environ.get('UPLOAD_JOB_PERSIST_INTERVAL', '1'))
+
+class QueueFull(Exception):
+    """Antrean upload penuh (UPLOAD_QUEUE_MAX)"""
+
+class Job:
+    """Status satu job upload: tahap, jumlah baris/sheet, dan hasil (batch_id / error)"""
+
+    def __init__(self, filename, file_size=None, persist=None):
+        self.id = str(uuid.uuid4())
+        self.filename = filename
+        self.file_size = file_size
+        self.status = 'queued'  # queued -> running -> done / error
+        self.stage = 'Menunggu antrean'
+        self.rows_processed = 0
+        self.total_rows = None
+        self.sheets_done = 0
+        self.sheets_total = None
+        self.batch_id = None
+        self.batch_ids = []
+        self.warnings = []
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._lock = threading.Lock()
+        self._persist = persist
+        self._persisted_at = 0.0
+
+    def update(self, stage=None, rows_processed=None, total_rows=None,
+               sheets_done=None, sheets_total=None):
+        with self._lock:
+            if stage is not None:
+                self.stage = stage
+            if rows_processed is not None:
+                self.rows_processed = rows_processed
+            if total_rows is not None:
+                self.total_rows = total_rows
+            if sheets_done is not None:
+                self.sheets_done = sheets_done
+            if sheets_total is not None:
+                self.sheets_total = sheets_total
+            self.updated_at = time.time()
+        self._save(force=stage is not None)
+
+    def warn(self, message):
+        """Catat peringatan (mis. sheet yang dilewati) tanpa menggagalkan job"""
+        with self._lock:
+            self.warnings.append(message)
+            self.updated_at = time.time()
+        self._save(force=True)
+
+    def _start(self):
+        with self._lock:
+            self.status = 'running'
+            self.stage = 'Memulai'
+            self.updated_at = time.time()
+        self._save(force=True)
+
+    def _finish(self, status, result=None, error=None):
+        # result: satu batch_id atau list batch_id (upload multi-sheet)
+        batch_ids = list(result) if isinstance(result, (list, tuple)) else [result] if result else []
+        with self._lock:
+            self.status = status
+            self.batch_ids = batch_ids
+            self.batch_id = batch_ids[0] if batch_ids else None
+            self.error = error
+            self.stage = 'Selesai' if status == 'done' else 'Gagal'
+            self.updated_at = time.time()
+        self._save(force=True)
+
+    def _save(self, force=False):
+        """Tulis status ke penyimpanan bersama; gagal simpan tidak menggagalkan job"""
+        if self._persist is None:
+            return
+        now = time.time()
+        if not force and now - self._persisted_at < JOB_PERSIST_INTERVAL:
+            return
+        self._persisted_at = now
+        try:
+            self._persist(self.to_dict())
+        except Exception as e:
+            logger.warning("Job status %s not persisted: %s", self.id, e)
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'error')
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'filename': self.filename,
+                'status': self.status,
+                'stage': self.stage,
+                'rows_processed': self.rows_processed,
+                'total_rows': self.total_rows,
+                'sheets_done': self.sheets_done,
+                'sheets_total': self.sheets_total,
+                'batch_id': self.batch_id,
+                'batch_ids': list(self.batch_ids),
+                'warnings': list(self.warnings),
+                'error': self.error,
+                'elapsed_seconds': round(self.updated_at - self.created_at, 1),
+            }
+
+class JobManager:
+    """
+    Worker pool lokal untuk upload. Job berjalan di thread background proses
+    ini; statusnya disimpan di memory dan, jika persist diberikan, juga di
+    penyimpanan bersama (load) sehingga proses lain tetap bisa membacanya.
+    """
+
+    def __init__(self, workers=UPLOAD_WORKERS, queue_max=UPLOAD_QUEUE_MAX,
+                 heavy_bytes=UPLOAD_HEAVY_MB * 1024 * 1024, heavy_workers=UPLOAD_HEAVY_WORKERS,
+                 retention=JOB_RETENTION_SECONDS, persist=None, load=None, prune=None):
+        self.workers = max(1, workers)
+        self.queue_max = max(self.workers, queue_max)
+        self.heavy_bytes = heavy_bytes
+        self.retention = retention
+        self.pid = os.getpid()
+        self._persist = persist
+        self._load = load
+        self._prune_store = prune
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='upload')
+        self._heavy_slots = threading.Semaphore(max(1, heavy_workers))
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def _active_count(self):
+        return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.updated_at < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, func, filename, *args, file_size=None):
+        """
+        Jadwalkan func(job, *args). func mengembalikan batch_id (atau list batch_id);
+        exception dicatat sebagai error job. Raise QueueFull jika antrean penuh.
+        """
+        job = Job(filename, file_size, persist=self._persist)
+        with self._lock:
+            self._prune()
+            if self._active_count() >= self.queue_max:
+                raise QueueFull(f"Antrean upload penuh ({self.queue_max} job), coba lagi nanti")
+            self._jobs[job.id] = job
+
+        # Status awal tersimpan sebelum halaman progress mulai polling
+        job._save(force=True)
+        if self._prune_store is not None:
+            try:
+                self._prune_store(self.retention)
+            except Exception as e:
+                logger.warning("Old job statuses not pruned: %s", e)
+        self._executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job, func, args):
+        heavy = job.file_size is not None and job.file_size > self.heavy_bytes
+        if heavy:
+            job.update(stage='Menunggu slot file besar')
+            self._heavy_slots.acquire()
+        try:
+            job._start()
+            job._finish('done', result=func(job, *args))
+        except Exception as e:
+            traceback.print_exc()
+            job._finish('error', error=str(e))
+        finally:
+            if heavy:
+                self._heavy_slots.release()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """
+        Status job (dict Job.to_dict): dari memory jika job berjalan di proses
+        ini, selain itu dari penyimpanan bersama. None jika tidak ditemukan
+        """
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self._load is None:
+            return None
+        try:
+            return self._load(job_id)
+        except Exception as e:
+            logger.warning("Job status %s not loaded: %s", job_id, e)
+            return None
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            'workers': self.workers,
+            'queue_max': self.queue_max,
+            'queued': statuses.count('queued'),
+            'running': statuses.count('running'),
+            'done': statuses.count('done'),
+            'error': statuses.count('error'),
+        }
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_job_manager():
+    """Job manager global per proses (dibuat ulang setelah fork)"""
+    global _manager
+    if _manager is None or _manager.pid != os.getpid():
+        with _manager_lock:
+            if _manager is None or _manager.pid != os.getpid():
+                _manager = JobManager(persist=save_job_status, load=fetch_job_status, prune=prune_job_status)
+    return _manager
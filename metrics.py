@@ -0,0 +1,242 @@
+# metrics.py
+
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# Instrumentasi bisa dimatikan total lewat METRICS_ENABLED=0
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+METRIC_PREFIX = 'tren_pajak'
+
+# Batas bucket histogram latency (detik)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Counter per kombinasi label (hanya naik)"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, _format_labels(self.labelnames, labels), value)
+                for labels, value in values.items()]
+
+class Histogram:
+    """
+    Histogram dengan bucket tetap per kombinasi label.
+    observe() hanya menaikkan counter bucket; bentuk kumulatif dihitung saat di-scrape.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values = {}  # labels -> [counts per bucket (+Inf terakhir), sum]
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, labels=()):
+        with self._lock:
+            entry = self._values.get(labels)
+            return sum(entry[0]) if entry else 0
+
+    def samples(self):
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+
+        samples = []
+        for labels, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = ('le', _format_value(float(bound)) if bound != float('inf') else '+Inf')
+                samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, labels, le), cumulative))
+            samples.append((f"{self.name}_sum", _format_labels(self.labelnames, labels), total))
+            samples.append((f"{self.name}_count", _format_labels(self.labelnames, labels), cumulative))
+        return samples
+
+class Registry:
+    """
+    Kumpulan metric + collector gauge yang dibaca saat scrape
+    (pool koneksi, cache, antrean upload).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, name, help, func):
+        """func() -> dict {nama_gauge: nilai}; ditampilkan sebagai <name>_<nama_gauge>"""
+        self._collectors.append((name, help, func))
+
+    def render(self):
+        """Format teks Prometheus (text exposition 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+
+        for name, help, func in self._collectors:
+            try:
+                values = func() or {}
+            except Exception as e:
+                logger.warning("metrics collector %s gagal: %s", name, e)
+                continue
+            for key, value in values.items():
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                gauge = f"{name}_{key}"
+                lines.append(f"# HELP {gauge} {help} ({key})")
+                lines.append(f"# TYPE {gauge} gauge")
+                lines.append(f"{gauge} {_format_value(value)}")
+
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    f'{METRIC_PREFIX}_stage_duration_seconds', 'Durasi tahap pipeline upload dan riwayat', ['stage']))
+STAGE_ROWS = registry.register(Counter(
+    f'{METRIC_PREFIX}_stage_rows_total', 'Jumlah baris yang diproses per tahap', ['stage']))
+STAGE_BYTES = registry.register(Counter(
+    f'{METRIC_PREFIX}_stage_bytes_total', 'Jumlah bytes yang diproses per tahap', ['stage']))
+STAGE_ERRORS = registry.register(Counter(
+    f'{METRIC_PREFIX}_stage_errors_total', 'Jumlah tahap yang gagal (exception)', ['stage']))
+DB_SECONDS = registry.register(Histogram(
+    f'{METRIC_PREFIX}_db_query_duration_seconds', 'Durasi fungsi query database (db.py)', ['query']))
+DB_ROWS = registry.register(Counter(
+    f'{METRIC_PREFIX}_db_rows_total', 'Jumlah baris yang dibaca/ditulis per query', ['query']))
+DB_ERRORS = registry.register(Counter(
+    f'{METRIC_PREFIX}_db_errors_total', 'Jumlah query database yang gagal', ['query']))
+HTTP_SECONDS = registry.register(Histogram(
+    f'{METRIC_PREFIX}_http_request_duration_seconds', 'Durasi request HTTP per endpoint',
+    ['endpoint', 'method', 'status']))
+
+class Span:
+    """Hasil satu tahap; isi rows/bytes sebelum blok with selesai"""
+
+    __slots__ = ('rows', 'bytes')
+
+    def __init__(self, rows=None, bytes=None):
+        self.rows = rows
+        self.bytes = bytes
+
+def frame_bytes(df):
+    """Perkiraan murah ukuran DataFrame (tanpa isi string object)"""
+    return int(df.memory_usage(index=False, deep=False).sum())
+
+@contextmanager
+def span(stage, rows=None, bytes=None):
+    """
+    Catat durasi, jumlah baris, dan bytes satu tahap pipeline:
+        with span('upload.read_excel') as s:
+            df = ...
+            s.rows = len(df)
+    """
+    current = Span(rows, bytes)
+    if not METRICS_ENABLED:
+        yield current
+        return
+
+    labels = (stage,)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        STAGE_ERRORS.inc(labels=labels)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, labels)
+        if current.rows is not None:
+            STAGE_ROWS.inc(current.rows, labels)
+        if current.bytes is not None:
+            STAGE_BYTES.inc(current.bytes, labels)
+
+def timed_query(query):
+    """
+    Decorator untuk fungsi query di db.py: durasi, error, dan jumlah baris
+    (jika hasilnya DataFrame atau list)
+    """
+    labels = (query,)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS_ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                DB_ERRORS.inc(labels=labels)
+                raise
+            finally:
+                DB_SECONDS.observe(time.perf_counter() - start, labels)
+            rows = getattr(result, 'shape', None)
+            if rows is not None:
+                DB_ROWS.inc(rows[0], labels)
+            elif isinstance(result, list):
+                DB_ROWS.inc(len(result), labels)
+            return result
+        return wrapper
+    return decorator
+
+def observe_request(endpoint, method, status, seconds):
+    if METRICS_ENABLED:
+        HTTP_SECONDS.observe(seconds, (endpoint or 'unknown', method, str(status)))
@@ -0,0 +1,42 @@
+"""
+Regression test classify_status / classify_kondisi: label harus identik dengan
+fungsi row-wise lama (referensi di benchmarks/bench_classify.py) pada korpus
+nilai kosong/aneh dan pada data berbentuk asli.
+
+Jalankan: python -m pytest tests
+"""
+
+import contextlib
+import io
+
+import pandas as pd
+
+from app import classify_kondisi, classify_status, preprocess_sheet, process_data_flexible
+from benchmarks.bench_classify import detect_condition, edge_case_corpus, validate_payment_status
+from benchmarks.synthetic import make_wide_sheet
+
+
+def _assert_labels_equal(got, expected):
+    pd.testing.assert_series_equal(got.astype(object), expected, check_names=False)
+
+
+def test_status_matches_legacy_on_edge_cases():
+    df = edge_case_corpus()
+    _assert_labels_equal(classify_status(df), df.apply(validate_payment_status, axis=1))
+
+
+def test_kondisi_matches_legacy_on_edge_cases():
+    df = edge_case_corpus()
+    df = df.assign(status=classify_status(df))
+    _assert_labels_equal(classify_kondisi(df), df.apply(detect_condition, axis=1))
+
+
+def test_labels_match_legacy_on_processed_sheet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = process_data_flexible(preprocess_sheet(make_wide_sheet(200)))
+    df = df.drop(columns=['status', 'kondisi', 'skor_anomali'])
+
+    status = classify_status(df)
+    _assert_labels_equal(status, df.apply(validate_payment_status, axis=1))
+    df = df.assign(status=status)
+    _assert_labels_equal(classify_kondisi(df), df.apply(detect_condition, axis=1))
@@ -0,0 +1,119 @@
+# trend.py
+"""
+Growth, skor anomali, dan kondisi per usaha: langkah pipeline yang dipakai
+saat upload (app.py) dan saat baris dibaca ulang dari database (db.py: append
+dan seri_usaha). Dipisah dari app.py supaya db.py dan db_setup.py bisa
+menghitung ulang seri tanpa mengimpor aplikasi Flask.
+"""
+
+import numpy as np
+import pandas as pd
+
+from anomaly import SERIES_DETECTOR, anomaly_scores, get_detector
+
+
+KONDISI_CATEGORIES = ['NORMAL', 'ANOMALI', 'TIDAK TAAT PAJAK']
+
+
+def classify_kondisi(df, threshold=0.5):
+    """
+    REVISI: Kondisi berdasarkan status dan skor anomali
+    Bukan VALID -> TIDAK TAAT PAJAK, |skor_anomali| >= threshold -> ANOMALI,
+    selain itu (termasuk record VALID tanpa skor) -> NORMAL.
+    Tanpa kolom skor_anomali dipakai growth (aturan lama: growth ekstrem >= 50%)
+    """
+    is_valid = (df['status'] == 'VALID').to_numpy()
+    score_col = 'skor_anomali' if 'skor_anomali' in df.columns else 'growth'
+    score = pd.to_numeric(df[score_col], errors='coerce').to_numpy(dtype='float64')
+
+    with np.errstate(invalid='ignore'):
+        is_anomali = np.abs(score) >= threshold
+
+    codes = np.select(
+        [~is_valid, is_anomali],
+        [KONDISI_CATEGORIES.index('TIDAK TAAT PAJAK'), KONDISI_CATEGORIES.index('ANOMALI')],
+        default=KONDISI_CATEGORIES.index('NORMAL')
+    ).astype(np.int8)
+    return pd.Series(pd.Categorical.from_codes(codes, KONDISI_CATEGORIES), index=df.index)
+
+
+def calculate_growth_vectorized(df, id_col='nopd'):
+    """
+    Hitung growth antar bulan VALID berturut-turut untuk semua usaha sekaligus.
+    Data diurutkan sekali (id usaha, bulan), lalu growth dihitung terhadap baris
+    VALID sebelumnya dalam usaha yang sama dan di-clamp ke [-1, 10].
+    Output: Series float (NaN untuk record VALID pertama dan data TIDAK VALID)
+    """
+    growth = np.full(len(df), np.nan)
+
+    if len(df) == 0 or id_col not in df.columns:
+        return pd.Series(growth, index=df.index, dtype='float64')
+
+    sort_col = 'bulan_iso' if 'bulan_iso' in df.columns else 'bulan'
+
+    # Hanya baris VALID dengan id usaha yang terisi yang ikut dihitung
+    valid_mask = (df['status'] == 'VALID').to_numpy() & df[id_col].notna().to_numpy()
+    valid_pos = np.flatnonzero(valid_mask)
+
+    if len(valid_pos) >= 2:
+        # Sort sekali per (usaha, bulan) memakai kode hasil factorize;
+        # bulan kosong ditaruh di akhir seperti sort_values
+        id_codes, _ = pd.factorize(df[id_col].to_numpy()[valid_pos], sort=True)
+        month_codes, month_uniques = pd.factorize(df[sort_col].to_numpy()[valid_pos], sort=True)
+        month_codes[month_codes < 0] = len(month_uniques)
+
+        sorter = np.lexsort((month_codes, id_codes))
+        order = valid_pos[sorter]
+
+        ids = id_codes[sorter]
+        cur_pajak = pd.to_numeric(df['jumlah_pajak_dibayar'], errors='coerce').to_numpy(dtype='float64')[order]
+
+        # Baris dengan usaha yang sama seperti baris sebelumnya punya pembanding
+        same_business = np.zeros(len(order), dtype=bool)
+        same_business[1:] = ids[1:] == ids[:-1]
+
+        prev_pajak = np.empty_like(cur_pajak)
+        prev_pajak[0] = np.nan
+        prev_pajak[1:] = cur_pajak[:-1]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(
+                prev_pajak == 0,
+                np.where(cur_pajak > 0, 1.0, 0.0),
+                (cur_pajak - prev_pajak) / prev_pajak
+            )
+
+        # Clamp to reasonable bounds
+        values = np.clip(values, -1.0, 10.0)
+        growth[order[same_business]] = values[same_business]
+
+    return pd.Series(growth, index=df.index, dtype='float64')
+
+
+def detect_anomalies(df, detector=None):
+    """
+    Skor anomali (anomaly.py, detektor pilihan upload) + kondisi untuk semua
+    usaha sekaligus. Butuh kolom growth untuk detektor 'growth'
+    """
+    df['skor_anomali'] = anomaly_scores(df, detector)
+    df['kondisi'] = classify_kondisi(df, get_detector(detector).threshold)
+    return df
+
+
+def recompute_trend(df, detector=None):
+    """
+    Growth + skor anomali + kondisi untuk baris yang dibaca ulang dari
+    database: gabungan sel upload dan baris tersimpan (mode append) atau seri
+    usaha lintas batch/tahun (seri_usaha). Dipanggil db.py dengan usaha yang
+    terdampak saja; detector diikat lewat partial oleh pemanggil
+    """
+    df['growth'] = calculate_growth_vectorized(df)
+    return detect_anomalies(df, detector)
+
+
+def recompute_series(df):
+    """
+    recompute_trend untuk seri_usaha: selalu SERIES_DETECTOR, bukan detektor
+    upload, supaya satu seri lintas batch tidak dihitung dengan detektor campuran
+    """
+    return recompute_trend(df, SERIES_DETECTOR)